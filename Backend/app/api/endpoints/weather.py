@@ -1,14 +1,45 @@
-from fastapi import APIRouter, HTTPException, Header
-from app.models.weather import WeatherQuery, WeatherResponse
-from app.services.ai_service import WeatherAIService
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from app.api.responses import WeatherJSONResponse, dumps
+from app.models.weather import WeatherBatchQuery, WeatherBatchResponse, WeatherDetail, WeatherQuery, WeatherResponse
+from app.services.ai_service import WeatherAIService, get_weather_ai_service
 from app.db.supabase_client import supabase_db
-from typing import Optional
+from app.core.timing import stage_latencies
+from app.core.admission import AdmissionRejectedError, admission_controller, retry_after_header
+from app.core.governor import DependencyUnavailableError, governor_stats
+from app.core.llm_invoker import llm_invoker
+from app.core.config import settings
+from typing import Any, Dict, Optional
 import uuid
 
 router = APIRouter()
 
+def client_address(request: Request) -> str:
+    """
+    Key of the per-client admission bucket. Behind ADMISSION_TRUSTED_PROXY_HOPS
+    proxies, each appending its peer to X-Forwarded-For, the entry added by the
+    outermost one is the user's address; entries before it are client-supplied
+    and could be forged to dodge the limit.
+    """
+    hops = settings.ADMISSION_TRUSTED_PROXY_HOPS
+    if hops > 0:
+        forwarded = [host.strip() for host in ",".join(request.headers.getlist("x-forwarded-for")).split(",") if host.strip()]
+        if forwarded:
+            return forwarded[-min(hops, len(forwarded))]
+    return request.client.host if request.client else ""
+
+def rejected(e: AdmissionRejectedError) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.reason, headers=retry_after_header(e.retry_after))
+
 @router.post("/query", response_model=WeatherResponse)
-async def process_weather_query(query: WeatherQuery, x_session_id: Optional[str] = Header(None)):
+async def process_weather_query(
+    request: Request,
+    query: WeatherQuery,
+    weather_detail: WeatherDetail = "full",
+    x_session_id: Optional[str] = Header(None),
+    ai_service: WeatherAIService = Depends(get_weather_ai_service)
+):
     """
     Process a natural language weather query
     
@@ -16,24 +47,133 @@ async def process_weather_query(query: WeatherQuery, x_session_id: Optional[str]
     then the appropriate weather data will be fetched and explained.
     A `X-Session-ID` header can be provided to maintain conversation context.
     If not provided, a new session ID will be generated.
+    `weather_detail` selects the weather data returned: `full` raw OpenWeatherMap
+    payloads (`weather_data`), `summary` the slim per-city `weather_summary`, or `none`.
+    Answers 429 when the session or client sends queries too fast and 503 when the
+    service is saturated, both with `Retry-After`.
     """
     try:
         # Generate session ID if not provided
         if not x_session_id:
             x_session_id = f"session_{uuid.uuid4().hex[:16]}"
         
-        ai_service = WeatherAIService()
-        result = await ai_service.process_query(query.query, session_id=x_session_id)
+        async with admission_controller.admit(x_session_id, client_address(request)):
+            result = await ai_service.process_query(query.query, session_id=x_session_id, weather_detail=weather_detail)
         
         # Add session_id to response so frontend can track it
         result["session_id"] = x_session_id
         
-        return result
+        return WeatherJSONResponse(result)
+    except AdmissionRejectedError as e:
+        raise rejected(e)
+    except DependencyUnavailableError as e:
+        raise HTTPException(status_code=503, detail=f"Service temporarily unavailable: {str(e)}", headers={"Retry-After": str(int(e.retry_after + 0.999))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@router.post("/query/stream")
+async def stream_weather_query(
+    request: Request,
+    query: WeatherQuery,
+    weather_detail: WeatherDetail = "full",
+    x_session_id: Optional[str] = Header(None),
+    ai_service: WeatherAIService = Depends(get_weather_ai_service)
+):
+    """
+    Process a natural language weather query and stream the answer as Server-Sent Events
+
+    Events, in order:
+    - `details`: processed query, query details and weather data (per `weather_detail`), as soon as they are known
+    - `token`: one per chunk of the AI explanation as it is generated
+    - `response`: the complete result, same shape as `/query`
+    - `error`: sent instead of the remaining events if processing fails
+
+    Admission is decided before the stream starts, with the same 429/503 answers as `/query`.
+    """
+    # Generate session ID if not provided
+    if not x_session_id:
+        x_session_id = f"session_{uuid.uuid4().hex[:16]}"
+    try:
+        ticket = await admission_controller.acquire(x_session_id, client_address(request))
+    except AdmissionRejectedError as e:
+        raise rejected(e)
+
+    async def event_stream():
+        try:
+            async for event, payload in ai_service.process_query_stream(query.query, session_id=x_session_id, weather_detail=weather_detail):
+                if event == "response":
+                    payload["session_id"] = x_session_id
+                yield f"event: {event}\ndata: {dumps(payload)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {dumps({'detail': f'Error processing query: {str(e)}'})}\n\n"
+        finally:
+            ticket.release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-ID": x_session_id},
+        # Also frees the slot when the client disconnects before the stream started
+        background=BackgroundTask(ticket.release)
+    )
+
+@router.post("/query/batch", response_model=WeatherBatchResponse)
+async def process_weather_query_batch(
+    request: Request,
+    batch: WeatherBatchQuery,
+    stream: bool = False,
+    weather_detail: WeatherDetail = "full",
+    x_session_id: Optional[str] = Header(None),
+    ai_service: WeatherAIService = Depends(get_weather_ai_service)
+):
+    """
+    Process several natural language weather queries in one request
+
+    Each query may carry its own `session_id`; otherwise the `X-Session-ID` header
+    (or one generated session) is used. Queries of different sessions are answered
+    concurrently. Results are returned in request order, or with `?stream=true`
+    as NDJSON lines in completion order, each carrying its `index`.
+    `weather_detail` applies to every result, as for `/query`.
+    The batch takes one admission slot and a token per query from the header
+    session's and the client's buckets.
+    """
+    # Generate session ID if not provided
+    if not x_session_id:
+        x_session_id = f"session_{uuid.uuid4().hex[:16]}"
+    items = [(item.query, item.session_id or x_session_id) for item in batch.queries]
+
+    def to_result(index, response, error) -> Dict[str, Any]:
+        """A BatchQueryResult, built as a plain dict for direct encoding"""
+        if response is not None:
+            response = {**response, "session_id": items[index][1]}
+        return {"index": index, "session_id": items[index][1], "result": response, "error": error}
+
+    try:
+        ticket = await admission_controller.acquire(x_session_id, client_address(request), cost=len(items))
+    except AdmissionRejectedError as e:
+        raise rejected(e)
+
+    if stream:
+        async def ndjson_stream():
+            try:
+                async for index, response, error in ai_service.process_batch(items, weather_detail):
+                    yield dumps(to_result(index, response, error)) + "\n"
+            finally:
+                ticket.release()
+
+        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson", background=BackgroundTask(ticket.release))
+
+    try:
+        results = [to_result(*outcome) async for outcome in ai_service.process_batch(items, weather_detail)]
+    finally:
+        ticket.release()
+    return WeatherJSONResponse({"results": sorted(results, key=lambda result: result["index"])})
+
 @router.delete("/clear-chat")
-async def clear_chat_history(x_session_id: Optional[str] = Header(None)):
+async def clear_chat_history(
+    x_session_id: Optional[str] = Header(None),
+    ai_service: WeatherAIService = Depends(get_weather_ai_service)
+):
     """
     Clear chat history for a specific session
     
@@ -43,10 +183,35 @@ async def clear_chat_history(x_session_id: Optional[str] = Header(None)):
         raise HTTPException(status_code=400, detail="X-Session-ID header is required")
     
     try:
+        # Drop cached turns and write out queued ones first so they cannot reappear after the DELETE
+        await ai_service.sessions.clear(x_session_id)
         success = await supabase_db.clear_chat_history(x_session_id)
         if success:
             return {"message": "Chat history cleared successfully", "session_id": x_session_id}
         else:
             raise HTTPException(status_code=500, detail="Failed to clear chat history")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error clearing chat history: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error clearing chat history: {str(e)}")
+
+@router.get("/stats")
+async def get_service_stats(ai_service: WeatherAIService = Depends(get_weather_ai_service)):
+    """
+    Report in-process cache statistics (hits, misses, evictions, coalesced requests),
+    database pool occupancy and chat write queue depth, upstream circuit breaker
+    state and queue depth, fast-path coverage, hot-city pre-warming, the shared cache
+    backend (when CACHE_BACKEND is set), admission control, LLM latency and hedging per
+    prompt type and p50/p95 latency per query pipeline stage
+    """
+    return {
+        "weather_cache": ai_service.weather_service.stats(),
+        "prewarmer": ai_service.prewarmer.stats(),
+        "fast_path": ai_service.fast_path.stats(),
+        "sessions": ai_service.sessions.stats(),
+        "database": supabase_db.stats(),
+        "dependencies": governor_stats(),
+        "explanation_cache": ai_service.explanation_cache.stats(),
+        "cache_backend": ai_service.cache_backend.stats() if ai_service.cache_backend else None,
+        "admission": admission_controller.stats(),
+        "llm": llm_invoker.stats(),
+        "stage_latencies": stage_latencies.snapshot()
+    }
@@ -0,0 +1,28 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+from app.services.forecast_columns import ColumnarForecast
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ColumnarForecast):
+        return value.to_payload()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", exclude_none=True)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> str:
+    """orjson-encodes service output (for SSE/NDJSON lines)"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+class WeatherJSONResponse(ORJSONResponse):
+    """
+    orjson-encoded response for payloads the service built itself. Returning it
+    from an endpoint skips the response_model validation and jsonable_encoder
+    pass FastAPI otherwise runs over the whole (raw OpenWeatherMap) payload.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
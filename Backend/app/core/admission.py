@@ -0,0 +1,230 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_QUEUE_WAIT, stats_collector
+
+class AdmissionRejectedError(Exception):
+    """A query was turned away before running: 429 when its session or client is over its rate, 503 when the service is saturated"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Allows `burst` queries at once and `rate` per second on average"""
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait_time(self, cost: float, rate: float, burst: float, now: float) -> float:
+        """Refills the bucket; seconds until `cost` tokens are available (0 when they are now)"""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / rate
+
+class AdmissionTicket:
+    """One admitted query's in-flight slot; release() is idempotent"""
+    __slots__ = ("_controller", "_granted_at")
+
+    def __init__(self, controller: Optional["AdmissionController"], granted_at: float):
+        self._controller = controller
+        self._granted_at = granted_at
+
+    def release(self) -> None:
+        if self._controller is not None:
+            controller, self._controller = self._controller, None
+            controller._release(time.monotonic() - self._granted_at)
+
+class AdmissionController:
+    """
+    Admission in front of the query pipelines. Each query needs a token from
+    its session's and its client's bucket (429 when either is empty), then
+    one of `max_in_flight` slots; tokens are only spent by queries that are
+    admitted. When none is free it queues; waiting queries
+    are served round-robin across sessions, so one chatty session queues behind
+    its own requests rather than everyone else's. A query whose estimated wait
+    (its place in that rotation times the recent service time per slot) exceeds
+    `queue_timeout`, or that finds the queue full, is rejected at once with 503;
+    one still queued after `queue_timeout` gets 503 then. A rate of 0 disables that bucket.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.ADMISSION_ENABLED,
+        max_in_flight: int = settings.ADMISSION_MAX_IN_FLIGHT,
+        max_queue: int = settings.ADMISSION_MAX_QUEUE,
+        queue_timeout: float = settings.ADMISSION_QUEUE_TIMEOUT,
+        session_rate: float = settings.ADMISSION_SESSION_RATE,
+        session_burst: float = settings.ADMISSION_SESSION_BURST,
+        client_rate: float = settings.ADMISSION_CLIENT_RATE,
+        client_burst: float = settings.ADMISSION_CLIENT_BURST,
+        max_tracked: int = settings.ADMISSION_MAX_TRACKED
+    ):
+        self.enabled = enabled
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limits = {"session": (session_rate, session_burst), "client": (client_rate, client_burst)}
+        self.max_tracked = max_tracked
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        # Waiting queries per session; the order of sessions is the round-robin order
+        self._waiting: "OrderedDict[str, deque]" = OrderedDict()
+        self.in_flight = 0
+        self.queued = 0
+        # Moving average of how long an admitted query holds its slot
+        self.service_time = 0.0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    def _bucket(self, kind: str, key: str) -> TokenBucket:
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            bucket = self._buckets[(kind, key)] = TokenBucket(self.limits[kind][1])
+            while len(self._buckets) > self.max_tracked:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end((kind, key))
+        return bucket
+
+    def _check_tokens(self, session_id: str, client_id: str, cost: float) -> List[Tuple[TokenBucket, float]]:
+        """The (bucket, tokens) a query would be charged; 429 when either bucket is short"""
+        now = time.monotonic()
+        buckets = []
+        for kind, key in (("session", session_id), ("client", client_id)):
+            rate, burst = self.limits[kind]
+            if rate <= 0 or not key:
+                continue
+            bucket = self._bucket(kind, key)
+            # A batch larger than the burst still gets in on a full bucket
+            bucket_cost = min(cost, burst)
+            wait = bucket.wait_time(bucket_cost, rate, burst, now)
+            if wait > 0:
+                self.rate_limited += 1
+                raise AdmissionRejectedError(429, f"too many queries from this {kind}", wait)
+            buckets.append((bucket, bucket_cost))
+        return buckets
+
+    @staticmethod
+    def _charge(charges: List[Tuple[TokenBucket, float]], sign: float = 1) -> None:
+        """Takes the tokens (sign -1 gives them back; the next refill caps them at the burst)"""
+        for bucket, bucket_cost in charges:
+            bucket.tokens -= sign * bucket_cost
+
+    def _queries_ahead(self, session_id: str) -> int:
+        """Waiting queries served before a new one of `session_id`, one per session per round"""
+        rounds = len(self._waiting.get(session_id, ())) + 1
+        return sum(min(len(waiters), rounds) for waiters in self._waiting.values())
+
+    async def acquire(self, session_id: str, client_id: str, cost: float = 1) -> AdmissionTicket:
+        if not self.enabled:
+            return AdmissionTicket(None, 0.0)
+        charges = self._check_tokens(session_id, client_id, cost)
+        ADMISSION_QUEUE_DEPTH.observe(self.queued)
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self._charge(charges)
+            ADMISSION_QUEUE_WAIT.observe(0)
+            return self._grant()
+        if self.queued >= self.max_queue:
+            self.shed += 1
+            raise AdmissionRejectedError(503, "server busy: admission queue full", max(self.service_time, 1.0))
+        estimated_wait = self._queries_ahead(session_id) * self.service_time / self.max_in_flight
+        if estimated_wait > self.queue_timeout:
+            self.shed += 1
+            raise AdmissionRejectedError(503, f"server busy: estimated wait {estimated_wait:.1f}s", estimated_wait)
+
+        # Shed queries are not charged; queued ones are, and get the tokens back if never admitted
+        self._charge(charges)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session_id, deque()).append(waiter)
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            self._charge(charges, -1)
+            raise AdmissionRejectedError(503, f"server busy: not admitted within {self.queue_timeout}s", max(self.service_time, 1.0)) from None
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the caller went away
+            if waiter.done() and not waiter.cancelled():
+                self._release(None)
+            else:
+                self._charge(charges, -1)
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                self._forget(session_id, waiter)
+        ADMISSION_QUEUE_WAIT.observe(time.monotonic() - started)
+        return AdmissionTicket(self, time.monotonic())
+
+    def _grant(self) -> AdmissionTicket:
+        self.in_flight += 1
+        self.admitted += 1
+        return AdmissionTicket(self, time.monotonic())
+
+    def _forget(self, session_id: str, waiter: asyncio.Future) -> None:
+        waiters = self._waiting.get(session_id)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self.queued -= 1
+            if not waiters:
+                del self._waiting[session_id]
+
+    def _release(self, held: Optional[float]) -> None:
+        """Frees a slot; `held` (None for a slot that was never used) feeds the service time average"""
+        if held is not None:
+            self.service_time += 0.2 * (held - self.service_time) if self.service_time else held
+        self.in_flight -= 1
+        # Hand free slots to the next session in the rotation, which then moves to the back
+        while self.in_flight < self.max_in_flight and self._waiting:
+            session_id, waiters = self._waiting.popitem(last=False)
+            waiter = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._waiting[session_id] = waiters
+            if not waiter.done():
+                self.in_flight += 1
+                self.admitted += 1
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def admit(self, session_id: str, client_id: str, cost: float = 1) -> AsyncIterator[None]:
+        """Holds an in-flight slot for the body of the block"""
+        ticket = await self.acquire(session_id, client_id, cost)
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queued,
+            "queued_sessions": len(self._waiting),
+            "service_time_ms": round(self.service_time * 1000, 1),
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "shed": self.shed,
+            "timed_out": self.timed_out
+        }
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+# Process-wide, in front of /query, /query/stream and /query/batch
+admission_controller = AdmissionController()
+
+stats_collector.register("admission", admission_controller.stats)
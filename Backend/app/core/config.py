@@ -15,11 +15,137 @@ class Settings:
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     
     # OpenWeatherMap API Base URL
-    OPENWEATHERMAP_BASE_URL: str = "https://api.openweathermap.org/data/2.5"
+    OPENWEATHERMAP_BASE_URL: str = os.getenv("OPENWEATHERMAP_BASE_URL", "https://api.openweathermap.org/data/2.5")
+    
+    # Shared upstream HTTP connection pool (kept alive for the process lifetime)
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "True").lower() == "true"
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    
+    # Weather response cache (OpenWeatherMap refreshes current data ~10 min, forecasts every 3 h)
+    WEATHER_CACHE_MAX_SIZE: int = int(os.getenv("WEATHER_CACHE_MAX_SIZE", "1024"))
+    WEATHER_CACHE_CURRENT_TTL: float = float(os.getenv("WEATHER_CACHE_CURRENT_TTL", "600"))
+    WEATHER_CACHE_FORECAST_TTL: float = float(os.getenv("WEATHER_CACHE_FORECAST_TTL", "3600"))
+    # Resolve city names through the bundled gazetteer and fetch by coordinates
+    GEOCODING_ENABLED: bool = os.getenv("GEOCODING_ENABLED", "True").lower() == "true"
+    # Also accept unique-prefix and fuzzy gazetteer matches (misspellings), not only exact names/aliases
+    GEOCODING_APPROXIMATE: bool = os.getenv("GEOCODING_APPROXIMATE", "False").lower() == "true"
+    # Max concurrent single-location fetches per multi-city lookup (OWM_MAX_CONCURRENCY caps them process-wide)
+    WEATHER_FETCH_CONCURRENCY: int = int(os.getenv("WEATHER_FETCH_CONCURRENCY", "16"))
+    # Fetch current weather for cities with a known OpenWeatherMap id together via /group
+    OWM_GROUP_ENABLED: bool = os.getenv("OWM_GROUP_ENABLED", "True").lower() == "true"
+    
+    # Answer safeguard, extraction and history inference with one structured LLM call
+    # (the multi-call pipeline remains the fallback)
+    LLM_FUSED_MODE: bool = os.getenv("LLM_FUSED_MODE", "False").lower() == "true"
+    
+    # Answer obvious queries ("weather in Paris") locally without LLM classification/extraction
+    FAST_PATH_ENABLED: bool = os.getenv("FAST_PATH_ENABLED", "True").lower() == "true"
+    
+    # Feed the explanation LLM a query-driven weather summary instead of raw OpenWeatherMap JSON
+    PROMPT_COMPACTION_ENABLED: bool = os.getenv("PROMPT_COMPACTION_ENABLED", "True").lower() == "true"
     
     # Supabase Credentials
     DATABASE_URL: Optional[str] = os.getenv("DATABASE_URL") # This will be used
     
+    # Where caches and session state live: "memory" (per process) or "postgres" (shared by every
+    # worker through an UNLOGGED table, with LISTEN/NOTIFY invalidations; needs a session-mode
+    # connection, not a transaction pooler). CACHE_NEAR_TTL bounds how long a worker keeps its
+    # in-process copy of a shared entry, in case an invalidation is missed.
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory").lower()
+    CACHE_DATABASE_URL: Optional[str] = os.getenv("CACHE_DATABASE_URL") or DATABASE_URL
+    CACHE_POOL_SIZE: int = int(os.getenv("CACHE_POOL_SIZE", "4"))
+    CACHE_NEAR_TTL: float = float(os.getenv("CACHE_NEAR_TTL", "30"))
+    CACHE_PURGE_INTERVAL: float = float(os.getenv("CACHE_PURGE_INTERVAL", "300"))
+    
+    # Batched chat_history writer: rows per COPY, max wait before a partial batch, queue bound
+    CHAT_WRITE_BATCH_SIZE: int = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "500"))
+    CHAT_WRITE_FLUSH_INTERVAL: float = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "1.0"))
+    CHAT_WRITE_MAX_QUEUE: int = int(os.getenv("CHAT_WRITE_MAX_QUEUE", "10000"))
+    CHAT_WRITE_SHUTDOWN_TIMEOUT: float = float(os.getenv("CHAT_WRITE_SHUTDOWN_TIMEOUT", "10"))
+    # Longest a history read waits for the session's queued turns to be written (seconds)
+    CHAT_HISTORY_FLUSH_TIMEOUT: float = float(os.getenv("CHAT_HISTORY_FLUSH_TIMEOUT", "2"))
+    
+    # Cache of explanations for history-free turns (similarity 0 disables near-duplicate matching)
+    EXPLANATION_CACHE_MAX_SIZE: int = int(os.getenv("EXPLANATION_CACHE_MAX_SIZE", "2048"))
+    EXPLANATION_CACHE_TTL: float = float(os.getenv("EXPLANATION_CACHE_TTL", "600"))
+    EXPLANATION_CACHE_SIMILARITY: float = float(os.getenv("EXPLANATION_CACHE_SIMILARITY", "0"))
+    
+    # Per-session conversation state (recent turns, last cities)
+    SESSION_STORE_MAX_SESSIONS: int = int(os.getenv("SESSION_STORE_MAX_SESSIONS", "10000"))
+    SESSION_STORE_IDLE_TTL: float = float(os.getenv("SESSION_STORE_IDLE_TTL", "1800"))
+    SESSION_STORE_MAX_TURNS: int = int(os.getenv("SESSION_STORE_MAX_TURNS", "10"))
+    
+    # Explanation prompt token budget: instructions and weather data come first, the conversation
+    # gets the rest up to its own cap. Turns the session no longer keeps live on in a rolling
+    # summary of at most SESSION_SUMMARY_MAX_TOKENS.
+    EXPLANATION_PROMPT_TOKEN_BUDGET: int = int(os.getenv("EXPLANATION_PROMPT_TOKEN_BUDGET", "3000"))
+    EXPLANATION_HISTORY_TOKEN_BUDGET: int = int(os.getenv("EXPLANATION_HISTORY_TOKEN_BUDGET", "600"))
+    SESSION_SUMMARY_MAX_TOKENS: int = int(os.getenv("SESSION_SUMMARY_MAX_TOKENS", "150"))
+    
+    # Upstream governor: per-dependency concurrency, per-stage deadlines (seconds) and circuit breakers
+    OWM_MAX_CONCURRENCY: int = int(os.getenv("OWM_MAX_CONCURRENCY", "20"))
+    OWM_REQUEST_TIMEOUT: float = float(os.getenv("OWM_REQUEST_TIMEOUT", "4"))
+    OWM_MAX_RETRIES: int = int(os.getenv("OWM_MAX_RETRIES", "2"))
+    WEATHER_FETCH_DEADLINE: float = float(os.getenv("WEATHER_FETCH_DEADLINE", "8"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_ANALYSIS_DEADLINE: float = float(os.getenv("LLM_ANALYSIS_DEADLINE", "10"))
+    LLM_EXPLANATION_DEADLINE: float = float(os.getenv("LLM_EXPLANATION_DEADLINE", "25"))
+    # Total time budget of one query: LLM calls get what is left, and a call that cannot finish in it
+    # is skipped for its fallback (history inference) or the template answer (explanation)
+    QUERY_DEADLINE: float = float(os.getenv("QUERY_DEADLINE", "30"))
+    # Hedged LLM calls: a duplicate is sent when a call passes its prompt type's observed
+    # LLM_HEDGE_QUANTILE latency (over the last LLM_LATENCY_WINDOW calls, once LLM_HEDGE_MIN_SAMPLES
+    # are in), for at most LLM_HEDGE_MAX_RATIO of the calls
+    LLM_HEDGING_ENABLED: bool = os.getenv("LLM_HEDGING_ENABLED", "True").lower() == "true"
+    LLM_HEDGE_QUANTILE: float = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_HEDGE_MAX_RATIO: float = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+    LLM_LATENCY_WINDOW: int = int(os.getenv("LLM_LATENCY_WINDOW", "500"))
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_TIMEOUT: float = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+    # How long past expiry cached weather may still be served while OpenWeatherMap is failing
+    WEATHER_CACHE_STALE_TTL: float = float(os.getenv("WEATHER_CACHE_STALE_TTL", "3600"))
+    
+    # Background pre-warming of hot cities' weather before their cache entries expire
+    PREWARM_ENABLED: bool = os.getenv("PREWARM_ENABLED", "True").lower() == "true"
+    PREWARM_TOP_K: int = int(os.getenv("PREWARM_TOP_K", "20"))
+    PREWARM_LEAD_TIME: float = float(os.getenv("PREWARM_LEAD_TIME", "90"))
+    PREWARM_INTERVAL: float = float(os.getenv("PREWARM_INTERVAL", "30"))
+    PREWARM_CALLS_PER_MINUTE: float = float(os.getenv("PREWARM_CALLS_PER_MINUTE", "30"))
+    PREWARM_MIN_REQUESTS: float = float(os.getenv("PREWARM_MIN_REQUESTS", "3"))
+    PREWARM_HALF_LIFE: float = float(os.getenv("PREWARM_HALF_LIFE", "1800"))
+    PREWARM_MAX_TRACKED: int = int(os.getenv("PREWARM_MAX_TRACKED", "2000"))
+    
+    # Admission control in front of the query endpoints: in-flight pipelines, a fair queue across
+    # sessions (queries that would wait longer than ADMISSION_QUEUE_TIMEOUT get 503), and token
+    # buckets per session and per client address (queries/second and burst; rate 0 disables)
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "True").lower() == "true"
+    ADMISSION_MAX_IN_FLIGHT: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+    ADMISSION_SESSION_RATE: float = float(os.getenv("ADMISSION_SESSION_RATE", "2"))
+    ADMISSION_SESSION_BURST: float = float(os.getenv("ADMISSION_SESSION_BURST", "10"))
+    ADMISSION_CLIENT_RATE: float = float(os.getenv("ADMISSION_CLIENT_RATE", "20"))
+    ADMISSION_CLIENT_BURST: float = float(os.getenv("ADMISSION_CLIENT_BURST", "60"))
+    # Reverse proxies in front of the app that append the connecting address to X-Forwarded-For
+    # (the hosting router counts as one); the client bucket is keyed on the address the outermost
+    # of them saw. 0 uses the socket peer, which behind a proxy is the proxy for every user; set it
+    # only where that many proxies really append, since otherwise the keyed entry is client-supplied.
+    ADMISSION_TRUSTED_PROXY_HOPS: int = int(os.getenv("ADMISSION_TRUSTED_PROXY_HOPS", "0"))
+    ADMISSION_MAX_TRACKED: int = int(os.getenv("ADMISSION_MAX_TRACKED", "10000"))
+    
+    # Batch query endpoint: max queries per request and how many run their pipelines at once
+    BATCH_MAX_QUERIES: int = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+    
+    # Logging (LOG_FORMAT: text or json) and optional OpenTelemetry span export
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").lower()
+    OTEL_ENABLED: bool = os.getenv("OTEL_ENABLED", "False").lower() == "true"
+    OTEL_SERVICE_NAME: str = os.getenv("OTEL_SERVICE_NAME", "weather-ai-agent")
+    
     # Project metadata
     PROJECT_NAME: str = "Weather AI Agent"
     PROJECT_DESCRIPTION: str = "An AI-powered weather agent using LangChain and Gemini"
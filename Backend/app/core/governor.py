@@ -0,0 +1,245 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import observe_upstream, stats_collector
+
+T = TypeVar("T")
+
+class DependencyUnavailableError(Exception):
+    """An upstream dependency is down, overloaded or did not answer within its deadline"""
+
+    def __init__(self, dependency: str, message: str, retry_after: float = 1.0):
+        super().__init__(f"{dependency} unavailable: {message}")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+class CircuitOpenError(DependencyUnavailableError):
+    pass
+
+class DeadlineExceededError(DependencyUnavailableError):
+    pass
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. After `failure_threshold` failures in a
+    row the circuit opens and calls are rejected for `reset_timeout` seconds;
+    then a single probe call is let through (half-open), whose outcome closes or
+    re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        if self.state == self.CLOSED:
+            return 1.0
+        return max(1.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opens += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Gives up an allowed call without a verdict (cancelled, or never reached the dependency)"""
+        self._probe_in_flight = False
+
+class DependencyGovernor:
+    """
+    Guards every call to one upstream dependency: at most `max_concurrency` calls
+    run at once (the rest queue), each call must finish within its deadline
+    (queueing included), failures feed a circuit breaker, and idempotent calls
+    may be retried with full-jitter exponential backoff inside the same deadline.
+    `is_failure` decides which exceptions count against the dependency (e.g. a
+    404 for an unknown city does not).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_retries: int = 0,
+        failure_threshold: int = settings.BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = settings.BREAKER_RESET_TIMEOUT,
+        is_failure: Callable[[BaseException], bool] = lambda e: True,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.is_failure = is_failure
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.deadline_exceeded = 0
+        self.retries = 0
+        governors[name] = self
+
+    @asynccontextmanager
+    async def _slot(self, timeout: float, operation: str) -> AsyncIterator[None]:
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(self.name, "circuit open", self.breaker.retry_after())
+        acquired = False
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), max(timeout, 0))
+                acquired = True
+            except asyncio.TimeoutError:
+                self.deadline_exceeded += 1
+                raise DeadlineExceededError(self.name, "no free slot before the deadline") from None
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            self.calls += 1
+            with observe_upstream(self.name, operation):
+                yield
+            self.breaker.record_success()
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if not acquired:
+                self.breaker.release()
+            elif isinstance(e, DeadlineExceededError) or self.is_failure(e):
+                self.failures += 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        finally:
+            if acquired:
+                self.in_flight -= 1
+                self._semaphore.release()
+
+    async def call(self, fn: Callable[[], Awaitable[T]], deadline: float, retry: bool = False, operation: str = "call") -> T:
+        """
+        Runs fn() under the governor. `deadline` (seconds) bounds queueing, every
+        attempt and the backoff between them; `retry` must only be set for idempotent calls.
+        `operation` labels the call in the upstream latency histogram.
+        """
+        deadline_at = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            try:
+                async with self._slot(deadline_at - time.monotonic(), operation):
+                    try:
+                        return await asyncio.wait_for(fn(), max(deadline_at - time.monotonic(), 0))
+                    except asyncio.TimeoutError:
+                        self.deadline_exceeded += 1
+                        raise DeadlineExceededError(self.name, f"no response within {deadline}s") from None
+            except DependencyUnavailableError:
+                raise
+            except Exception as e:
+                if not retry or attempt >= self.max_retries or not self.is_failure(e):
+                    raise
+                attempt += 1
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[T]], deadline: float, operation: str = "stream") -> AsyncIterator[T]:
+        """Streaming counterpart of call(): the whole stream, not just its first chunk, must end within `deadline`"""
+        deadline_at = time.monotonic() + deadline
+        async with self._slot(deadline, operation):
+            iterator = open_stream().__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), max(deadline_at - time.monotonic(), 0))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.deadline_exceeded += 1
+                        raise DeadlineExceededError(self.name, f"stream did not finish within {deadline}s") from None
+                    yield chunk
+            finally:
+                aclose = getattr(iterator, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "breaker_opens": self.breaker.opens,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "deadline_exceeded": self.deadline_exceeded,
+            "retries": self.retries
+        }
+
+governors: Dict[str, DependencyGovernor] = {}
+
+def is_transient_http_error(e: BaseException) -> bool:
+    """Timeouts, connection errors, 429 and 5xx; client errors such as 404 mean the upstream is healthy"""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(e, (httpx.TransportError, asyncio.TimeoutError, DeadlineExceededError))
+
+def is_dependency_failure(e: BaseException) -> bool:
+    """Whether an error means the dependency itself is failing, so cached or degraded data may stand in"""
+    return isinstance(e, DependencyUnavailableError) or is_transient_http_error(e)
+
+# Process-wide governors, one per upstream dependency
+owm_governor = DependencyGovernor(
+    "openweathermap",
+    max_concurrency=settings.OWM_MAX_CONCURRENCY,
+    max_retries=settings.OWM_MAX_RETRIES,
+    is_failure=is_transient_http_error
+)
+llm_governor = DependencyGovernor("gemini", max_concurrency=settings.LLM_MAX_CONCURRENCY)
+
+def governor_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: governor.stats() for name, governor in governors.items()}
+
+stats_collector.register("dependency", governor_stats, label="dependency")
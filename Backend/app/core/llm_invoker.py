@@ -0,0 +1,226 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.governor import DeadlineExceededError, DependencyGovernor, llm_governor
+from app.core.metrics import stats_collector
+
+T = TypeVar("T")
+
+# Monotonic time by which the current query must be answered; tasks started for it inherit it
+_query_deadline: ContextVar[Optional[float]] = ContextVar("query_deadline", default=None)
+
+@contextmanager
+def query_deadline(seconds: float) -> Iterator[None]:
+    """Gives the LLM calls made inside the block (and in tasks started from it) `seconds` in total"""
+    token = _query_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        try:
+            _query_deadline.reset(token)
+        except ValueError:
+            # An abandoned streaming generator is closed from another context, which never saw the deadline
+            pass
+
+def remaining_budget() -> float:
+    """Seconds left of the current query's deadline (infinite outside query_deadline())"""
+    deadline_at = _query_deadline.get()
+    return math.inf if deadline_at is None else deadline_at - time.monotonic()
+
+class LatencyTracker:
+    """Latencies of the last `window` calls of one prompt type, with quantiles over them"""
+
+    def __init__(self, window: int):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._sorted: Optional[List[float]] = None
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+class HedgedInvoker:
+    """
+    Deadline-aware LLM calls on top of a DependencyGovernor, with latency kept
+    per prompt type over a sliding window.
+
+    A call still running when it reaches its prompt type's observed
+    `hedge_quantile` latency gets a duplicate; the first answer wins and the
+    other is cancelled. Hedges are only sent while the governor has free slots
+    and a closed breaker, and for at most `max_hedge_ratio` of the calls, so
+    they cannot add load when the model is slow for everyone.
+
+    Every call is also bounded by what is left of the query's deadline (see
+    query_deadline()). A call that cannot finish in that time, i.e. less is left
+    than its prompt type's median latency, fails at once with
+    DeadlineExceededError, so callers fall back straight away instead of
+    waiting for a timeout.
+    """
+
+    def __init__(
+        self,
+        governor: DependencyGovernor,
+        hedging: bool = settings.LLM_HEDGING_ENABLED,
+        hedge_quantile: float = settings.LLM_HEDGE_QUANTILE,
+        min_samples: int = settings.LLM_HEDGE_MIN_SAMPLES,
+        max_hedge_ratio: float = settings.LLM_HEDGE_MAX_RATIO,
+        window: int = settings.LLM_LATENCY_WINDOW
+    ):
+        self.governor = governor
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.window = window
+        self.latencies: Dict[str, LatencyTracker] = {}
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, prompt_type: str, key: str) -> None:
+        counts = self.counts.setdefault(prompt_type, {"calls": 0, "hedges": 0, "hedge_wins": 0, "budget_exhausted": 0})
+        counts[key] += 1
+
+    def _tracker(self, prompt_type: str) -> LatencyTracker:
+        tracker = self.latencies.get(prompt_type)
+        if tracker is None:
+            tracker = self.latencies[prompt_type] = LatencyTracker(self.window)
+        return tracker
+
+    def expected_latency(self, prompt_type: str, q: float = 0.5) -> float:
+        """Observed latency quantile of a prompt type, 0 until it has been called"""
+        return self._tracker(prompt_type).quantile(q) or 0.0
+
+    def can_afford(self, *prompt_types: str) -> bool:
+        """Whether the query's remaining budget covers the typical latency of these calls in sequence"""
+        return remaining_budget() >= sum(self.expected_latency(prompt_type) for prompt_type in prompt_types)
+
+    def _time_limit(self, deadline: float, prompt_type: str) -> float:
+        remaining = remaining_budget()
+        if remaining <= self.expected_latency(prompt_type):
+            self._count(prompt_type, "budget_exhausted")
+            raise DeadlineExceededError(self.governor.name, f"{max(remaining, 0):.1f}s left of the query deadline, too little for {prompt_type}")
+        return min(deadline, remaining)
+
+    def _may_hedge(self, prompt_type: str) -> bool:
+        counts = self.counts[prompt_type]
+        return (
+            self.governor.breaker.state == self.governor.breaker.CLOSED
+            and self.governor.waiting == 0
+            and self.governor.in_flight < self.governor.max_concurrency
+            and counts["hedges"] < self.max_hedge_ratio * counts["calls"]
+        )
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]], deadline: float, operation: str, tracker: LatencyTracker) -> T:
+        started = time.monotonic()
+        result = await self.governor.call(fn, deadline=deadline, operation=operation)
+        tracker.observe(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[T]], deadline: float, operation: str, prompt_type: str) -> T:
+        tracker = self._tracker(prompt_type)
+        hedge_after = tracker.quantile(self.hedge_quantile) if self.hedging and len(tracker) >= self.min_samples else None
+        started = time.monotonic()
+        primary = asyncio.create_task(self._attempt(fn, deadline, operation, tracker))
+        if hedge_after is None:
+            return await primary
+        hedge = None
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if not done and self._may_hedge(prompt_type):
+                self._count(prompt_type, "hedges")
+                hedge = asyncio.create_task(self._attempt(fn, deadline - (time.monotonic() - started), operation, tracker))
+                pending.add(hedge)
+            error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count(prompt_type, "hedge_wins")
+                            # The primary's latency is at least this; keep the slow tail in the window
+                            tracker.observe(time.monotonic() - started)
+                        return task.result()
+                    error = error or task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, fn: Callable[[], Awaitable[T]], deadline: float, operation: str = "call", prompt_type: Optional[str] = None) -> T:
+        """
+        Drop-in for DependencyGovernor.call (non-retried). Latency is tracked under
+        `prompt_type` (default: `operation`).
+        """
+        prompt_type = prompt_type or operation
+        time_limit = self._time_limit(deadline, prompt_type)
+        self._count(prompt_type, "calls")
+        if time_limit >= deadline:
+            return await self._hedged(fn, deadline, operation, prompt_type)
+        # Cut short by the query deadline: the model is not at fault, so time out outside the governor
+        try:
+            return await asyncio.wait_for(self._hedged(fn, deadline, operation, prompt_type), time_limit)
+        except asyncio.TimeoutError:
+            self._count(prompt_type, "budget_exhausted")
+            raise DeadlineExceededError(self.governor.name, "query deadline reached") from None
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[T]], deadline: float, operation: str = "stream", prompt_type: Optional[str] = None) -> AsyncIterator[T]:
+        """
+        Drop-in for DependencyGovernor.stream, bounded by the query deadline. Streams
+        are not hedged: a duplicate could only take over before the first chunk.
+        """
+        prompt_type = prompt_type or operation
+        time_limit = self._time_limit(deadline, prompt_type)
+        self._count(prompt_type, "calls")
+        started = time.monotonic()
+        chunks = self.governor.stream(open_stream, deadline=deadline, operation=operation).__aiter__()
+        try:
+            while True:
+                try:
+                    if time_limit >= deadline:
+                        chunk = await chunks.__anext__()
+                    else:
+                        # Cut short by the query deadline: the model is not at fault, so time out outside the governor
+                        chunk = await asyncio.wait_for(chunks.__anext__(), max(started + time_limit - time.monotonic(), 0))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self._count(prompt_type, "budget_exhausted")
+                    raise DeadlineExceededError(self.governor.name, "query deadline reached") from None
+                yield chunk
+        finally:
+            await chunks.aclose()
+        self._tracker(prompt_type).observe(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        stats = {}
+        for prompt_type, tracker in self.latencies.items():
+            stats[prompt_type] = {
+                "samples": len(tracker),
+                **{
+                    f"p{round(q * 100)}_ms": round(tracker.quantile(q) * 1000, 1) if len(tracker) else None
+                    for q in (0.5, 0.95, 0.99)
+                },
+                **self.counts.get(prompt_type, {})
+            }
+        return stats
+
+# Process-wide, for every Gemini call
+llm_invoker = HedgedInvoker(llm_governor)
+
+stats_collector.register("llm", llm_invoker.stats, label="prompt")
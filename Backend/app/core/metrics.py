@@ -0,0 +1,127 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+STAGE_DURATION = Histogram(
+    "weather_ai_stage_duration_seconds",
+    "Duration of query pipeline stages (safeguard_llm, extraction_llm, history_inference, weather_fetch, explanation_llm, ...)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+UPSTREAM_DURATION = Histogram(
+    "weather_ai_upstream_duration_seconds",
+    "Duration of single calls to OpenWeatherMap (per endpoint), Gemini (per prompt type) and Postgres (per operation)",
+    ["dependency", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "weather_ai_llm_tokens",
+    "Tokens reported by the LLM, per prompt type",
+    ["prompt", "direction"]
+)
+PROMPT_TOKENS_ESTIMATED = Histogram(
+    "weather_ai_explanation_prompt_tokens_estimated",
+    "Estimated size of the explanation prompt in tokens",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+PROMPT_SECTION_TOKENS = Histogram(
+    "weather_ai_explanation_prompt_section_tokens_estimated",
+    "Estimated tokens per section of the explanation prompt",
+    ["section"],
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000)
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "weather_ai_admission_queue_wait_seconds",
+    "Time admitted queries waited for an in-flight slot",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+)
+ADMISSION_QUEUE_DEPTH = Histogram(
+    "weather_ai_admission_queue_depth",
+    "Admission queue depth seen by arriving queries",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+QUERIES_IN_FLIGHT = Gauge("weather_ai_queries_in_flight", "Queries currently being processed", ["mode"])
+
+@contextmanager
+def observe_upstream(dependency: str, operation: str) -> Iterator[None]:
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except GeneratorExit:
+        outcome = "ok"
+        raise
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        UPSTREAM_DURATION.labels(dependency, operation, outcome).observe(time.perf_counter() - started)
+
+def record_llm_usage(prompt: str, usage: Optional[Dict[str, Any]]) -> None:
+    """Adds the usage_metadata of an LLM response (if the model reported one) to the token counters"""
+    if not usage or not any(usage.values()):
+        return
+    LLM_TOKENS.labels(prompt, "input").inc(usage.get("input_tokens") or 0)
+    LLM_TOKENS.labels(prompt, "output").inc(usage.get("output_tokens") or 0)
+
+# stats() keys that only ever increase; everything else is exported as a gauge
+COUNTER_KEYS = {
+    "hits", "misses", "evictions", "expirations", "coalesced", "upstream_calls", "stale_served",
+    "similar_hits", "saved_llm_ms", "attempts", "weather_hits", "greeting_hits", "deferred_to_llm",
+    "write_errors", "calls", "failures", "rejected", "deadline_exceeded", "retries", "breaker_opens",
+    "batches", "written_rows", "dropped_rows", "backpressure_waits", "refreshes", "rounds", "refreshed",
+    "refresh_failures", "budget_deferred", "group_fetches", "group_keys",
+    "far_hits", "far_misses", "far_errors", "invalidated", "shared_hits", "shared_errors", "invalidations_received",
+    "purged_rows", "admitted", "rate_limited", "shed", "timed_out",
+    "hedges", "hedge_wins", "budget_exhausted"
+}
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+class StatsCollector:
+    """
+    Exports the stats() dictionaries of in-process components (caches, session
+    store, dependency governors, database pool) at scrape time, so hit ratios,
+    queue depths and in-flight gauges cost nothing between scrapes.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Tuple[Callable[[], Dict[str, Any]], Optional[str]]] = {}
+
+    def register(self, name: str, stats: Callable[[], Dict[str, Any]], label: Optional[str] = None) -> None:
+        """`label`: stats() returns {label value: stats dict}, exported under that label"""
+        self._sources[name] = (stats, label)
+
+    @staticmethod
+    def _flatten(stats: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, bool, float]]:
+        """Yields (metric suffix, is_counter, value) for every numeric leaf"""
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                yield from StatsCollector._flatten(value, f"{prefix}{key}_")
+            elif key == "breaker_state":
+                yield f"{prefix}{key}", False, BREAKER_STATES.get(value, -1)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}{key}", key in COUNTER_KEYS, value
+
+    def collect(self):
+        families: Dict[str, Any] = {}
+        for name, (stats, label) in list(self._sources.items()):
+            groups = stats() if label else {None: stats()}
+            for label_value, group in groups.items():
+                for key, is_counter, value in self._flatten(group):
+                    metric = f"weather_ai_{name}_{key}"
+                    family = families.get(metric)
+                    if family is None:
+                        kind = CounterMetricFamily if is_counter else GaugeMetricFamily
+                        family = families[metric] = kind(metric, f"{name} {key}", labels=[label] if label else [])
+                    family.add_metric([label_value] if label else [], value)
+        return list(families.values())
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
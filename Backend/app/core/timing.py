@@ -0,0 +1,101 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Coroutine, Deque, Dict, Iterator, Optional
+from app.core import tracing
+from app.core.metrics import STAGE_DURATION
+
+class StageLatencyRecorder:
+    """Keeps a sliding window of recent durations per stage and reports percentiles"""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, stage: str, duration_ms: float) -> None:
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window)
+        samples.append(duration_ms)
+
+    @staticmethod
+    def _percentile(ordered, fraction: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for stage, samples in self._samples.items():
+            ordered = sorted(samples)
+            result[stage] = {
+                "count": len(ordered),
+                "p50_ms": round(self._percentile(ordered, 0.50), 1),
+                "p95_ms": round(self._percentile(ordered, 0.95), 1),
+                "max_ms": round(ordered[-1], 1)
+            }
+        return result
+
+# Process-wide recorder, exposed through the stats endpoint
+stage_latencies = StageLatencyRecorder()
+
+class StageTimings:
+    """
+    Collects wall-clock durations of the named pipeline stages of one request,
+    feeding the stage histograms and, when tracing is on, one span per stage
+    under a span for the whole request.
+    """
+
+    def __init__(self, recorder: Optional[StageLatencyRecorder] = stage_latencies, span_name: str = "weather_query"):
+        self.recorder = recorder
+        self.durations_ms: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._span = tracing.start_span(span_name)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            with tracing.span(name, parent=self._span):
+                yield
+        except asyncio.CancelledError:
+            # A cancelled stage did no useful work; keep it out of the latency figures
+            raise
+        except BaseException:
+            self._record(name, started)
+            raise
+        else:
+            self._record(name, started)
+
+    def start(self, name: str, coro: Coroutine[Any, Any, Any]) -> "asyncio.Task[Any]":
+        """Runs `coro` as a task whose duration is recorded under `name` unless it is cancelled"""
+        started = time.perf_counter()
+        span = tracing.start_span(name, parent=self._span)
+        task = asyncio.create_task(coro)
+
+        def on_done(done: "asyncio.Task[Any]") -> None:
+            if span is not None:
+                span.end()
+            if not done.cancelled():
+                self._record(name, started)
+
+        task.add_done_callback(on_done)
+        return task
+
+    def mark(self, name: str) -> None:
+        """Records the time elapsed since the request started, e.g. time to first token"""
+        self._record(name, self._started)
+
+    def _record(self, name: str, started: float) -> None:
+        duration_ms = (time.perf_counter() - started) * 1000
+        self.durations_ms[name] = duration_ms
+        STAGE_DURATION.labels(name).observe(duration_ms / 1000)
+        if self.recorder:
+            self.recorder.observe(name, duration_ms)
+
+    def finish(self) -> Dict[str, float]:
+        """Records the end-to-end duration and returns all stage durations (ms)"""
+        self._record("total", self._started)
+        if self._span is not None:
+            self._span.end()
+        return {name: round(duration, 1) for name, duration in self.durations_ms.items()}
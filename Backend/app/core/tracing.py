@@ -0,0 +1,59 @@
+import logging
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Set by init_tracing() when OpenTelemetry export is enabled; None keeps every helper a no-op
+_tracer: Any = None
+_provider: Any = None
+
+def init_tracing() -> None:
+    """
+    Exports pipeline spans over OTLP when OTEL_ENABLED is set. OpenTelemetry is an
+    optional dependency (opentelemetry-sdk, opentelemetry-exporter-otlp-proto-http);
+    the exporter reads the standard OTEL_EXPORTER_OTLP_* environment variables.
+    """
+    global _tracer, _provider
+    if not settings.OTEL_ENABLED or _tracer is not None:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("OTEL_ENABLED is set but the OpenTelemetry SDK/OTLP exporter is not installed; tracing disabled")
+        return
+    _provider = TracerProvider(resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME}))
+    _provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("weather-ai-agent")
+    logger.info("OpenTelemetry span export enabled")
+
+def shutdown_tracing() -> None:
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = _provider = None
+
+def start_span(name: str, parent: Any = None, **attributes: Any) -> Any:
+    """Starts a span that the caller must end(); None when tracing is off"""
+    if _tracer is None:
+        return None
+    from opentelemetry import trace
+    context = trace.set_span_in_context(parent) if parent is not None else None
+    return _tracer.start_span(name, context=context, attributes=attributes or None)
+
+@contextmanager
+def span(name: str, parent: Any = None, **attributes: Any) -> Iterator[Optional[Any]]:
+    current = start_span(name, parent, **attributes)
+    if current is None:
+        yield None
+        return
+    from opentelemetry import trace
+    with trace.use_span(current, end_on_exit=True, record_exception=True):
+        yield current
@@ -1,19 +1,212 @@
 import os
 # from supabase import create_client, Client # Remove this
+import asyncio
+import heapq
+import logging
 import asyncpg # Add this
 from app.core.config import settings
-from typing import List, Dict, Any, Optional
+from app.core.metrics import observe_upstream, stats_collector
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Dict, Any, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+ChatRow = Tuple[Optional[str], str, str, datetime]
+
+class ChatHistoryWriter:
+    """
+    Batches chat_history inserts through a bounded asyncio queue.
+
+    A background task writes queued rows once `batch_size` rows are waiting or
+    `flush_interval` seconds after the first one arrived, holding one pooled
+    connection per batch instead of one per turn. When the queue is full, `put`
+    waits (backpressure) instead of growing memory without bound.
+
+    A failed batch is retried with backoff in a task of its own, and dropped
+    after `max_attempts`, while newer batches keep flushing on schedule. Rows
+    waiting for a retry are bounded by `max_queue` too, so a database that stays
+    down still ends in backpressure rather than unbounded memory. `flush(upto)`
+    waits by row position, so it returns only once every row queued before
+    `upto` is settled, however the batches holding them finished.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[ChatRow]], Awaitable[None]],
+        batch_size: int = settings.CHAT_WRITE_BATCH_SIZE,
+        flush_interval: float = settings.CHAT_WRITE_FLUSH_INTERVAL,
+        max_queue: int = settings.CHAT_WRITE_MAX_QUEUE,
+        max_attempts: int = 5
+    ):
+        self.write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_queue = max_queue
+        self._queue: "asyncio.Queue[ChatRow]" = asyncio.Queue(maxsize=max_queue)
+        self._ready = asyncio.Event()
+        self._processed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        # Failed batches waiting to be retried -> their row count
+        self._retrying: Dict[asyncio.Task, int] = {}
+        # Unwritten rows per session, so readers know when the table is behind
+        self._pending_sessions: Counter = Counter()
+        self.enqueued = 0
+        self.processed = 0
+        self._flush_until = 0
+        # Rows are numbered in queue order; batches cover consecutive numbers but, with
+        # retries running beside newer batches, can settle in any order
+        self._taken = 0
+        self._unsettled: List[Tuple[int, int]] = []
+        self._settled: Set[int] = set()
+        self.batches = 0
+        self.written_rows = 0
+        self.dropped_rows = 0
+        self.retries = 0
+        self.backpressure_waits = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = settings.CHAT_WRITE_SHUTDOWN_TIMEOUT) -> None:
+        """Drains queued rows (for up to `timeout` seconds) and stops the writer task"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Chat history writer did not drain within %ss; %s rows were not saved.", timeout, self._queue.qsize())
+        tasks = [self._task, *self._retrying]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._retrying.clear()
+
+    async def put(self, row: ChatRow) -> None:
+        if self._queue.full():
+            self.backpressure_waits += 1
+        await self._queue.put(row)
+        self.enqueued += 1
+        self._pending_sessions[row[0]] += 1
+        # +1 for the row the writer may already hold while waiting for the batch to fill
+        if self._queue.qsize() + 1 >= self.batch_size:
+            self._ready.set()
+
+    def has_pending(self, session_id: Optional[str]) -> bool:
+        return self._pending_sessions[session_id] > 0
+
+    def settled_below(self) -> int:
+        """Every row queued before this position has been written or dropped"""
+        while self._unsettled and self._unsettled[0][0] in self._settled:
+            self._settled.discard(heapq.heappop(self._unsettled)[0])
+        return self._unsettled[0][0] if self._unsettled else self._taken
+
+    async def flush(self, upto: Optional[int] = None) -> None:
+        """
+        Writes everything queued so far, or the first `upto` rows ever queued
+        (see `enqueued`), without waiting for the batch thresholds
+        """
+        target = self.enqueued if upto is None else min(upto, self.enqueued)
+        if self.settled_below() >= target:
+            return
+        self._flush_until = max(self._flush_until, target)
+        self._ready.set()
+        async with self._processed:
+            await self._processed.wait_for(lambda: self.settled_below() >= target)
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() + 1 < self.batch_size and self._flush_until <= self._taken + 1:
+                try:
+                    await asyncio.wait_for(self._ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._ready.clear()
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            start = self._taken
+            self._taken += len(batch)
+            heapq.heappush(self._unsettled, (start, self._taken))
+            if await self._try_write(batch, 1):
+                await self._done(start, batch)
+            else:
+                await self._retry_later(start, batch)
+
+    async def _try_write(self, batch: List[ChatRow], attempt: int) -> bool:
+        """True once the batch is settled: written, or dropped after its last attempt"""
+        try:
+            await self.write(batch)
+        except Exception as e:
+            if attempt == self.max_attempts:
+                self.dropped_rows += len(batch)
+                logger.error("Error saving %s chat messages to database, giving up after %s attempts: %s", len(batch), attempt, e)
+                return True
+            self.retries += 1
+            logger.error("Error saving %s chat messages to database (attempt %s), retrying: %s", len(batch), attempt, e)
+            return False
+        self.batches += 1
+        self.written_rows += len(batch)
+        return True
+
+    async def _retry_later(self, start: int, batch: List[ChatRow]) -> None:
+        """Hands a failed batch to a retry task; waits for older retries first when too many rows are in them"""
+        while self._retrying and sum(self._retrying.values()) + len(batch) > self.max_queue:
+            await asyncio.wait(list(self._retrying), return_when=asyncio.FIRST_COMPLETED)
+        task = asyncio.create_task(self._retry(start, batch))
+        self._retrying[task] = len(batch)
+
+    async def _retry(self, start: int, batch: List[ChatRow]) -> None:
+        attempt = 1
+        try:
+            while True:
+                await asyncio.sleep(min(0.5 * 2 ** attempt, 10.0))
+                attempt += 1
+                if await self._try_write(batch, attempt):
+                    break
+        finally:
+            self._retrying.pop(asyncio.current_task(), None)
+        await self._done(start, batch)
+
+    async def _done(self, start: int, batch: List[ChatRow]) -> None:
+        """Books the batch of rows numbered from `start` as processed, whether written or dropped"""
+        for row in batch:
+            self._pending_sessions[row[0]] -= 1
+            if self._pending_sessions[row[0]] <= 0:
+                del self._pending_sessions[row[0]]
+            self._queue.task_done()
+        self.processed += len(batch)
+        self._settled.add(start)
+        async with self._processed:
+            self._processed.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "written_rows": self.written_rows,
+            "dropped_rows": self.dropped_rows,
+            "retries": self.retries,
+            "retrying_rows": sum(self._retrying.values()),
+            "backpressure_waits": self.backpressure_waits
+        }
 
 # Consider renaming SupabaseDB to something like AppDB or DatabaseService
 # as it no longer uses the Supabase client library directly.
 class SupabaseDB:
     _pool: Optional[asyncpg.Pool] = None
+    _writer: Optional[ChatHistoryWriter] = None
 
     @classmethod
     async def init_db_pool(cls):
         if cls._pool is None:
             if not settings.DATABASE_URL:
-                print("CRITICAL: DATABASE_URL is not set. Cannot initialize database pool.")
+                logger.critical("DATABASE_URL is not set. Cannot initialize database pool.")
                 # This will stop the application if DATABASE_URL is missing
                 raise ConnectionError("DATABASE_URL is not set. Cannot initialize database pool.")
             try:
@@ -22,9 +215,11 @@ class SupabaseDB:
                     min_size=1, # Minimum number of connections in the pool
                     max_size=10 # Maximum number of connections in the pool
                 )
-                print("Successfully connected to the database and created connection pool.")
+                logger.info("Successfully connected to the database and created connection pool.")
+                cls._writer = ChatHistoryWriter(cls._copy_chat_rows)
+                cls._writer.start()
             except Exception as e:
-                print(f"CRITICAL: Failed to create database connection pool: {e}")
+                logger.critical("Failed to create database connection pool: %s", e)
                 # Re-raising the exception here is key.
                 # If the pool can't be created (e.g., DB is down, bad credentials),
                 # this exception will propagate up and halt FastAPI startup.
@@ -32,74 +227,144 @@ class SupabaseDB:
 
     @classmethod
     async def close_db_pool(cls):
+        if cls._writer:
+            # Drain queued chat turns while the pool can still write them
+            await cls._writer.close()
+            cls._writer = None
         if cls._pool:
             await cls._pool.close()
             cls._pool = None
-            print("Database connection pool closed.")
+            logger.info("Database connection pool closed.")
 
     def __init__(self):
         # __init__ is now very simple. The pool is managed at class level.
         if self.__class__._pool is None:
             # This indicates init_db_pool was not called or failed.
             # Methods will check and fail if pool isn't ready.
-            print("Warning: SupabaseDB instance created but pool is not initialized. Call SupabaseDB.init_db_pool() at application startup.")
+            logger.warning("SupabaseDB instance created but pool is not initialized. Call SupabaseDB.init_db_pool() at application startup.")
             pass
 
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Pool occupancy and chat writer queue statistics"""
+        pool = cls._pool
+        return {
+            "pool_size": pool.get_size() if pool else 0,
+            "pool_idle": pool.get_idle_size() if pool else 0,
+            "pool_max_size": pool.get_max_size() if pool else 0,
+            "chat_writer": cls._writer.stats() if cls._writer else None
+        }
+
     async def save_chat_message(self, session_id: Optional[str], user_message: str, ai_response: str) -> None:
+        """Writes one turn immediately, on its own pooled connection"""
         if self.__class__._pool is None:
-            print("Error: Database pool not initialized. Cannot save chat message.")
+            logger.error("Database pool not initialized. Cannot save chat message.")
             raise RuntimeError("Database pool not initialized. Call SupabaseDB.init_db_pool() at application startup.")
 
         query = """
             INSERT INTO chat_history (session_id, user_message, ai_response)
-            VALUES ($1, $2, $3)
-            RETURNING id;
+            VALUES ($1, $2, $3);
         """
         try:
-            async with self.__class__._pool.acquire() as conn:
-                # Ensure table and column names match your schema exactly.
-                # Supabase default table 'chat_history' might have UUID 'id' and 'created_at' with default.
-                result = await conn.fetchrow(query, session_id, user_message, ai_response)
-            if result and result['id']:
-                print(f"Successfully saved chat message with ID: {result['id']}")
-            else:
-                print(f"Failed to save chat message or retrieve ID. Response: {result}")
+            with observe_upstream("postgres", "chat_message_insert"):
+                async with self.__class__._pool.acquire() as conn:
+                    await conn.execute(query, session_id, user_message, ai_response)
         except Exception as e:
-            print(f"Error saving chat message to database: {e}")
+            logger.error("Error saving chat message to database: %s", e)
             # Optionally re-raise or handle more gracefully
 
+    async def enqueue_chat_message(self, session_id: Optional[str], user_message: str, ai_response: str, created_at: Optional[datetime] = None) -> None:
+        """
+        Queues one turn for the batched writer; waits only when the write queue is full.
+        created_at is taken at enqueue time so turns keep their order across batches.
+        """
+        writer = self.__class__._writer
+        if writer is None:
+            raise RuntimeError("Database pool not initialized. Call SupabaseDB.init_db_pool() at application startup.")
+        await writer.put((session_id, user_message, ai_response, created_at or datetime.now(timezone.utc)))
+
+    def has_pending_chat_messages(self, session_id: Optional[str]) -> bool:
+        writer = self.__class__._writer
+        return writer is not None and writer.has_pending(session_id)
+
+    def chat_messages_enqueued(self) -> int:
+        """Turns queued since startup; a mark to pass as flush_chat_messages(upto=...)"""
+        writer = self.__class__._writer
+        return writer.enqueued if writer is not None else 0
+
+    async def flush_chat_messages(self, timeout: Optional[float] = None, upto: Optional[int] = None) -> bool:
+        """
+        Waits until every turn queued so far, or up to the `upto` mark, has been written,
+        for at most `timeout` seconds (a batch waiting out a retry backoff can take much longer).
+        Returns False when it gave up waiting; the turns stay queued.
+        """
+        if self.__class__._writer is None:
+            return True
+        try:
+            await asyncio.wait_for(self.__class__._writer.flush(upto), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    @classmethod
+    async def _copy_chat_rows(cls, rows: List[ChatRow]) -> None:
+        if cls._pool is None:
+            raise RuntimeError("Database pool not initialized. Call SupabaseDB.init_db_pool() at application startup.")
+        if not rows:
+            return
+        with observe_upstream("postgres", "chat_history_write"):
+            async with cls._pool.acquire() as conn:
+                await conn.copy_records_to_table(
+                    "chat_history",
+                    records=rows,
+                    columns=("session_id", "user_message", "ai_response", "created_at")
+                )
+
+    async def save_chat_messages(self, rows: List[ChatRow]) -> None:
+        """
+        Bulk-inserts (session_id, user_message, ai_response, created_at) rows with one COPY.
+        Unlike save_chat_message, errors are raised so the caller can retry the batch.
+        """
+        await self.__class__._copy_chat_rows(rows)
+
     async def get_chat_history(self, session_id: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Returns the `limit` most recent turns, oldest first.
+        Served by the (session_id, created_at) index from migrations/001_chat_history_session_created_at_idx.sql.
+        """
         if self.__class__._pool is None:
-            print("Error: Database pool not initialized. Cannot get chat history.")
+            logger.error("Database pool not initialized. Cannot get chat history.")
             raise RuntimeError("Database pool not initialized. Call SupabaseDB.init_db_pool() at application startup.")
 
         try:
-            async with self.__class__._pool.acquire() as conn:
-                if session_id:
-                    sql_query = """
-                        SELECT * FROM chat_history
-                        WHERE session_id = $1
-                        ORDER BY created_at ASC
-                        LIMIT $2;
-                    """
-                    records = await conn.fetch(sql_query, session_id, limit)
-                else:
-                    sql_query = """
-                        SELECT * FROM chat_history
-                        ORDER BY created_at ASC
-                        LIMIT $1;
-                    """
-                    records = await conn.fetch(sql_query, limit)
+            with observe_upstream("postgres", "chat_history_read"):
+                async with self.__class__._pool.acquire() as conn:
+                    if session_id:
+                        sql_query = """
+                            SELECT user_message, ai_response, created_at FROM chat_history
+                            WHERE session_id = $1
+                            ORDER BY created_at DESC
+                            LIMIT $2;
+                        """
+                        records = await conn.fetch(sql_query, session_id, limit)
+                    else:
+                        sql_query = """
+                            SELECT user_message, ai_response, created_at FROM chat_history
+                            ORDER BY created_at DESC
+                            LIMIT $1;
+                        """
+                        records = await conn.fetch(sql_query, limit)
             
-            return [dict(record) for record in records]
+            # Newest-first from the index scan; callers expect chronological order
+            return [dict(record) for record in reversed(records)]
         except Exception as e:
-            print(f"Error getting chat history from database: {e}")
+            logger.error("Error getting chat history from database: %s", e)
             return []
 
     async def clear_chat_history(self, session_id: str) -> bool:
         """Clear all chat history for a specific session"""
         if self.__class__._pool is None:
-            print("Error: Database pool not initialized. Cannot clear chat history.")
+            logger.error("Database pool not initialized. Cannot clear chat history.")
             raise RuntimeError("Database pool not initialized. Call SupabaseDB.init_db_pool() at application startup.")
 
         query = """
@@ -107,16 +372,18 @@ class SupabaseDB:
             WHERE session_id = $1;
         """
         try:
-            async with self.__class__._pool.acquire() as conn:
-                result = await conn.execute(query, session_id)
-                print(f"Successfully cleared chat history for session {session_id}. Rows affected: {result}")
-                return True
+            with observe_upstream("postgres", "chat_history_delete"):
+                async with self.__class__._pool.acquire() as conn:
+                    result = await conn.execute(query, session_id)
+            logger.info("Successfully cleared chat history for session %s. Rows affected: %s", session_id, result)
+            return True
         except Exception as e:
-            print(f"Error clearing chat history for session {session_id}: {e}")
+            logger.error("Error clearing chat history for session %s: %s", session_id, e)
             return False
 
 # Global instance
 supabase_db = SupabaseDB()
+stats_collector.register("database", SupabaseDB.stats)
 
 async def get_supabase_db():
     return supabase_db
\ No newline at end of file
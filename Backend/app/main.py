@@ -1,8 +1,16 @@
-from fastapi import FastAPI
+import logging
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.api.endpoints.weather import router as weather_router
 from app.core.config import settings
+from app.core.logging_config import configure_logging
+from app.core import tracing
 from app.db.supabase_client import SupabaseDB # Import the class itself
+from app.services.ai_service import WeatherAIService
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -24,13 +32,21 @@ app.include_router(weather_router, prefix="/api/weather", tags=["Weather"])
 
 @app.on_event("startup")
 async def startup_event():
-    print("Application startup: Initializing database pool...")
+    tracing.init_tracing()
+    logger.info("Application startup: Initializing database pool...")
     await SupabaseDB.init_db_pool() # This line calls the initialization
+    logger.info("Application startup: Initializing shared AI service and HTTP pools...")
+    await WeatherAIService.init_service()
+    logger.info("Application startup: Starting hot-city weather pre-warmer...")
+    await WeatherAIService.start_prewarmer()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    print("Application shutdown: Closing database pool...")
+    logger.info("Application shutdown: Closing AI service and HTTP pools...")
+    await WeatherAIService.close_service()
+    logger.info("Application shutdown: Closing database pool...")
     await SupabaseDB.close_db_pool()
+    tracing.shutdown_tracing()
 
 @app.get("/")
 async def root():
@@ -40,6 +56,11 @@ async def root():
         "version": settings.VERSION
     }
     
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint: stage/upstream latency histograms, token counts, cache and queue gauges"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Local development (only runs when executed directly)
 if __name__ == "__main__":
     import uvicorn
@@ -1,13 +1,102 @@
 from pydantic import BaseModel, Field
-from typing import  Dict, Any
+from typing import  Dict, Any, List, Literal, Optional
+from app.core.config import settings
 
 class WeatherQuery(BaseModel):
     """Model for user weather query"""
     query: str = Field(..., description="User's natural language query about weather")
 
+# How much weather data a response carries: the raw OpenWeatherMap payloads, the
+# slim per-city summary the explanation was generated from, or neither
+WeatherDetail = Literal["full", "summary", "none"]
+
+class CurrentConditions(BaseModel):
+    """Current conditions, reduced to the fields the question needs"""
+    description: Optional[str] = None
+    temp: Optional[float] = None
+    feels_like: Optional[float] = None
+    temp_min: Optional[float] = None
+    temp_max: Optional[float] = None
+    humidity: Optional[int] = None
+    pressure: Optional[int] = None
+    wind_speed: Optional[float] = None
+    wind_gust: Optional[float] = None
+    wind_deg: Optional[int] = None
+    clouds: Optional[int] = None
+    visibility: Optional[int] = None
+    rain_1h: Optional[float] = None
+    snow_1h: Optional[float] = None
+    local_time: Optional[str] = Field(None, description="Local observation time, YYYY-MM-DD HH:MM")
+
+class DailyForecast(BaseModel):
+    """Aggregates of one local day of the 3-hourly forecast"""
+    temp_min: float
+    temp_max: float
+    humidity_avg: int
+    precip_mm: float
+    max_pop: float = Field(..., description="Highest probability of precipitation (0-1)")
+    wind_max: float
+    conditions: str = Field(..., description="Most frequent condition of the day")
+
+class ForecastSlot(BaseModel):
+    """One 3-hourly forecast slot"""
+    time: str = Field(..., description="Local time, HH:MM")
+    temp: float
+    conditions: str
+    pop: float
+    wind: float
+
+class ForecastSummary(BaseModel):
+    daily: Dict[str, DailyForecast] = Field(..., description="Per local date (YYYY-MM-DD) in the asked-about window")
+    slots: Optional[List[ForecastSlot]] = Field(None, description="3-hourly slots, for single-day windows")
+
+class CityWeatherSummary(BaseModel):
+    current: Optional[CurrentConditions] = None
+    forecast: Optional[ForecastSummary] = None
+    errors: Optional[Dict[str, str]] = Field(None, description="Endpoint -> error, for data that could not be fetched")
+
 class WeatherResponse(BaseModel):
-    """Model for weather response"""
+    """
+    Model for weather response. Responses are built by the service from data it
+    already trusts and encoded directly, so this model documents the shape
+    rather than validating it on every request.
+    """
     query: str = Field(..., description="Original user query")
     processed_query: str = Field(..., description="Query processed by AI")
-    weather_data: Dict[str, Any] = Field(..., description="Weather data from OpenWeatherMap")
-    ai_explanation: str = Field(..., description="AI-generated explanation of the weather data")
\ No newline at end of file
+    weather_data: Optional[Dict[str, Any]] = Field(None, description="Raw weather data from OpenWeatherMap per city (weather_detail=full)")
+    weather_summary: Optional[Dict[str, CityWeatherSummary]] = Field(None, description="Per-city weather summary (weather_detail=summary)")
+    comparison: Optional[Dict[str, Dict[str, str]]] = Field(None, description="Per day: warmest, coldest, wettest and windiest city of a location comparison (weather_detail=summary)")
+    ai_explanation: str = Field(..., description="AI-generated explanation of the weather data")
+    session_id: Optional[str] = Field(None, description="Session the query was answered in")
+
+class BatchQueryItem(BaseModel):
+    """One query of a batch request"""
+    query: str = Field(..., description="User's natural language query about weather")
+    session_id: Optional[str] = Field(None, description="Session for this query; defaults to the X-Session-ID header")
+
+class WeatherBatchQuery(BaseModel):
+    """Model for a batch of weather queries"""
+    queries: List[BatchQueryItem] = Field(..., min_length=1, max_length=settings.BATCH_MAX_QUERIES, description="Queries to answer")
+
+class BatchQueryResult(BaseModel):
+    """Outcome of one query of a batch"""
+    index: int = Field(..., description="Position of the query in the request")
+    session_id: str = Field(..., description="Session the query was answered in")
+    result: Optional[WeatherResponse] = Field(None, description="Response, when the query succeeded")
+    error: Optional[str] = Field(None, description="Error message, when the query failed")
+
+class WeatherBatchResponse(BaseModel):
+    """Model for batch weather response"""
+    results: List[BatchQueryResult] = Field(..., description="One result per query, in request order")
+
+class QueryAnalysis(BaseModel):
+    """Structured output of the fused classification + extraction LLM call"""
+    is_weather_related: bool = Field(..., description="Whether the query is weather-related")
+    cities: List[str] = Field(default_factory=list, description="City names mentioned in the query")
+    query_types: List[str] = Field(default_factory=lambda: ["current"], description="Query types asked about")
+    time_context: str = Field("current", description="current, future or past")
+    specific_time: Optional[str] = Field(None, description="Specific timeframe asked about, e.g. tomorrow")
+    specific_conditions: List[str] = Field(default_factory=list, description="Specific weather conditions asked about")
+    comparison_type: Optional[Literal["time", "location"]] = Field(None, description="Kind of comparison, if any")
+    is_follow_up: bool = Field(False, description="Whether the query relies on previous conversation")
+    inferred_city_from_history: Optional[str] = Field(None, description="City implied by the conversation history")
@@ -1,14 +1,21 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
-from typing import Dict, Any, List, Optional, Tuple
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 from app.core.config import settings
 from app.services.weather_service import WeatherService
+from app.services.weather_cache import CachedWeatherService
+from app.services.fast_path import FastPathClassifier, parse_time_expression
+from app.services.session_store import SessionStateStore
+from app.services.explanation_cache import ExplanationCache
+from app.services.prewarm import WeatherPrewarmer
+from app.services.cache_backend import create_cache_backend
 import asyncio
-import json
-from langchain_core.messages import HumanMessage, AIMessage
 from app.db.supabase_client import supabase_db
+from app.core.timing import StageTimings
+from app.core.governor import DependencyUnavailableError
+from app.core.llm_invoker import llm_invoker, query_deadline
+from app.core.metrics import QUERIES_IN_FLIGHT, record_llm_usage, stats_collector
 import logging
-from . import llm_prompts # Import the new prompts module
-# NEW IMPORTS for helper modules
+from . import llm_prompts
 from . import query_helper
 from . import response_helper
 
@@ -29,15 +36,58 @@ class WeatherAIService:
         "alerts": "Get weather alerts or warnings"
     }
     
+    # Process-wide instance, created once in the FastAPI startup hook
+    _instance: Optional["WeatherAIService"] = None
+
+    @classmethod
+    async def init_service(cls) -> None:
+        if cls._instance is None:
+            cls._instance = cls()
+            if cls._instance.cache_backend is not None:
+                await cls._instance.cache_backend.start()
+                stats_collector.register("cache_backend", cls._instance.cache_backend.stats)
+            stats_collector.register("weather_cache", cls._instance.weather_service.stats)
+            stats_collector.register("explanation_cache", cls._instance.explanation_cache.stats)
+            stats_collector.register("sessions", cls._instance.sessions.stats)
+            stats_collector.register("fast_path", cls._instance.fast_path.stats)
+            stats_collector.register("prewarmer", cls._instance.prewarmer.stats)
+
+    @classmethod
+    async def start_prewarmer(cls) -> None:
+        """Starts refreshing hot cities' weather in the background (unless PREWARM_ENABLED is off)"""
+        if settings.PREWARM_ENABLED:
+            cls.get_instance().prewarmer.start()
+
+    @classmethod
+    async def close_service(cls) -> None:
+        if cls._instance:
+            await cls._instance.prewarmer.close()
+            await cls._instance.weather_service.aclose()
+            if cls._instance.cache_backend is not None:
+                await cls._instance.cache_backend.close()
+            cls._instance = None
+            logger.info("WeatherAIService closed.")
+
+    @classmethod
+    def get_instance(cls) -> "WeatherAIService":
+        if cls._instance is None:
+            raise RuntimeError("WeatherAIService not initialized. Call WeatherAIService.init_service() at application startup.")
+        return cls._instance
+
     def __init__(self):
-        self.weather_service = WeatherService()
+        # Shared by every worker when CACHE_BACKEND is set; None keeps caches and sessions per process
+        self.cache_backend = create_cache_backend()
+        self.weather_service = CachedWeatherService(WeatherService(), backend=self.cache_backend)
+        self.prewarmer = WeatherPrewarmer(self.weather_service)
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-1.5-flash-latest",
             google_api_key=settings.GOOGLE_API_KEY,
             temperature=0.2
         )
         self.db = supabase_db # Use the imported instance
-        self.last_known_cities: List[str] = []
+        self.sessions = SessionStateStore(self.db, backend=self.cache_backend)
+        self.explanation_cache = ExplanationCache(backend=self.cache_backend)
+        self.fast_path = FastPathClassifier()
         logger.info("WeatherAIService initialized.")
     
     async def _check_weather_related(self, query: str) -> bool:
@@ -45,16 +95,17 @@ class WeatherAIService:
         Checks if the query is weather-related using the safeguard prompt.
         Returns True if weather-related, False otherwise.
         """
-        logger.debug(f"Checking if query is weather-related: {query}")
+        logger.debug("Checking if query is weather-related: %s", query)
         prompt = llm_prompts.WEATHER_QUERY_SAFEGUARD_PROMPT_TEMPLATE.format(query=query)
-        response = await self.llm.ainvoke(prompt)
+        response = await llm_invoker.call(lambda: self.llm.ainvoke(prompt), deadline=settings.LLM_ANALYSIS_DEADLINE, operation="safeguard")
+        record_llm_usage("safeguard", getattr(response, "usage_metadata", None))
         result = response.content.strip()
-        logger.debug(f"Weather check response: {result}")
+        logger.debug("Weather check response: %s", result)
         return "WEATHER_RELATED" in result
     
     def _build_non_weather_response(self, query: str) -> Dict[str, Any]:
         """Constructs the response when the query is not weather-related."""
-        logger.warning(f"Non-weather query received: {query}")
+        logger.warning("Non-weather query received: %s", query)
         return {
             "query": query,
             "processed_query": "Non-weather query received.",
@@ -62,80 +113,311 @@ class WeatherAIService:
             "ai_explanation": "I'm a weather-focused assistant and can only help with weather-related questions. Please ask me about current weather, forecasts, or any other weather-related topics!"
         }
     
-    # Removed _extract_query_details method
-    
     def _handle_empty_query(self, query: str) -> Optional[Dict[str, Any]]:
-        # MODIFIED: Use helper function
         return response_helper.handle_empty_query(query, logger)
 
-    async def _infer_city_from_history_if_needed(self, query_details: Dict[str, Any], query: str, session_id: Optional[str]) -> None:
+    async def _infer_city_from_history_if_needed(self, query_details: Dict[str, Any], query: str, session_id: Optional[str], history: Optional[List[Dict[str, Any]]] = None) -> None:
         """
         If the query is a follow-up and no city is specified,
         tries to infer the city from chat history.
         Modifies query_details in-place.
         """
         if not query_details.get("cities") and query_details.get("is_follow_up", False):
-            # MODIFIED: Use helper function and update query_details
-            inferred_city = await query_helper.infer_city_from_history(
-                llm=self.llm,
-                db=self.db,
-                query=query,
-                session_id=session_id,
-                logger=logger
-            )
+            # Without time for both this and the explanation, fall back to the session's last cities
+            if not llm_invoker.can_afford("history_inference", "explanation"):
+                logger.warning("Skipping history inference: too little of the query deadline left")
+                return
+            try:
+                inferred_city = await query_helper.infer_city_from_history(
+                    llm=self.llm,
+                    db=self.db,
+                    query=query,
+                    session_id=session_id,
+                    logger=logger,
+                    history=history
+                )
+            except DependencyUnavailableError as e:
+                logger.warning("History inference unavailable, using the session's last cities: %s", e)
+                return
             if inferred_city:
                 query_details["cities"] = [inferred_city]
-                logger.info(f"Updated query_details with inferred city: {inferred_city}")
+                logger.info("Updated query_details with inferred city: %s", inferred_city)
 
     def _build_no_city_response(self, query: str) -> Dict[str, Any]:
-        # MODIFIED: Use helper function
         return response_helper.build_no_city_response(query, logger)
 
-    def _build_final_response(self, query: str, query_details: Dict[str, Any], weather_data: Dict[str, Any], explanation: str) -> Dict[str, Any]:
-        # MODIFIED: Use helper function
-        return response_helper.build_final_response(query, query_details, weather_data, explanation)
+    def _build_final_response(self, query: str, query_details: Dict[str, Any], weather_data: Dict[str, Any], explanation: str, weather_detail: str = "full") -> Dict[str, Any]:
+        return response_helper.build_final_response(query, query_details, weather_data, explanation, weather_detail)
+
+    @staticmethod
+    def _discard_tasks(*tasks: asyncio.Task) -> None:
+        """Cancels stages whose result is no longer needed and retrieves any stored exception."""
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()
+
+    async def _analyze_multi_call(self, query: str, timings: StageTimings) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Runs safeguard classification and detail extraction as concurrent LLM calls.
+        An off-topic verdict cancels the extraction call.
+        Returns (is_weather_related, query_details).
+        """
+        safeguard_task = timings.start("safeguard_llm", self._check_weather_related(query))
+        extraction_task = timings.start("extraction_llm", query_helper.extract_query_details_from_llm(
+            llm=self.llm,
+            query=query,
+            query_types_list=list(self.QUERY_TYPES.keys()),
+            logger=logger
+        ))
+        try:
+            if not await safeguard_task:
+                return False, None
+            return True, await extraction_task
+        finally:
+            self._discard_tasks(safeguard_task, extraction_task)
+
+    async def _analyze_query(self, query: str, history_task: asyncio.Task, timings: StageTimings) -> Tuple[bool, Optional[Dict[str, Any]], bool]:
+        """
+        Classifies the query and extracts its details. Obvious queries are answered
+        by the local fast path without any LLM call; otherwise one fused structured
+        call is used when LLM_FUSED_MODE is on, and the multi-call pipeline when it
+        is off (or when the fused call fails).
+        Returns (is_weather_related, query_details, fused).
+        """
+        if settings.FAST_PATH_ENABLED:
+            with timings.stage("fast_path"):
+                fast_result = self.fast_path.classify(query)
+            if fast_result is not None:
+                logger.debug("Fast path resolved query: %s", fast_result)
+                return fast_result[0], fast_result[1], False
+        try:
+            if settings.LLM_FUSED_MODE:
+                history = await history_task
+                with timings.stage("fused_analysis_llm"):
+                    analysis = await query_helper.analyze_query_fused(
+                        llm=self.llm,
+                        query=query,
+                        query_types_list=list(self.QUERY_TYPES.keys()),
+                        history=history,
+                        logger=logger
+                    )
+                if analysis is not None:
+                    return analysis[0], analysis[1], True
+            is_weather_related, query_details = await self._analyze_multi_call(query, timings)
+            return is_weather_related, query_details, False
+        except DependencyUnavailableError as e:
+            query_details = self._degraded_analysis(query)
+            if query_details is None:
+                raise
+            logger.warning("Analysis LLM unavailable, answering from the cities in the query: %s", e)
+            return True, query_details, False
+
+    def _degraded_analysis(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        LLM-free query_details for when the analysis LLM is unavailable: the fast path's
+        answer if it has one (it is skipped when FAST_PATH_ENABLED is off), otherwise the
+        cities obvious in the query with a plain current-weather request. None when the
+        query names no city the gazetteer knows.
+        """
+        # With the fast path on, it already ran before the analysis call and did not answer; only run it here when it was skipped
+        fast_result = self.fast_path.classify(query) if not settings.FAST_PATH_ENABLED else None
+        if fast_result is not None and fast_result[0]:
+            return fast_result[1]
+        cities = query_helper.guess_cities_from_query(query)
+        if not cities:
+            return None
+        time_context, specific_time = parse_time_expression(query)
+        query_details: Dict[str, Any] = {
+            "cities": cities,
+            "query_types": ["current", "forecast"] if time_context == "future" else ["current"],
+            "time_context": time_context,
+            "specific_conditions": [],
+            "comparison_type": None,
+            "is_follow_up": False
+        }
+        if specific_time:
+            query_details["specific_time"] = specific_time
+        return query_details
 
-    async def process_query(self, query: str, session_id: Optional[str] = None) -> Dict[str, Any]:
-        logger.info(f"Processing query: '{query}' for session_id: '{session_id}'")
+    async def _prepare_query(self, query: str, session_id: Optional[str], timings: StageTimings) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Runs every stage up to (but not including) the explanation.
+        Returns (early_response, query_details, weather_data, history); early_response is
+        set, and already saved to chat history, when the query ends without an explanation.
+        """
+        # Stages that depend only on the raw query start together with the
+        # analysis: chat-history loading and a speculative cache warm-up for
+        # cities that are obvious in the text.
+        history_task = timings.start("history_load", self.sessions.get_history(session_id, limit=settings.SESSION_STORE_MAX_TURNS))
+        prefetch_task = timings.start("prefetch", query_helper.prefetch_weather(self.weather_service, query, logger))
         try:
-            empty_query_response = self._handle_empty_query(query)
-            
-            if empty_query_response:
-                return empty_query_response
-            
             # Check if query is weather-related
-            is_weather_related = await self._check_weather_related(query)
+            is_weather_related, query_details, fused = await self._analyze_query(query, history_task, timings)
             if not is_weather_related:
-                # If query is not weather-related, don't bother with city validation
-                # or other weather-specific processing
+                # If query is not weather-related, drop the weather-specific stages
+                self._discard_tasks(history_task, prefetch_task)
                 non_weather_response = self._build_non_weather_response(query)
                 # Still save the interaction in chat history
-                await self.db.save_chat_message(session_id=session_id, user_message=query, ai_response=non_weather_response["ai_explanation"])
-                return non_weather_response
-            
-            # MODIFIED: Call the helper function directly
-            query_details = await query_helper.extract_query_details_from_llm(
-                llm=self.llm,
-                query=query,
-                query_types_list=list(self.QUERY_TYPES.keys()),
-                logger=logger
-            )
-            
-            logger.info(f"Initial query_details: {query_details}")
-            
-            await self._infer_city_from_history_if_needed(query_details, query, session_id)
-            city_present, self.last_known_cities = query_helper.manage_city_context(query_details, self.last_known_cities, logger)
+                await self.sessions.record_turn(session_id=session_id, user_message=query, ai_response=non_weather_response["ai_explanation"])
+                return non_weather_response, None, {}, []
+
+            logger.info("Initial query_details: %s", query_details)
+            history = await history_task
+
+            if not fused:
+                # The fused call already resolved the city from history
+                with timings.stage("history_inference"):
+                    await self._infer_city_from_history_if_needed(query_details, query, session_id, history)
+            city_present, last_known_cities = query_helper.manage_city_context(query_details, self.sessions.get_last_cities(session_id), logger)
+            await self.sessions.set_last_cities(session_id, last_known_cities)
             if not city_present:
                 no_city_response = self._build_no_city_response(query)
-                await self.db.save_chat_message(session_id=session_id, user_message=query, ai_response=no_city_response["ai_explanation"])
-                return no_city_response
-            
-            weather_data = await query_helper.get_weather_data(self.weather_service, query_details, logger)
-            explanation = await query_helper.generate_weather_explanation(self.llm, self.db, llm_prompts, query, query_details, weather_data, session_id, logger)
-            logger.debug(f"Attempting to save to DB: session_id='{session_id}', user_message='{query}'")
-            await self.db.save_chat_message(session_id=session_id, user_message=query, ai_response=explanation)
-            logger.info("Successfully called save_chat_message.")
-            return self._build_final_response(query, query_details, weather_data, explanation)
-        except Exception as e:
-            logger.error(f"Error processing query '{query}': {str(e)}", exc_info=True)
-            raise
\ No newline at end of file
+                await self.sessions.record_turn(session_id=session_id, user_message=query, ai_response=no_city_response["ai_explanation"])
+                return no_city_response, None, {}, history
+
+            with timings.stage("weather_fetch"):
+                weather_data = await query_helper.get_weather_data(self.weather_service, query_details, logger)
+            return None, query_details, weather_data, history
+        finally:
+            self._discard_tasks(history_task, prefetch_task)
+
+    async def process_query(self, query: str, session_id: Optional[str] = None, weather_detail: str = "full") -> Dict[str, Any]:
+        """`weather_detail` picks the weather part of the response: full, summary or none (see response_helper.weather_fields)"""
+        logger.info("Processing query: '%s' for session_id: '%s'", query, session_id)
+        empty_query_response = self._handle_empty_query(query)
+        if empty_query_response:
+            return empty_query_response
+
+        timings = StageTimings()
+        in_flight = QUERIES_IN_FLIGHT.labels("query")
+        in_flight.inc()
+        with query_deadline(settings.QUERY_DEADLINE):
+            try:
+                early_response, query_details, weather_data, history = await self._prepare_query(query, session_id, timings)
+                if early_response:
+                    return early_response
+
+                # Only first turns are cacheable: with history the answer depends on the conversation
+                explanation = await self.explanation_cache.get(query, query_details, weather_data) if not history else None
+                if explanation is None:
+                    try:
+                        with timings.stage("explanation_llm"):
+                            explanation = await query_helper.generate_weather_explanation(self.llm, self.db, llm_prompts, query, query_details, weather_data, session_id, logger, history=history, history_summary=self.sessions.get_summary(session_id))
+                    except DependencyUnavailableError as e:
+                        logger.warning("Explanation LLM unavailable, answering with the degraded template: %s", e)
+                        explanation = response_helper.build_degraded_explanation(query_details, weather_data)
+                    else:
+                        if not history:
+                            await self.explanation_cache.put(query, query_details, weather_data, explanation, timings.durations_ms["explanation_llm"])
+                # Queued for the database's batched chat writer
+                await self.sessions.record_turn(session_id=session_id, user_message=query, ai_response=explanation)
+                return self._build_final_response(query, query_details, weather_data, explanation, weather_detail)
+            except Exception as e:
+                logger.error("Error processing query '%s': %s", query, e, exc_info=True)
+                raise
+            finally:
+                in_flight.dec()
+                logger.info("Stage timings (ms) for session_id '%s': %s", session_id, timings.finish())
+
+    async def process_query_stream(self, query: str, session_id: Optional[str] = None, weather_detail: str = "full") -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of process_query. Yields (event, payload) pairs:
+        "details" as soon as query_details and weather_data are known, one "token"
+        per explanation chunk, and a final "response" shaped like process_query's result.
+        `weather_detail` applies to both "details" and "response". The chat message is saved once the explanation is complete.
+        """
+        logger.info("Streaming query: '%s' for session_id: '%s'", query, session_id)
+        empty_query_response = self._handle_empty_query(query)
+        if empty_query_response:
+            yield "response", empty_query_response
+            return
+
+        timings = StageTimings()
+        in_flight = QUERIES_IN_FLIGHT.labels("stream")
+        in_flight.inc()
+        with query_deadline(settings.QUERY_DEADLINE):
+            try:
+                early_response, query_details, weather_data, history = await self._prepare_query(query, session_id, timings)
+                if early_response:
+                    yield "response", early_response
+                    return
+
+                yield "details", {
+                    "query": query,
+                    "processed_query": response_helper.describe_query_details(query_details),
+                    "query_details": query_details,
+                    **response_helper.weather_fields(query_details, weather_data, weather_detail)
+                }
+                explanation = await self.explanation_cache.get(query, query_details, weather_data) if not history else None
+                if explanation is not None:
+                    timings.mark("first_token")
+                    yield "token", {"text": explanation}
+                else:
+                    chunks: List[str] = []
+                    try:
+                        with timings.stage("explanation_llm"):
+                            async for chunk in query_helper.stream_weather_explanation(self.llm, self.db, llm_prompts, query, query_details, weather_data, session_id, logger, history=history, history_summary=self.sessions.get_summary(session_id)):
+                                if not chunks:
+                                    timings.mark("first_token")
+                                chunks.append(chunk)
+                                yield "token", {"text": chunk}
+                    except DependencyUnavailableError as e:
+                        if chunks:
+                            raise
+                        logger.warning("Explanation LLM unavailable, answering with the degraded template: %s", e)
+                        explanation = response_helper.build_degraded_explanation(query_details, weather_data)
+                        yield "token", {"text": explanation}
+                    else:
+                        explanation = "".join(chunks).strip()
+                        if not history:
+                            await self.explanation_cache.put(query, query_details, weather_data, explanation, timings.durations_ms["explanation_llm"])
+                await self.sessions.record_turn(session_id=session_id, user_message=query, ai_response=explanation)
+                yield "response", self._build_final_response(query, query_details, weather_data, explanation, weather_detail)
+            except Exception as e:
+                logger.error("Error streaming query '%s': %s", query, e, exc_info=True)
+                raise
+            finally:
+                in_flight.dec()
+                logger.info("Stage timings (ms) for session_id '%s': %s", session_id, timings.finish())
+
+    async def process_batch(self, items: List[Tuple[str, str]], weather_detail: str = "full") -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        Answers many (query, session_id) pairs, yielding (index, response, error) as each completes.
+
+        Queries of different sessions run concurrently, at most BATCH_MAX_CONCURRENCY at a
+        time; queries of one session run in order so follow-ups see earlier turns. Identical
+        city fetches across the batch are coalesced by the weather cache, and the chat rows
+        of the batch are flushed to the database in bulk before it completes, waiting at
+        most CHAT_HISTORY_FLUSH_TIMEOUT seconds so a failing database cannot hold it.
+        """
+        semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+        completed: asyncio.Queue = asyncio.Queue()
+        by_session: Dict[str, List[int]] = {}
+        for index, (_, session_id) in enumerate(items):
+            by_session.setdefault(session_id, []).append(index)
+
+        async def run_session(indexes: List[int]) -> None:
+            for index in indexes:
+                query, session_id = items[index]
+                async with semaphore:
+                    try:
+                        await completed.put((index, await self.process_query(query, session_id=session_id, weather_detail=weather_detail), None))
+                    except Exception as e:
+                        await completed.put((index, None, str(e)))
+
+        tasks = [asyncio.create_task(run_session(indexes)) for indexes in by_session.values()]
+        try:
+            for _ in range(len(items)):
+                yield await completed.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Every turn of the batch has been queued by now; rows queued later by other requests are not waited for
+            mark = self.sessions.write_mark()
+            if not await self.sessions.flush(upto=mark, timeout=settings.CHAT_HISTORY_FLUSH_TIMEOUT):
+                logger.warning("Batch of %s queries completed before its chat turns were written; they stay queued", len(items))
+
+async def get_weather_ai_service() -> WeatherAIService:
+    return WeatherAIService.get_instance()
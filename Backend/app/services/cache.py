@@ -0,0 +1,154 @@
+import asyncio
+import heapq
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+class TTLCache:
+    """
+    Bounded in-memory cache with least-recently-used eviction and per-entry expiry.
+    With `stale_ttl`, expired entries are kept that much longer for get_stale(),
+    e.g. to stand in while the source is unavailable.
+    """
+
+    def __init__(self, max_size: int, ttl: float, stale_ttl: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether a live entry exists; does not touch recency or counters"""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            if expires_at + self.stale_ttl <= now:
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def ttl_remaining(self, key: Hashable) -> float:
+        """Seconds until the entry expires; 0 when it is missing or already expired"""
+        entry = self._entries.get(key)
+        return max(entry[0] - time.monotonic(), 0.0) if entry is not None else 0.0
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Any:
+        """Value of a live or recently expired entry, without touching recency or counters"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] + self.stale_ttl <= time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class DecayingCounter:
+    """
+    Request counts that halve every `half_life` seconds, for finding the keys
+    that are popular right now. Increments grow with time instead of every count
+    decaying ("forward decay"), so recording is O(1); when more than `max_keys`
+    keys are tracked, the less popular half is dropped.
+    """
+
+    def __init__(self, half_life: float, max_keys: int):
+        self.max_keys = max_keys
+        self._rate = math.log(2) / half_life
+        self._epoch = time.monotonic()
+        self._scores: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._scores
+
+    def record(self, key: Hashable, weight: float = 1.0) -> None:
+        now = time.monotonic()
+        if self._rate * (now - self._epoch) > 50:
+            self._rescale(now)
+        self._scores[key] = self._scores.get(key, 0.0) + weight * math.exp(self._rate * (now - self._epoch))
+        if len(self._scores) > self.max_keys:
+            self._scores = dict(heapq.nlargest(self.max_keys // 2, self._scores.items(), key=lambda item: item[1]))
+
+    def _rescale(self, now: float) -> None:
+        """Moves the epoch to `now` before the growing increments lose float precision"""
+        factor = math.exp(-self._rate * (now - self._epoch))
+        self._scores = {key: score * factor for key, score in self._scores.items() if score * factor > 1e-3}
+        self._epoch = now
+
+    def top(self, k: int) -> List[Tuple[Hashable, float]]:
+        """The `k` most popular keys with their decayed counts, most popular first"""
+        factor = math.exp(-self._rate * (time.monotonic() - self._epoch))
+        return [(key, score * factor) for key, score in heapq.nlargest(k, self._scores.items(), key=lambda item: item[1])]
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one in-flight task.
+    The shared task is shielded, so a cancelled caller does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Registers fn() as the in-flight task for key right away (or returns the one already running)"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if key in self._inflight:
+            self.coalesced += 1
+        return await asyncio.shield(self.start(key, fn))
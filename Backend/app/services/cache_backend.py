@@ -0,0 +1,343 @@
+import abc
+import ast
+import asyncio
+import logging
+import uuid
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import asyncpg
+import orjson
+
+from app.core.config import settings
+from app.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+InvalidationHandler = Callable[[str], None]
+
+class CacheBackend(abc.ABC):
+    """
+    Byte-valued key/value store with per-entry expiry that workers share. Keys
+    live in namespaces ("weather", "explanations", "sessions"). Writes and
+    deletes notify the other workers, whose handlers registered with
+    subscribe() drop their in-process copy of the key. When invalidations may
+    have been missed, handlers registered with on_reset() drop every copy.
+
+    There is no in-process implementation: a single process is served by the
+    near tiers alone, so callers take "no backend" (None) for that case.
+    """
+
+    def __init__(self):
+        # Identifies this worker's own invalidation messages, which it ignores
+        self.origin = uuid.uuid4().hex[:12]
+        self._handlers: Dict[str, List[InvalidationHandler]] = {}
+        self._reset_handlers: List[Callable[[], None]] = []
+        self.invalidations_received = 0
+        self.resets = 0
+
+    def subscribe(self, namespace: str, handler: InvalidationHandler) -> None:
+        self._handlers.setdefault(namespace, []).append(handler)
+
+    def on_reset(self, handler: Callable[[], None]) -> None:
+        self._reset_handlers.append(handler)
+
+    def _dispatch(self, origin: str, namespace: str, key: str) -> None:
+        if origin == self.origin:
+            return
+        self.invalidations_received += 1
+        for handler in self._handlers.get(namespace, ()):
+            handler(key)
+
+    def _reset(self) -> None:
+        self.resets += 1
+        for handler in self._reset_handlers:
+            handler()
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        """The value and its seconds to expiry, or None when missing or expired"""
+
+    @abc.abstractmethod
+    async def set(self, namespace: str, key: str, value: bytes, ttl: float) -> None:
+        """Stores the value for `ttl` seconds and invalidates the key in the other workers"""
+
+    @abc.abstractmethod
+    async def delete(self, namespace: str, key: str) -> None:
+        """Removes the key and invalidates it in the other workers"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"invalidations_received": self.invalidations_received, "resets": self.resets}
+
+class PostgresCacheBackend(CacheBackend):
+    """
+    Backend on a Postgres UNLOGGED table: writes skip the WAL, and a crash
+    empties the table, which a cache can afford. Each write or delete sends a
+    NOTIFY in the same round trip; every worker keeps one LISTEN connection
+    for them, re-established with backoff when it drops. Notifications sent
+    meanwhile are lost, so the in-process tiers are reset once it is back.
+    Expired rows are ignored on read and purged every `purge_interval`.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        table: str = "shared_cache",
+        channel: str = "shared_cache_invalidation",
+        pool_size: int = settings.CACHE_POOL_SIZE,
+        purge_interval: float = settings.CACHE_PURGE_INTERVAL
+    ):
+        super().__init__()
+        self.dsn = dsn
+        self.table = table
+        self.channel = channel
+        self.pool_size = pool_size
+        self.purge_interval = purge_interval
+        self._pool: Optional[asyncpg.Pool] = None
+        self._listener: Optional[asyncpg.Connection] = None
+        self._relisten_task: Optional[asyncio.Task] = None
+        self._purge_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.purged_rows = 0
+        self.listener_reconnects = 0
+
+    async def start(self) -> None:
+        self._pool = await asyncpg.create_pool(dsn=self.dsn, min_size=1, max_size=self.pool_size)
+        await self._pool.execute(f"""
+            CREATE UNLOGGED TABLE IF NOT EXISTS {self.table} (
+                namespace text NOT NULL,
+                key text NOT NULL,
+                value bytea NOT NULL,
+                expires_at timestamptz NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        await self._listen()
+        self._purge_task = asyncio.create_task(self._purge_expired())
+        logger.info("Shared cache backend ready (table %s, channel %s)", self.table, self.channel)
+
+    async def _listen(self) -> None:
+        listener = await asyncpg.connect(dsn=self.dsn)
+        try:
+            await listener.add_listener(self.channel, self._on_notification)
+        except BaseException:
+            await listener.close()
+            raise
+        listener.add_termination_listener(self._on_listener_lost)
+        self._listener = listener
+
+    async def close(self) -> None:
+        self._closing = True
+        for task in (self._purge_task, self._relisten_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._purge_task = self._relisten_task = None
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def _on_notification(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            origin, namespace, key = orjson.loads(payload)
+        except (orjson.JSONDecodeError, ValueError):
+            logger.warning("Ignoring malformed cache invalidation: %s", payload)
+            return
+        self._dispatch(origin, namespace, key)
+
+    def _on_listener_lost(self, connection: asyncpg.Connection) -> None:
+        if self._closing or connection is not self._listener:
+            return
+        logger.error("Lost the cache invalidation listener connection, reconnecting")
+        if self._relisten_task is None or self._relisten_task.done():
+            self._relisten_task = asyncio.create_task(self._relisten())
+
+    async def _relisten(self) -> None:
+        attempt = 0
+        while True:
+            try:
+                await self._listen()
+                break
+            except Exception as e:
+                delay = min(0.5 * 2 ** attempt, 10)
+                attempt += 1
+                logger.warning("Re-establishing the cache invalidation listener failed, retrying in %.1fs: %s", delay, e)
+                await asyncio.sleep(delay)
+        self.listener_reconnects += 1
+        # Invalidations sent while the listener was down never arrive: drop every in-process copy
+        self._reset()
+        logger.info("Cache invalidation listener re-established")
+
+    def _message(self, namespace: str, key: str) -> str:
+        return orjson.dumps([self.origin, namespace, key]).decode()
+
+    async def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        row = await self._pool.fetchrow(
+            f"SELECT value, EXTRACT(EPOCH FROM expires_at - now())::float8 AS ttl FROM {self.table} "
+            "WHERE namespace = $1 AND key = $2 AND expires_at > now()",
+            namespace, key
+        )
+        return (bytes(row["value"]), row["ttl"]) if row else None
+
+    async def set(self, namespace: str, key: str, value: bytes, ttl: float) -> None:
+        await self._pool.execute(
+            f"WITH upserted AS ("
+            f"INSERT INTO {self.table} (namespace, key, value, expires_at) VALUES ($1, $2, $3, now() + make_interval(secs => $4)) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at"
+            ") SELECT pg_notify($5, $6)",
+            namespace, key, value, float(ttl), self.channel, self._message(namespace, key)
+        )
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await self._pool.execute(
+            f"WITH deleted AS (DELETE FROM {self.table} WHERE namespace = $1 AND key = $2) SELECT pg_notify($3, $4)",
+            namespace, key, self.channel, self._message(namespace, key)
+        )
+
+    async def _purge_expired(self) -> None:
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                status = await self._pool.execute(f"DELETE FROM {self.table} WHERE expires_at < now()")
+                self.purged_rows += int(status.split()[-1])
+            except Exception as e:
+                logger.warning("Purging expired shared cache rows failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self._pool
+        return {
+            "backend": "postgres",
+            **super().stats(),
+            "purged_rows": self.purged_rows,
+            "listener_reconnects": self.listener_reconnects,
+            "listening": self._listener is not None and not self._listener.is_closed(),
+            "pool_size": pool.get_size() if pool else 0,
+            "pool_idle": pool.get_idle_size() if pool else 0
+        }
+
+def create_cache_backend() -> Optional[CacheBackend]:
+    """
+    The shared backend selected by CACHE_BACKEND. For memory it is None ("no backend"):
+    caches and session state stay in their per-process tiers.
+    """
+    if settings.CACHE_BACKEND == "memory":
+        return None
+    if settings.CACHE_BACKEND == "postgres":
+        if not settings.CACHE_DATABASE_URL:
+            raise ValueError("CACHE_BACKEND=postgres needs CACHE_DATABASE_URL or DATABASE_URL")
+        return PostgresCacheBackend(settings.CACHE_DATABASE_URL)
+    raise ValueError(f"Unknown CACHE_BACKEND {settings.CACHE_BACKEND!r}; use memory or postgres")
+
+class TieredCache:
+    """
+    Two-tier cache: an in-process TTLCache (near) in front of a shared
+    CacheBackend (far). Reads try near, then far, and copy far hits into near
+    for at most `near_ttl` seconds; writes go to both and invalidate the key in
+    the other workers' near tiers. Without a backend only the near tier is used.
+
+    Keys are hashable literals (strings, numbers, tuples of them) and travel to
+    the backend as their repr(); values go through `encode`/`decode`. Backend
+    errors are logged and treated as misses, so a failing backend only costs hit rate.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        near: TTLCache,
+        backend: Optional[CacheBackend],
+        encode: Callable[[Any], bytes] = orjson.dumps,
+        decode: Callable[[bytes], Any] = orjson.loads,
+        near_ttl: Optional[float] = settings.CACHE_NEAR_TTL
+    ):
+        self.namespace = namespace
+        self.near = near
+        self.backend = backend
+        self.encode = encode
+        self.decode = decode
+        self.near_ttl = near_ttl
+        self.far_hits = 0
+        self.far_misses = 0
+        self.far_errors = 0
+        self.invalidated = 0
+        if backend is not None:
+            backend.subscribe(namespace, self._invalidate)
+            backend.on_reset(self.near.clear)
+
+    def _invalidate(self, far_key: str) -> None:
+        try:
+            key = ast.literal_eval(far_key)
+        except (ValueError, SyntaxError):
+            return
+        if key in self.near:
+            self.invalidated += 1
+        self.near.delete(key)
+
+    async def get_far(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """The shared value and its seconds to expiry, without touching the near tier"""
+        if self.backend is None:
+            return None
+        try:
+            found = await self.backend.get(self.namespace, repr(key))
+        except Exception as e:
+            self.far_errors += 1
+            logger.warning("Shared cache read of %s failed: %s", key, e)
+            return None
+        if found is None:
+            self.far_misses += 1
+            return None
+        self.far_hits += 1
+        return self.decode(found[0]), found[1]
+
+    async def get(self, key: Hashable) -> Any:
+        value = self.near.get(key)
+        if value is not None:
+            return value
+        found = await self.get_far(key)
+        if found is None:
+            return None
+        value, ttl = found
+        self.near.set(key, value, ttl=min(ttl, self.near_ttl) if self.near_ttl is not None else ttl)
+        return value
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.near.ttl if ttl is None else ttl
+        self.near.set(key, value, ttl=ttl)
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(self.namespace, repr(key), self.encode(value), ttl)
+        except Exception as e:
+            self.far_errors += 1
+            logger.warning("Shared cache write of %s failed: %s", key, e)
+
+    async def delete(self, key: Hashable) -> None:
+        self.near.delete(key)
+        if self.backend is None:
+            return
+        try:
+            await self.backend.delete(self.namespace, repr(key))
+        except Exception as e:
+            self.far_errors += 1
+            logger.warning("Shared cache delete of %s failed: %s", key, e)
+
+    def stats(self) -> Dict[str, Any]:
+        if self.backend is None:
+            return {}
+        return {
+            "far_hits": self.far_hits,
+            "far_misses": self.far_misses,
+            "far_errors": self.far_errors,
+            "invalidated": self.invalidated
+        }
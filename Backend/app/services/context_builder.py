@@ -0,0 +1,118 @@
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import PROMPT_SECTION_TOKENS, PROMPT_TOKENS_ESTIMATED
+from app.services.weather_summary import estimate_tokens
+
+# Per-turn limits of the rolling summary lines
+SUMMARY_USER_CHARS = 100
+SUMMARY_AI_CHARS = 140
+# 1/n of the history budget kept for the summary when older turns exist
+SUMMARY_BUDGET_SHARE = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+class PromptContext(NamedTuple):
+    """The explanation prompt and its estimated size per section"""
+    text: str
+    tokens: Dict[str, int]
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit] + "..."
+
+def summarize_turn(turn: Dict[str, Any]) -> str:
+    """One summary line for a turn: the question and the first sentence of the answer"""
+    answer = _SENTENCE_END.split(turn.get("ai_response") or "", maxsplit=1)[0]
+    return f"- User: {_clip(turn.get('user_message') or '', SUMMARY_USER_CHARS)} / AI: {_clip(answer, SUMMARY_AI_CHARS)}"
+
+def _trim_summary(lines: List[str], max_tokens: int) -> List[str]:
+    """Drops the oldest lines until the summary fits in `max_tokens`"""
+    while lines and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return lines
+
+def fold_into_summary(summary: str, turn: Dict[str, Any], max_tokens: int = settings.SESSION_SUMMARY_MAX_TOKENS) -> str:
+    """Adds a turn to a rolling summary, forgetting the oldest lines beyond `max_tokens`"""
+    lines = summary.splitlines() if summary else []
+    lines.append(summarize_turn(turn))
+    return "\n".join(_trim_summary(lines, max_tokens))
+
+def _newest_turns(history: List[Dict[str, Any]], budget: int) -> Tuple[List[str], int]:
+    """The newest turns, formatted, that fit in `budget` tokens (newest first) and their size"""
+    recent: List[str] = []
+    used = 0
+    for turn in reversed(history):
+        text = f"User: {turn['user_message']}\nAI: {turn['ai_response']}\n"
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            break
+        recent.append(text)
+        used += cost
+    return recent, used
+
+def build_history_context(history: List[Dict[str, Any]], summary: str, budget: int) -> str:
+    """
+    The conversation so far in at most `budget` tokens: the newest turns verbatim,
+    as many as fit, after `summary` (the session's rolling summary of turns it
+    no longer keeps) extended with a line per kept turn that did not fit. When
+    there is anything to summarise, a quarter of the budget is kept for it.
+    """
+    if budget <= 0 or (not history and not summary):
+        return ""
+    header = "Previous conversation:\n"
+    summary_header = "Summary of earlier conversation:\n"
+    turns_budget = budget - estimate_tokens(header)
+    recent, used = _newest_turns(history, turns_budget)
+    if summary or len(recent) < len(history):
+        recent, used = _newest_turns(history, turns_budget - budget // SUMMARY_BUDGET_SHARE)
+    summary_lines = summary.splitlines() if summary else []
+    summary_lines.extend(summarize_turn(turn) for turn in history[:len(history) - len(recent)])
+    summary_lines = _trim_summary(summary_lines, turns_budget - used - estimate_tokens(summary_header))
+    context = ""
+    if summary_lines:
+        context += summary_header + "\n".join(summary_lines) + "\n\n"
+    if recent:
+        context += header + "".join(reversed(recent))
+    return context
+
+def build_explanation_prompt(
+    template: str,
+    query: str,
+    query_details_json: str,
+    weather_json: str,
+    follow_up_context: str,
+    history: Optional[List[Dict[str, Any]]],
+    history_summary: str = "",
+    budget: int = settings.EXPLANATION_PROMPT_TOKEN_BUDGET,
+    history_budget: int = settings.EXPLANATION_HISTORY_TOKEN_BUDGET
+) -> PromptContext:
+    """
+    Fills the explanation template within a token budget. Instructions (template,
+    query, analysis) and weather data are always included; the conversation gets
+    what they leave, up to `history_budget`, and appears once.
+    """
+    instructions_tokens = estimate_tokens(template.format(
+        query=query, chat_context="", query_details_json=query_details_json,
+        weather_data_json="", follow_up_context=follow_up_context
+    ))
+    weather_tokens = estimate_tokens(weather_json)
+    history_allowance = min(history_budget, budget - instructions_tokens - weather_tokens)
+    chat_context = build_history_context(history or [], history_summary, history_allowance)
+    text = template.format(
+        query=query, chat_context=chat_context, query_details_json=query_details_json,
+        weather_data_json=weather_json, follow_up_context=follow_up_context
+    )
+    tokens = {
+        "instructions": instructions_tokens,
+        "weather": weather_tokens,
+        "history": estimate_tokens(chat_context),
+        "total": estimate_tokens(text)
+    }
+    for section in ("instructions", "weather", "history"):
+        PROMPT_SECTION_TOKENS.labels(section).observe(tokens[section])
+    PROMPT_TOKENS_ESTIMATED.observe(tokens["total"])
+    return PromptContext(text, tokens)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.services import llm_prompts
+from app.services.cache import TTLCache
+from app.services.cache_backend import CacheBackend, TieredCache
+from app.services.fast_path import WEATHER_KEYWORDS
+from app.services.forecast_columns import as_columnar
+from app.services.weather_cache import canonical_city_key
+
+# Changing the prompt template (or what goes into it) invalidates cached explanations
+EXPLANATION_PROMPT_VERSION = hashlib.sha1(
+    f"{llm_prompts.GENERATE_WEATHER_EXPLANATION_PROMPT_TEMPLATE}|compact={settings.PROMPT_COMPACTION_ENABLED}".encode()
+).hexdigest()[:12]
+
+# Condition and polarity words of the question. The analysis maps "hot" and "cold" alike
+# to the temperature condition, so these are keyed too: an explanation written for one never answers the other
+CONDITION_WORDS = set(WEATHER_KEYWORDS) | {
+    "cool", "chilly", "freezing", "mild", "warmer", "colder", "hotter", "cooler",
+    "dry", "wet", "calm", "clear", "fog", "foggy", "hail", "sun", "sunshine"
+}
+NEGATION_WORDS = {"not", "no", "never", "without", "cannot"}
+_WORD = re.compile(r"[\w']+")
+
+def question_wording(query: str) -> List[str]:
+    """The question's condition and negation words, e.g. ["hot"] for "Is it hot in Paris?" """
+    words = set(_WORD.findall(query.lower()))
+    cues = {word for word in words if word in CONDITION_WORDS}
+    if words & NEGATION_WORDS or any(word.endswith("n't") for word in words):
+        cues.add("not")
+    return sorted(cues)
+
+def _answer_scope(query: str, query_details: Dict[str, Any]) -> Dict[str, Any]:
+    """What an explanation is about: places, timeframe, conditions, comparison and how the question words them"""
+    return {
+        "cities": sorted(str(canonical_city_key(city)) for city in query_details.get("cities") or []),
+        "time_context": str(query_details.get("time_context") or "").lower(),
+        "specific_time": str(query_details.get("specific_time") or "").lower(),
+        "specific_conditions": sorted({str(condition).lower() for condition in query_details.get("specific_conditions") or []}),
+        "comparison_type": query_details.get("comparison_type"),
+        "wording": question_wording(query),
+    }
+
+def normalize_query_details(query: str, query_details: Dict[str, Any]) -> str:
+    """
+    Canonical form of a question's analysis: differently-phrased questions compare equal
+    when their query_details and condition and negation words match
+    """
+    canonical = {**_answer_scope(query, query_details), "query_types": sorted(set(query_details.get("query_types") or []))}
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+
+def weather_fingerprint(weather_data: Dict[str, Any]) -> str:
+    """
+    Identifies the weather snapshot an explanation was generated from, using the
+    observation/forecast timestamps OpenWeatherMap stamps on every payload.
+    """
+    parts = []
+    for city in sorted(weather_data):
+        city_data = weather_data[city]
+        current = city_data.get("current") or {}
+        forecast = as_columnar(city_data["forecast"]) if city_data.get("forecast") else None
+        forecast_dt = forecast.dt[0] if forecast else None
+        parts.append(f"{canonical_city_key(city)}:{current.get('dt')}:{forecast_dt}:{sorted(city_data.get('errors', {}))}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {' '.join(text.lower().split())} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NgramSimilarityIndex:
+    """
+    Character-trigram Jaccard index over query texts, used to serve near-duplicate
+    phrasings. Candidates are only compared within the same group (prompt version,
+    weather fingerprint, the question's condition words and everything in
+    query_details but query_types), so a match never crosses data, timeframe or
+    the conditions asked about.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._groups: Dict[str, Dict[str, Set[str]]] = {}
+
+    def add(self, group: str, key: str, text: str) -> None:
+        self._groups.setdefault(group, {})[key] = _trigrams(text)
+
+    def discard(self, group: str, key: str) -> None:
+        entries = self._groups.get(group)
+        if entries is not None:
+            entries.pop(key, None)
+            if not entries:
+                del self._groups[group]
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._groups.values())
+
+    def prune(self, is_live) -> None:
+        """Drops entries whose cache key is no longer live"""
+        for group in list(self._groups):
+            for key in [key for key in self._groups[group] if not is_live(key)]:
+                self.discard(group, key)
+
+    def nearest(self, group: str, text: str) -> Optional[str]:
+        grams = _trigrams(text)
+        best_key, best_score = None, self.threshold
+        for key, candidate in self._groups.get(group, {}).items():
+            score = len(grams & candidate) / len(grams | candidate)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+class ExplanationCache:
+    """
+    LRU + TTL cache of generated explanations for history-free turns, keyed by
+    normalised query_details and condition words, the weather snapshot fingerprint
+    and the prompt version.
+    With a shared `backend`, exact-key lookups also find other workers' explanations;
+    near-duplicate matching stays per worker.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.EXPLANATION_CACHE_MAX_SIZE,
+        ttl: float = settings.EXPLANATION_CACHE_TTL,
+        similarity_threshold: float = settings.EXPLANATION_CACHE_SIMILARITY,
+        backend: Optional[CacheBackend] = None
+    ):
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+        # Entries are (explanation, llm_ms)
+        self.shared = TieredCache("explanations", self.cache, backend, decode=lambda data: tuple(json.loads(data)))
+        self.similarity_index = NgramSimilarityIndex(similarity_threshold) if similarity_threshold > 0 else None
+        self.similar_hits = 0
+        self.saved_llm_ms = 0.0
+
+    @staticmethod
+    def make_key(query: str, query_details: Dict[str, Any], weather_data: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Returns (key, group). The group holds the keys a near-duplicate phrasing may
+        be served from: same snapshot and same scope ("tomorrow" never answers
+        "this weekend", "cold" never answers "hot"), differing at most in the
+        query_types the analysis picked.
+        """
+        scope = json.dumps(_answer_scope(query, query_details), sort_keys=True, separators=(",", ":"))
+        group = f"{EXPLANATION_PROMPT_VERSION}|{weather_fingerprint(weather_data)}|{scope}"
+        return f"{group}|{normalize_query_details(query, query_details)}", group
+
+    async def get(self, query: str, query_details: Dict[str, Any], weather_data: Dict[str, Any]) -> Optional[str]:
+        key, group = self.make_key(query, query_details, weather_data)
+        entry = await self.shared.get(key)
+        if entry is None and self.similarity_index is not None:
+            similar_key = self.similarity_index.nearest(group, query)
+            if similar_key is not None:
+                entry = self.cache.get(similar_key)
+                if entry is None:
+                    self.similarity_index.discard(group, similar_key)
+                else:
+                    self.similar_hits += 1
+        if entry is None:
+            return None
+        explanation, llm_ms = entry
+        self.saved_llm_ms += llm_ms
+        return explanation
+
+    async def put(self, query: str, query_details: Dict[str, Any], weather_data: Dict[str, Any], explanation: str, llm_ms: float) -> None:
+        key, group = self.make_key(query, query_details, weather_data)
+        await self.shared.set(key, (explanation, llm_ms))
+        if self.similarity_index is not None:
+            self.similarity_index.add(group, key, query)
+            if len(self.similarity_index) > 2 * self.cache.max_size:
+                self.similarity_index.prune(lambda live_key: live_key in self.cache)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "similar_hits": self.similar_hits,
+            "saved_llm_ms": round(self.saved_llm_ms, 1),
+            "prompt_version": EXPLANATION_PROMPT_VERSION,
+            **self.shared.stats()
+        }
@@ -0,0 +1,173 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from app.services.geocoding import get_geocoding_index
+
+# Whole-query greetings and pleasantries: confidently not weather-related
+GREETINGS = {
+    "hi", "hello", "hey", "hiya", "yo", "good morning", "good afternoon", "good evening",
+    "thanks", "thank you", "thank you so much", "thx", "bye", "goodbye", "ok", "okay"
+}
+
+# keyword -> (query_type, specific_condition)
+WEATHER_KEYWORDS: Dict[str, Tuple[str, Optional[str]]] = {
+    "weather": ("current", None),
+    "forecast": ("forecast", None),
+    "temperature": ("temperature", "temperature"),
+    "temp": ("temperature", "temperature"),
+    "hot": ("temperature", "temperature"),
+    "cold": ("temperature", "temperature"),
+    "warm": ("temperature", "temperature"),
+    "degrees": ("temperature", "temperature"),
+    "rain": ("precipitation", "rain"),
+    "raining": ("precipitation", "rain"),
+    "rainy": ("precipitation", "rain"),
+    "umbrella": ("precipitation", "rain"),
+    "snow": ("precipitation", "snow"),
+    "snowing": ("precipitation", "snow"),
+    "wind": ("wind", "wind"),
+    "windy": ("wind", "wind"),
+    "humidity": ("humidity", "humidity"),
+    "humid": ("humidity", "humidity"),
+    "sunny": ("conditions", "sunny"),
+    "cloudy": ("conditions", "clouds"),
+    "clouds": ("conditions", "clouds"),
+    "storm": ("alerts", "storm"),
+    "storms": ("alerts", "storm"),
+    "thunderstorm": ("alerts", "storm"),
+}
+
+# phrase -> (time_context, specific_time); longest phrases are matched first
+TIME_EXPRESSIONS: Dict[str, Tuple[str, Optional[str]]] = {
+    "right now": ("current", None),
+    "now": ("current", None),
+    "currently": ("current", None),
+    "today": ("current", None),
+    "tonight": ("future", "tonight"),
+    "tomorrow": ("future", "tomorrow"),
+    "day after tomorrow": ("future", "day after tomorrow"),
+    "this weekend": ("future", "weekend"),
+    "weekend": ("future", "weekend"),
+    "next week": ("future", "week"),
+    "this week": ("future", "week"),
+    "later": ("future", "later today"),
+}
+
+# Anything the lexicon cannot resolve on its own is left to the LLM
+AMBIGUOUS_MARKERS = re.compile(
+    r"\b(compare|comparison|versus|vs|than|difference|yesterday|last|ago|there|same|"
+    r"what about|how about|and then|should i|if|history|climate|average|month|year)\b"
+)
+# Words that carry no place or intent of their own; with the lexicon and the matched
+# city they must cover the whole query, so a qualifier such as a state ("Paris Texas")
+# or an unknown place leaves the query to the LLM
+FILLER_WORDS = {
+    "what", "what's", "whats", "how", "how's", "hows", "is", "are", "will", "it", "it's", "its", "be",
+    "going", "to", "the", "a", "an", "in", "for", "at", "of", "on", "like", "looking", "look", "me",
+    "tell", "show", "give", "get", "check", "please", "any", "chance", "expected", "outside", "out",
+    "do", "does", "i", "need", "much", "very", "so", "current", "conditions", "right"
+}
+KNOWN_WORDS = FILLER_WORDS | set(WEATHER_KEYWORDS) | {word for phrase in TIME_EXPRESSIONS for word in phrase.split()}
+_WORD = re.compile(r"[\w'.]+")
+MAX_CITY_WORDS = 4
+
+def _scan_cities(text: str) -> Tuple[List[str], List[str], bool]:
+    """
+    Longest-match scan of the text's words against the gazetteer (exact names and
+    aliases only). Returns the cities, the words outside them, and whether a
+    city is directly followed by a comma (as in "Paris, Texas").
+    """
+    index = get_geocoding_index()
+    matches = list(_WORD.finditer(text))
+    words = [match.group().strip(".'") for match in matches]
+    cities: List[str] = []
+    rest: List[str] = []
+    comma_after_city = False
+    i = 0
+    while i < len(words):
+        for size in range(min(MAX_CITY_WORDS, len(words) - i), 0, -1):
+            place = index.exact(" ".join(words[i:i + size]))
+            if place:
+                if place.name not in cities:
+                    cities.append(place.name)
+                comma_after_city |= text[matches[i + size - 1].end():].lstrip().startswith(",")
+                i += size
+                break
+        else:
+            rest.append(words[i])
+            i += 1
+    return cities, rest, comma_after_city
+
+def find_cities(text: str) -> List[str]:
+    """Longest-match scan of the query words against the gazetteer (exact names and aliases only)"""
+    return _scan_cities(text)[0]
+
+def parse_time_expression(text: str) -> Tuple[str, Optional[str]]:
+    lowered = text.casefold()
+    for phrase in sorted(TIME_EXPRESSIONS, key=len, reverse=True):
+        if re.search(rf"\b{re.escape(phrase)}\b", lowered):
+            return TIME_EXPRESSIONS[phrase]
+    return "current", None
+
+class FastPathClassifier:
+    """
+    Deterministic, LLM-free pre-classifier for obvious queries.
+
+    Combines a keyword/intent lexicon, a small time-expression parser and a lookup
+    against the bundled city gazetteer. When every word of the query is understood
+    (one gazetteer city, lexicon and filler words, nothing qualifying the city) it
+    emits query_details directly; anything ambiguous is left to the LLM path.
+    """
+
+    def __init__(self):
+        self.attempts = 0
+        self.weather_hits = 0
+        self.greeting_hits = 0
+
+    def classify(self, query: str) -> Optional[Tuple[bool, Optional[Dict[str, Any]]]]:
+        """
+        Returns (is_weather_related, query_details) when the query is understood
+        with confidence, or None to defer to the LLM path.
+        """
+        self.attempts += 1
+        normalized = " ".join(_WORD.findall(query.casefold()))
+        if normalized in GREETINGS:
+            self.greeting_hits += 1
+            return False, None
+        if AMBIGUOUS_MARKERS.search(normalized):
+            return None
+
+        words = set(normalized.split())
+        matched = [WEATHER_KEYWORDS[word] for word in WEATHER_KEYWORDS if word in words]
+        cities, rest, comma_after_city = _scan_cities(query)
+        if not matched or len(cities) != 1:
+            return None
+        # "Paris, Texas", "London Ontario": the gazetteer city may not be the one meant
+        if comma_after_city or any(word.casefold() not in KNOWN_WORDS for word in rest):
+            return None
+
+        time_context, specific_time = parse_time_expression(query)
+        query_types = list(dict.fromkeys(query_type for query_type, _ in matched))
+        if time_context == "future" and "forecast" not in query_types:
+            query_types.append("forecast")
+        query_details: Dict[str, Any] = {
+            "cities": cities,
+            "query_types": query_types,
+            "time_context": time_context,
+            "specific_conditions": list(dict.fromkeys(condition for _, condition in matched if condition)),
+            "comparison_type": None,
+            "is_follow_up": False
+        }
+        if specific_time:
+            query_details["specific_time"] = specific_time
+        self.weather_hits += 1
+        return True, query_details
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.weather_hits + self.greeting_hits
+        return {
+            "attempts": self.attempts,
+            "weather_hits": self.weather_hits,
+            "greeting_hits": self.greeting_hits,
+            "deferred_to_llm": self.attempts - hits,
+            "coverage": round(hits / self.attempts, 4) if self.attempts else 0.0
+        }
@@ -0,0 +1,228 @@
+import math
+import time
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# (column, array typecode, path in an OpenWeatherMap /forecast list entry)
+COLUMNS = (
+    ("dt", "q", ("dt",)),
+    ("temp", "f", ("main", "temp")),
+    ("feels_like", "f", ("main", "feels_like")),
+    ("humidity", "B", ("main", "humidity")),
+    ("pressure", "H", ("main", "pressure")),
+    ("wind_speed", "f", ("wind", "speed")),
+    ("wind_deg", "H", ("wind", "deg")),
+    ("wind_gust", "f", ("wind", "gust")),
+    ("clouds", "B", ("clouds", "all")),
+    ("visibility", "f", ("visibility",)),
+    ("pop", "f", ("pop",)),
+    ("rain", "f", ("rain", "3h")),
+    ("snow", "f", ("snow", "3h")),
+    ("condition", "H", None)
+)
+COLUMN_NAMES = tuple(name for name, _, _ in COLUMNS)
+# Fields OpenWeatherMap leaves out when unknown, where 0 would be a real reading
+# (calm, fog): stored as NaN and left out again by entry()
+MISSING = float("nan")
+NULLABLE_COLUMNS = ("wind_gust", "visibility")
+
+def local_date(timestamp: int, offset_seconds: int) -> str:
+    return datetime.fromtimestamp(timestamp + offset_seconds, tz=timezone.utc).date().isoformat()
+
+def select_days(days: List[str], today: str, specific_time: Optional[str]) -> List[str]:
+    """Picks the local dates a specific_time refers to; unknown or absent timeframes keep every day"""
+    if not specific_time:
+        return days
+    wanted = str(specific_time).lower()
+    today_date = datetime.strptime(today, "%Y-%m-%d").date()
+    if "day after tomorrow" in wanted:
+        target = [(today_date + timedelta(days=2)).isoformat()]
+    elif "tomorrow" in wanted:
+        target = [(today_date + timedelta(days=1)).isoformat()]
+    elif "tonight" in wanted or "today" in wanted or "later" in wanted:
+        target = [today]
+    elif "weekend" in wanted:
+        target = [day for day in days if datetime.strptime(day, "%Y-%m-%d").weekday() >= 5]
+    else:
+        return days
+    selected = [day for day in days if day in target]
+    return selected or days
+
+def _field(entry: Dict[str, Any], path: Tuple[str, ...], default: Any = 0) -> Any:
+    value: Any = entry
+    for part in path:
+        value = value.get(part) if isinstance(value, dict) else None
+        if value is None:
+            return default
+    return value
+
+class ColumnarForecast:
+    """
+    A parsed OpenWeatherMap /forecast payload: one typed array per field instead
+    of 40 nested dicts, built once per fetch. This is the form that is cached and
+    summarised for prompts; to_payload() rebuilds the /forecast shape for API
+    responses. Slots are kept in time order, so each local day is a contiguous
+    slice and daily aggregates run over array slices.
+
+    Absent rain and snow are stored as 0; absent gust and visibility as NaN
+    (MISSING), so they are not mistaken for calm air or fog.
+    """
+
+    __slots__ = COLUMN_NAMES + ("city", "conditions", "_day_slices")
+
+    def __init__(self, city: Dict[str, Any], conditions: Dict[int, Tuple[str, str, str]], columns: Dict[str, array]):
+        self.city = city
+        # condition code -> (main, description, icon) as reported by OpenWeatherMap
+        self.conditions = conditions
+        for name in COLUMN_NAMES:
+            setattr(self, name, columns[name])
+        self._day_slices: Optional[Dict[str, slice]] = None
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "ColumnarForecast":
+        entries = sorted(payload.get("list", []), key=lambda entry: entry["dt"])
+        columns = {name: array(typecode) for name, typecode, _ in COLUMNS}
+        conditions: Dict[int, Tuple[str, str, str]] = {}
+        for entry in entries:
+            for name, typecode, path in COLUMNS[:-1]:
+                value = _field(entry, path, MISSING if name in NULLABLE_COLUMNS else 0)
+                columns[name].append(value if typecode == "f" else int(value))
+            weather = (entry.get("weather") or [{}])[0]
+            code = weather.get("id", 0)
+            columns["condition"].append(code)
+            conditions.setdefault(code, (weather.get("main", ""), weather.get("description", ""), weather.get("icon", "")))
+        city = {key: value for key, value in payload.get("city", {}).items() if key in ("id", "name", "coord", "country", "timezone", "sunrise", "sunset")}
+        return cls(city, conditions, columns)
+
+    def __len__(self) -> int:
+        return len(self.dt)
+
+    @property
+    def timezone_offset(self) -> int:
+        return self.city.get("timezone", 0)
+
+    def nbytes(self) -> int:
+        """Bytes held by the column buffers"""
+        return sum(column.itemsize * len(column) for column in (getattr(self, name) for name in COLUMN_NAMES))
+
+    def day_slices(self) -> Dict[str, slice]:
+        """Local date -> slice of that day's slots"""
+        if self._day_slices is None:
+            slices: Dict[str, slice] = {}
+            start = 0
+            offset = self.timezone_offset
+            days = [local_date(timestamp, offset) for timestamp in self.dt]
+            for i in range(1, len(days) + 1):
+                if i == len(days) or days[i] != days[start]:
+                    slices[days[start]] = slice(start, i)
+                    start = i
+            self._day_slices = slices
+        return self._day_slices
+
+    def days(self) -> List[str]:
+        return list(self.day_slices())
+
+    def window(self, specific_time: Optional[str], now: Optional[float] = None) -> List[str]:
+        """Local dates covered by a timeframe such as "tomorrow" or "weekend" (all days when unknown)"""
+        today = local_date(int(now if now is not None else time.time()), self.timezone_offset)
+        return select_days(self.days(), today, specific_time)
+
+    def description(self, code: int) -> str:
+        return self.conditions.get(code, ("", "", ""))[1]
+
+    def daily(self, days: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Per-day aggregates (temperature range, mean humidity, precipitation, ...) for `days` (default all)"""
+        slices = self.day_slices()
+        return {day: self._rollup(slices[day]) for day in (days if days is not None else slices) if day in slices}
+
+    def _rollup(self, day: slice) -> Dict[str, Any]:
+        temps, humidity = self.temp[day], self.humidity[day]
+        return {
+            "temp_min": round(min(temps), 1),
+            "temp_max": round(max(temps), 1),
+            "humidity_avg": round(sum(humidity) / len(humidity)),
+            "precip_mm": round(sum(self.rain[day]) + sum(self.snow[day]), 1),
+            "max_pop": round(max(self.pop[day]), 2),
+            "wind_max": round(max(self.wind_speed[day]), 2),
+            "conditions": self.description(Counter(self.condition[day]).most_common(1)[0][0])
+        }
+
+    def slots(self, day: str) -> List[Dict[str, Any]]:
+        """The 3-hourly slots of one local day, reduced to what prompts use"""
+        offset = self.timezone_offset
+        return [
+            {
+                "time": datetime.fromtimestamp(self.dt[i] + offset, tz=timezone.utc).strftime("%H:%M"),
+                "temp": round(self.temp[i], 2),
+                "conditions": self.description(self.condition[i]),
+                "pop": round(self.pop[i], 2),
+                "wind": round(self.wind_speed[i], 2)
+            }
+            for i in range(*self.day_slices()[day].indices(len(self)))
+        ]
+
+    def summarize(self, specific_time: Optional[str], now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Per-day aggregates for the requested window. Single-day windows (today,
+        tonight, tomorrow) also keep the 3-hourly slots.
+        """
+        days = self.window(specific_time, now)
+        summary: Dict[str, Any] = {"daily": self.daily(days)}
+        if len(days) == 1 and len(days) < len(self.day_slices()):
+            summary["slots"] = self.slots(days[0])
+        return summary
+
+    def entry(self, i: int) -> Dict[str, Any]:
+        """Slot `i` in the shape of a /forecast list entry"""
+        main, description, icon = self.conditions.get(self.condition[i], ("", "", ""))
+        entry: Dict[str, Any] = {
+            "dt": self.dt[i],
+            "main": {"temp": round(self.temp[i], 2), "feels_like": round(self.feels_like[i], 2), "pressure": self.pressure[i], "humidity": self.humidity[i]},
+            "weather": [{"id": self.condition[i], "main": main, "description": description, "icon": icon}],
+            "clouds": {"all": self.clouds[i]},
+            "wind": {"speed": round(self.wind_speed[i], 2), "deg": self.wind_deg[i]},
+            "pop": round(self.pop[i], 2),
+            "dt_txt": datetime.fromtimestamp(self.dt[i], tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        }
+        if not math.isnan(self.wind_gust[i]):
+            entry["wind"]["gust"] = round(self.wind_gust[i], 2)
+        if not math.isnan(self.visibility[i]):
+            entry["visibility"] = int(self.visibility[i])
+        if self.rain[i]:
+            entry["rain"] = {"3h": round(self.rain[i], 2)}
+        if self.snow[i]:
+            entry["snow"] = {"3h": round(self.snow[i], 2)}
+        return entry
+
+    def to_payload(self) -> Dict[str, Any]:
+        """The forecast in OpenWeatherMap /forecast shape (fields this type does not keep are omitted)"""
+        return {"cnt": len(self), "list": [self.entry(i) for i in range(len(self))], "city": self.city}
+
+def as_columnar(forecast: Union[ColumnarForecast, Dict[str, Any]]) -> ColumnarForecast:
+    return forecast if isinstance(forecast, ColumnarForecast) else ColumnarForecast.from_payload(forecast)
+
+def compare_forecasts(
+    forecasts: Dict[str, ColumnarForecast],
+    specific_time: Optional[str] = None,
+    now: Optional[float] = None
+) -> Dict[str, Dict[str, str]]:
+    """
+    For each local date in the window that every city's forecast covers, names
+    the warmest, coldest, wettest and windiest city.
+    """
+    if len(forecasts) < 2:
+        return {}
+    rollups = {city: forecast.daily(forecast.window(specific_time, now)) for city, forecast in forecasts.items()}
+    shared_days = sorted(set.intersection(*(set(days) for days in rollups.values())))
+    comparison = {}
+    for day in shared_days:
+        per_city = {city: days[day] for city, days in rollups.items()}
+        comparison[day] = {
+            "warmest": max(per_city, key=lambda city: per_city[city]["temp_max"]),
+            "coldest": min(per_city, key=lambda city: per_city[city]["temp_min"]),
+            "wettest": max(per_city, key=lambda city: per_city[city]["precip_mm"]),
+            "windiest": max(per_city, key=lambda city: per_city[city]["wind_max"])
+        }
+    return comparison
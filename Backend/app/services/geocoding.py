@@ -0,0 +1,130 @@
+import csv
+import difflib
+import unicodedata
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+GAZETTEER_PATH = Path(__file__).resolve().parent.parent / "data" / "cities.csv"
+
+class Place(NamedTuple):
+    id: int
+    name: str
+    country: str
+    lat: float
+    lon: float
+
+def fold_name(name: str) -> str:
+    """Case-folds, strips accents and collapses whitespace/punctuation: "São  Paulo" -> "sao paulo" """
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.replace(".", " ").replace(",", " ").split())
+
+class PackedStrings(Sequence[str]):
+    """
+    Read-only sequence of strings packed into one str plus an offsets array,
+    roughly 4-5x smaller than a list of separate str objects.
+    """
+
+    def __init__(self, strings: Iterable[str]):
+        strings = list(strings)
+        self._offsets = array("I", [0])
+        for string in strings:
+            self._offsets.append(self._offsets[-1] + len(string))
+        self._data = "".join(strings)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self._data[self._offsets[index]:self._offsets[index + 1]]
+
+class GeocodingIndex:
+    """
+    In-process geocoder over the bundled offline gazetteer.
+
+    Places are stored column-wise (packed names, float arrays for coordinates) and
+    every folded name/alias is kept in one sorted packed key list, so exact and
+    prefix lookups are binary searches. Lookups resolve an exact name/alias;
+    with `approximate`, also a unique prefix, then a fuzzy match among keys
+    sharing the first two (or, for crowded buckets, three) letters.
+    """
+
+    FUZZY_CUTOFF = 0.85
+    MAX_FUZZY_CANDIDATES = 2000
+
+    def __init__(self, rows: Iterable[Tuple[str, str, float, float, Sequence[str]]]):
+        names, countries, lats, lons = [], [], array("f"), array("f")
+        keyed: List[Tuple[str, int]] = []
+        for place_id, (name, country, lat, lon, aliases) in enumerate(rows):
+            names.append(name)
+            countries.append(country)
+            lats.append(lat)
+            lons.append(lon)
+            for key in {fold_name(name), *(fold_name(alias) for alias in aliases if alias)}:
+                keyed.append((key, place_id))
+        keyed.sort()
+        self._names = PackedStrings(names)
+        self._countries = PackedStrings(countries)
+        self._lats = lats
+        self._lons = lons
+        self._keys = PackedStrings(key for key, _ in keyed)
+        self._key_places = array("I", (place_id for _, place_id in keyed))
+
+    @classmethod
+    def from_csv(cls, path: Path = GAZETTEER_PATH) -> "GeocodingIndex":
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls(
+                (row["name"], row["country"], float(row["lat"]), float(row["lon"]), row["aliases"].split("|"))
+                for row in csv.DictReader(f)
+            )
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _place(self, place_id: int) -> Place:
+        return Place(place_id, self._names[place_id], self._countries[place_id], round(self._lats[place_id], 4), round(self._lons[place_id], 4))
+
+    def _key_range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self._keys, prefix), bisect_left(self._keys, prefix + "\uffff")
+
+    def exact(self, name: str) -> Optional[Place]:
+        key = fold_name(name)
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._place(self._key_places[i])
+        return None
+
+    def lookup(self, name: str, approximate: bool = False) -> Optional[Place]:
+        """
+        Place for a name. Prefix and fuzzy matches are guesses ("Spring" is not
+        "Springfield"), so they are only tried when the caller opts in.
+        """
+        key = fold_name(name)
+        if not key:
+            return None
+        place = self.exact(key)
+        if place is not None or not approximate:
+            return place
+        start, end = self._key_range(key)
+        if start < end and len({self._key_places[i] for i in range(start, end)}) == 1:
+            return self._place(self._key_places[start])
+        start, end = self._key_range(key[:2])
+        if end - start > self.MAX_FUZZY_CANDIDATES:
+            start, end = self._key_range(key[:3])
+        candidates = self._keys[start:end]
+        matches = difflib.get_close_matches(key, candidates, n=1, cutoff=self.FUZZY_CUTOFF)
+        if matches:
+            return self._place(self._key_places[start + candidates.index(matches[0])])
+        return None
+
+@lru_cache(maxsize=1)
+def get_geocoding_index() -> GeocodingIndex:
+    """Process-wide index, built from the bundled gazetteer on first use"""
+    return GeocodingIndex.from_csv()
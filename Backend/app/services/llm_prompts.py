@@ -74,4 +74,21 @@ Current user query: "{query}"
 
 Based on the conversation history, what is the primary city being discussed or previously mentioned that the current query most likely refers to? 
 Respond with ONLY the city name (e.g., London, New York). If no city is clearly implied for the current query from the history, respond with the exact word 'None'.
+"""
+
+FUSED_QUERY_ANALYSIS_PROMPT_TEMPLATE = """
+You are the query analyser of a weather-focused AI assistant.
+{history_context}
+Current user query: "{query}"
+
+Fill in every field of the structured response:
+- is_weather_related: true if the query is about weather, forecasts, climate, weather alerts or weather-related planning/travel advice; false otherwise
+- cities: city names mentioned in the current query (empty if none)
+- query_types: any of {query_types_list}
+- time_context: "current", "future" or "past"
+- specific_time: the timeframe asked about (e.g. "tomorrow", "week", "weekend"), or null
+- specific_conditions: specific conditions asked about (temperature, rain, wind, ...)
+- comparison_type: "time" if comparing different times, "location" if comparing places, null otherwise
+- is_follow_up: true if the query relies on the previous conversation (e.g. "And tomorrow?")
+- inferred_city_from_history: if cities is empty and the query is a follow-up, the city from the conversation it most likely refers to; otherwise null
 """
\ No newline at end of file
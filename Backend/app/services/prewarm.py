@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.governor import DependencyUnavailableError
+from app.services.weather_cache import CachedWeatherService
+from app.services.weather_service import counting_requests, without_retries
+
+logger = logging.getLogger(__name__)
+
+class CallBudget:
+    """Token bucket allowing `per_minute` calls per minute, in bursts of at most that many"""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self._tokens = per_minute
+        self._updated = time.monotonic()
+
+    def available(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.per_minute, self._tokens + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+        return self._tokens
+
+    def try_acquire(self) -> bool:
+        if self.available() < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def settle(self, calls: int) -> None:
+        """Charges `calls` more (or refunds them, when negative); the bucket may go into debt"""
+        self._tokens = min(self.per_minute, self.available() - calls)
+
+class WeatherPrewarmer:
+    """
+    Keeps the weather cache warm for hot cities. Every `interval` seconds the
+    `top_k` most requested cache entries (decayed counts of at least
+    `min_requests`) that expire within `lead_time` seconds, or already have,
+    are re-fetched, hottest first. Refreshes spend at most `calls_per_minute`
+    OpenWeatherMap calls, where one /group request refreshing current weather
+    for several cities counts once; whatever does not fit waits for the next round.
+    Refreshes are not retried; a failed refresh is simply due again next round.
+    Each batch is charged one call up front, and the round is settled against
+    the requests actually made: ids a /group response leaves out are fetched
+    one by one, and entries another worker refreshed meanwhile cost nothing.
+    """
+
+    def __init__(
+        self,
+        weather_cache: CachedWeatherService,
+        top_k: int = settings.PREWARM_TOP_K,
+        lead_time: float = settings.PREWARM_LEAD_TIME,
+        interval: float = settings.PREWARM_INTERVAL,
+        calls_per_minute: float = settings.PREWARM_CALLS_PER_MINUTE,
+        min_requests: float = settings.PREWARM_MIN_REQUESTS
+    ):
+        self.weather_cache = weather_cache
+        self.top_k = top_k
+        self.lead_time = lead_time
+        self.interval = interval
+        self.min_requests = min_requests
+        self.budget = CallBudget(calls_per_minute)
+        self._task: Optional[asyncio.Task] = None
+        self.rounds = 0
+        self.refreshed = 0
+        self.refresh_failures = 0
+        self.budget_deferred = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh_due()
+            except Exception:
+                logger.exception("Weather pre-warm round failed")
+
+    async def refresh_due(self) -> int:
+        """Runs one round; returns how many entries were refreshed"""
+        self.rounds += 1
+        due = [
+            key for key, requests in self.weather_cache.hot_keys(self.top_k)
+            if requests >= self.min_requests and self.weather_cache.ttl_remaining(key) <= self.lead_time
+        ]
+        batches = self.weather_cache.refresh_batches(due)
+        selected = []
+        for i, batch in enumerate(batches):
+            if not self.budget.try_acquire():
+                self.budget_deferred += sum(len(deferred) for deferred in batches[i:])
+                break
+            selected.append(batch)
+        if not selected:
+            return 0
+
+        with without_retries(), counting_requests() as counter:
+            outcomes = await asyncio.gather(*(self.weather_cache.refresh_many(batch) for batch in selected))
+        self.budget.settle(counter.requests - len(selected))
+        refreshed = 0
+        for batch, batch_outcomes in zip(selected, outcomes):
+            for key, outcome in zip(batch, batch_outcomes):
+                if outcome is not None:
+                    self.refresh_failures += 1
+                    if not isinstance(outcome, DependencyUnavailableError):
+                        logger.warning("Pre-warming %s failed: %s", key, outcome)
+                else:
+                    refreshed += 1
+        self.refreshed += refreshed
+        logger.debug("Pre-warmed %s of %s due weather entries", refreshed, len(due))
+        return refreshed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "rounds": self.rounds,
+            "refreshed": self.refreshed,
+            "refresh_failures": self.refresh_failures,
+            "budget_deferred": self.budget_deferred,
+            "budget_available": round(self.budget.available(), 2),
+            "calls_per_minute": self.budget.per_minute
+        }
@@ -1,7 +1,21 @@
+import asyncio
 import json
-from typing import Dict, Any, List, Optional
+import re
+import orjson
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from langchain_core.messages import HumanMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
+from app.core.config import settings
+from app.core.governor import DependencyUnavailableError
+from app.core.llm_invoker import llm_invoker
+from app.core.metrics import record_llm_usage
 from app.db.supabase_client import SupabaseDB
+from app.models.weather import QueryAnalysis
+from app.services.context_builder import build_explanation_prompt
+from app.services.geocoding import get_geocoding_index
+from app.services.response_helper import weather_data_payload
+from app.services.weather_cache import canonical_city_key
+from app.services.weather_summary import estimate_tokens, summarize_weather_data
 from . import llm_prompts # Assuming llm_prompts.py is in the same directory
 import logging
 
@@ -9,6 +23,68 @@ import logging
 # For now, assuming it's passed or handled within ai_service
 # QUERY_TYPES = { ... }
 
+def apply_follow_up_time_hints(query_details: Dict[str, Any], query: str) -> None:
+    """Fills in the timeframe of a city-less follow-up ("And tomorrow?") from the query text, in-place."""
+    # Simplified follow-up logic, can be expanded as in original
+    if query_details.get("is_follow_up", False) and not query_details.get("cities"):
+        if "tomorrow" in query.lower():
+            query_details["time_context"] = "future"
+            query_details["specific_time"] = "tomorrow"
+        elif "week" in query.lower():
+            query_details["time_context"] = "future"
+            query_details["specific_time"] = "week"
+        elif "month" in query.lower():
+            query_details["time_context"] = "future"
+            query_details["specific_time"] = "month"
+
+async def analyze_query_fused(
+    llm: ChatGoogleGenerativeAI,
+    query: str,
+    query_types_list: List[str],
+    history: List[Dict[str, Any]],
+    logger: logging.Logger
+) -> Optional[Tuple[bool, Dict[str, Any]]]:
+    """
+    Classifies the query and extracts its details (including a city inferred
+    from history) with one structured-output LLM call.
+    Returns (is_weather_related, query_details), or None if the call failed and
+    the caller should fall back to the multi-call path.
+    """
+    history_context = ""
+    if history:
+        history_context = "Recent conversation:\n" + "".join(
+            f"User: {record['user_message']}\n" for record in history
+        )
+    prompt = llm_prompts.FUSED_QUERY_ANALYSIS_PROMPT_TEMPLATE.format(
+        history_context=history_context,
+        query=query,
+        query_types_list=query_types_list
+    )
+    try:
+        analysis = await llm_invoker.call(
+            lambda: llm.with_structured_output(QueryAnalysis).ainvoke(prompt),
+            deadline=settings.LLM_ANALYSIS_DEADLINE,
+            operation="fused_analysis"
+        )
+        if isinstance(analysis, dict):
+            analysis = QueryAnalysis.model_validate(analysis)
+    except DependencyUnavailableError:
+        # The multi-call path would hit the same unavailable model
+        raise
+    except Exception as e:
+        logger.warning("Fused query analysis failed, falling back to multi-call path: %s", e)
+        return None
+    logger.debug("Fused query analysis: %s", analysis)
+
+    query_details = analysis.model_dump(exclude={"is_weather_related", "specific_time", "inferred_city_from_history"})
+    if analysis.specific_time:
+        query_details["specific_time"] = analysis.specific_time
+    apply_follow_up_time_hints(query_details, query)
+    if not query_details["cities"] and analysis.is_follow_up and analysis.inferred_city_from_history:
+        query_details["cities"] = [analysis.inferred_city_from_history]
+        logger.info("Inferred city from history: %s", analysis.inferred_city_from_history)
+    return analysis.is_weather_related, query_details
+
 async def extract_query_details_from_llm(
     llm: ChatGoogleGenerativeAI,
     query: str,
@@ -18,14 +94,15 @@ async def extract_query_details_from_llm(
     """
     Extracts detailed information from the user's query using the LLM.
     """
-    logger.debug(f"Extracting query details for: {query}")
+    logger.debug("Extracting query details for: %s", query)
     
     prompt = llm_prompts.EXTRACT_QUERY_DETAILS_PROMPT_TEMPLATE.format(
         query=query,
         query_types_list=query_types_list
     )
     
-    response = await llm.ainvoke(prompt)
+    response = await llm_invoker.call(lambda: llm.ainvoke(prompt), deadline=settings.LLM_ANALYSIS_DEADLINE, operation="extraction")
+    record_llm_usage("extraction", getattr(response, "usage_metadata", None))
     try:
         content = response.content.strip()
         if content.startswith("```json"):
@@ -34,23 +111,12 @@ async def extract_query_details_from_llm(
             content = content[3:-3]
         
         extracted_details = json.loads(content)
-        logger.debug(f"Extracted details: {extracted_details}")
+        logger.debug("Extracted details: %s", extracted_details)
         
-        # Simplified follow-up logic, can be expanded as in original
-        if extracted_details.get("is_follow_up", False) and not extracted_details.get("cities"):
-            if "tomorrow" in query.lower():
-                extracted_details["time_context"] = "future"
-                extracted_details["specific_time"] = "tomorrow"
-            elif "week" in query.lower():
-                extracted_details["time_context"] = "future"
-                extracted_details["specific_time"] = "week"
-            elif "month" in query.lower():
-                extracted_details["time_context"] = "future"
-                extracted_details["specific_time"] = "month"
-                
+        apply_follow_up_time_hints(extracted_details, query)
         return extracted_details
     except json.JSONDecodeError as e:
-        logger.error(f"JSONDecodeError in extract_query_details_from_llm: {e}. Content was: {response.content}")
+        logger.error("JSONDecodeError in extract_query_details_from_llm: %s. Content was: %s", e, response.content)
         # Fallback, similar to original
         return {
             "cities": [],
@@ -66,14 +132,17 @@ async def infer_city_from_history(
     db: SupabaseDB,
     query: str,
     session_id: Optional[str],
-    logger: logging.Logger
+    logger: logging.Logger,
+    history: Optional[List[Dict[str, Any]]] = None
 ) -> Optional[str]:
     """
     If no city is specified in a follow-up query, tries to infer it from chat history.
+    Pass `history` when it was already loaded for this request to avoid another DB read.
     Returns the inferred city name or None.
     """
     logger.debug("Attempting to infer city from history.")
-    history = await db.get_chat_history(session_id=session_id, limit=5)
+    if history is None:
+        history = await db.get_chat_history(session_id=session_id, limit=5)
     
     if history:
         history_context_for_city_extraction_str = "Consider the following recent conversation:\n"
@@ -85,9 +154,10 @@ async def infer_city_from_history(
             query=query
         )
         
-        city_response = await llm.ainvoke(city_extraction_prompt_text)
+        city_response = await llm_invoker.call(lambda: llm.ainvoke(city_extraction_prompt_text), deadline=settings.LLM_ANALYSIS_DEADLINE, operation="history_inference")
+        record_llm_usage("history_inference", getattr(city_response, "usage_metadata", None))
         extracted_city_from_history = city_response.content.strip().strip('.')
-        logger.debug(f"LLM response for city extraction: '{extracted_city_from_history}'")
+        logger.debug("LLM response for city extraction: '%s'", extracted_city_from_history)
 
         if extracted_city_from_history and extracted_city_from_history.lower() != 'none':
             potential_city = extracted_city_from_history
@@ -101,39 +171,130 @@ async def infer_city_from_history(
                                  "no city", "context does not", "not specified", "no specific city"])
 
             if not is_disclaimer and 1 < len(potential_city) < 50:
-                logger.info(f"Inferred city from history: {potential_city}")
+                logger.info("Inferred city from history: %s", potential_city)
                 return potential_city
     return None
 
+# "in Paris", "for New York", "at Dhaka": a capitalised name right after a location preposition
+_OBVIOUS_CITY_PATTERN = re.compile(r"\b(?:in|for|at)\s+([A-Z][a-zA-Z'-]+(?:\s+[A-Z][a-zA-Z'-]+){0,2})")
+_FORECAST_HINTS = ("tomorrow", "forecast", "week", "tonight", "later", "next")
+
+def guess_cities_from_query(query: str) -> List[str]:
+    """
+    Cheap, LLM-free guess at cities that are obvious in the query text. Only
+    names the gazetteer knows exactly count, so "in June" or "at Noon" is no
+    guess; "in New York Tomorrow" yields the longest such run of words. A name
+    qualified after a comma ("Paris, Texas") may be another place and is skipped.
+    """
+    index = get_geocoding_index()
+    cities = []
+    for match in _OBVIOUS_CITY_PATTERN.finditer(query):
+        if query[match.end():].lstrip().startswith(","):
+            continue
+        words = match.group(1).split()
+        for end in range(len(words), 0, -1):
+            if index.exact(" ".join(words[:end])) is not None:
+                cities.append(" ".join(words[:end]))
+                break
+    return list(dict.fromkeys(cities))
+
+async def prefetch_weather(weather_service, query: str, logger=None) -> None:
+    """
+    Speculatively warms the weather cache for cities guessed from the query text,
+    so the real fetch after extraction hits the cache or joins the in-flight request.
+    """
+    cities = guess_cities_from_query(query)
+    if not cities:
+        return
+    wants_forecast = any(hint in query.lower() for hint in _FORECAST_HINTS)
+    fetches = [weather_service.get_weather_many(cities)]
+    if wants_forecast:
+        fetches.append(weather_service.get_forecast_many(cities))
+    results = [result for results in await asyncio.gather(*fetches) for result in results]
+    if logger:
+        failed = sum(isinstance(result, Exception) for result in results)
+        logger.debug("Speculative prefetch for %s: %s ok, %s failed", cities, len(results) - failed, failed)
+
+def plan_weather_fetches(query_details: Dict[str, Any]) -> Dict[Tuple[str, str], str]:
+    """
+    Works out the full, deduplicated set of fetches a query needs.
+    Returns {(location_key, endpoint): city}, where endpoint is "current" or "forecast".
+    """
+    time_context = query_details.get("time_context")
+    wants_current = time_context == "current" or bool(query_details.get("comparison_type"))
+    wants_forecast = (
+        time_context == "future"
+        or query_details.get("is_follow_up", False)
+        or bool(query_details.get("comparison_type"))
+    )
+    plan: Dict[Tuple[str, str], str] = {}
+    for city in query_details.get("cities") or []:
+        if wants_current:
+            plan.setdefault((canonical_city_key(city), "current"), city)
+        if wants_forecast:
+            plan.setdefault((canonical_city_key(city), "forecast"), city)
+    return plan
+
 async def get_weather_data(weather_service, query_details, logger=None):
-    """Fetch appropriate weather data based on query details """
+    """
+    Fetch appropriate weather data based on query details.
+    Current conditions and forecasts for all cities are fetched as two bulk
+    lookups running concurrently; a failed fetch is reported under the city's
+    "errors" key instead of aborting the other cities.
+    """
+    plan = plan_weather_fetches(query_details)
+    current = [(key, city) for key, city in plan.items() if key[1] == "current"]
+    forecast = [(key, city) for key, city in plan.items() if key[1] == "forecast"]
+    current_results, forecast_results = await asyncio.gather(
+        weather_service.get_weather_many([city for _, city in current]),
+        weather_service.get_forecast_many([city for _, city in forecast])
+    )
+    fetched = dict(zip([key for key, _ in current + forecast], current_results + forecast_results))
+    if fetched and all(isinstance(result, Exception) for result in fetched.values()):
+        # Nothing usable came back for any city
+        raise next(iter(fetched.values()))
+
     weather_data = {}
     for city in query_details["cities"]:
         city_data = {}
-        if query_details["time_context"] == "current":
-            city_data["current"] = await weather_service.get_weather_by_city(city)
-        if query_details["time_context"] == "future" or query_details.get("is_follow_up", False):
-            forecast_data = await weather_service.get_forecast(city)
-            city_data["forecast"] = forecast_data
-            if "specific_time" in query_details:
-                city_data["specific_time_request"] = query_details["specific_time"]
-        if query_details.get("comparison_type"):
-            if "current" not in city_data:
-                city_data["current"] = await weather_service.get_weather_by_city(city)
-            if "forecast" not in city_data:
-                city_data["forecast"] = await weather_service.get_forecast(city)
+        for endpoint in ("current", "forecast"):
+            key = (canonical_city_key(city), endpoint)
+            if key not in fetched:
+                continue
+            result = fetched[key]
+            if isinstance(result, Exception):
+                if logger:
+                    logger.warning("Failed to fetch %s weather for %s: %s", endpoint, city, result)
+                city_data.setdefault("errors", {})[endpoint] = str(result)
+            else:
+                city_data[endpoint] = result
+        if "forecast" in city_data and "specific_time" in query_details and (
+            query_details["time_context"] == "future" or query_details.get("is_follow_up", False)
+        ):
+            city_data["specific_time_request"] = query_details["specific_time"]
         weather_data[city] = city_data
     return weather_data
 
-async def generate_weather_explanation(llm, db, llm_prompts, query, query_details, weather_data, session_id, logger):
-    logger.debug(f"Generating weather explanation for query: {query}, session_id: {session_id}")
-    history_from_db = await db.get_chat_history(session_id=session_id, limit=5)
-    chat_context_str = ""
-    if history_from_db:
-        chat_context_str = "Previous conversation:\n"
-        for record in history_from_db:
-            chat_context_str += f"User: {record['user_message']}\n"
-            chat_context_str += f"AI: {record['ai_response']}\n"
+def format_weather_for_prompt(weather_data, query_details, logger=None) -> str:
+    """
+    Serialises weather data for the explanation prompt. With prompt compaction on,
+    raw OpenWeatherMap payloads are reduced to a query-driven summary first.
+    """
+    if not settings.PROMPT_COMPACTION_ENABLED:
+        return orjson.dumps(weather_data_payload(weather_data), option=orjson.OPT_INDENT_2).decode()
+    compact_json = orjson.dumps(summarize_weather_data(weather_data, query_details)).decode()
+    if logger and logger.isEnabledFor(logging.DEBUG):
+        raw_tokens = estimate_tokens(orjson.dumps(weather_data_payload(weather_data), option=orjson.OPT_INDENT_2).decode())
+        logger.debug("Weather prompt payload: ~%s tokens raw -> ~%s tokens compacted", raw_tokens, estimate_tokens(compact_json))
+    return compact_json
+
+async def build_explanation_messages(db, llm_prompts, query, query_details, weather_data, session_id, history=None, logger=None, history_summary=""):
+    """
+    Builds the LLM input shared by the blocking and streaming paths: one message
+    with the explanation prompt, the conversation included once and within the token budget
+    """
+    if history is None:
+        history = await db.get_chat_history(session_id=session_id, limit=settings.SESSION_STORE_MAX_TURNS)
     is_follow_up = query_details.get("is_follow_up", False)
     follow_up_context_str = ""
     if is_follow_up:
@@ -148,24 +309,47 @@ async def generate_weather_explanation(llm, db, llm_prompts, query, query_detail
             The user is specifically asking about the weather for {specific_time}.
             Focus your response on the forecast for {specific_time}.
             """
-    prompt_text = llm_prompts.GENERATE_WEATHER_EXPLANATION_PROMPT_TEMPLATE.format(
+    prompt = build_explanation_prompt(
+        llm_prompts.GENERATE_WEATHER_EXPLANATION_PROMPT_TEMPLATE,
         query=query,
-        chat_context=chat_context_str,
         query_details_json=json.dumps(query_details, indent=2),
-        weather_data_json=json.dumps(weather_data, indent=2),
-        follow_up_context=follow_up_context_str
+        weather_json=format_weather_for_prompt(weather_data, query_details, logger),
+        follow_up_context=follow_up_context_str,
+        history=history,
+        history_summary=history_summary
     )
-    chat_history_messages = []
-    for record in history_from_db:
-        from langchain_core.messages import HumanMessage, AIMessage
-        chat_history_messages.append(HumanMessage(content=record["user_message"]))
-        chat_history_messages.append(AIMessage(content=record["ai_response"]))
-    from langchain_core.messages import HumanMessage
-    current_prompt_message = HumanMessage(content=prompt_text)
-    llm_input_messages = chat_history_messages + [current_prompt_message]
-    response = await llm.ainvoke(llm_input_messages)
-    logger.debug(f"Generated explanation: {response.content.strip()}")
-    return response.content.strip()
+    if logger:
+        tokens = prompt.tokens
+        logger.info(
+            "Explanation prompt size: ~%s tokens (instructions %s, weather %s, history %s)",
+            tokens["total"], tokens["instructions"], tokens["weather"], tokens["history"]
+        )
+    return [HumanMessage(content=prompt.text)]
+
+async def generate_weather_explanation(llm, db, llm_prompts, query, query_details, weather_data, session_id, logger, history=None, history_summary=""):
+    logger.debug("Generating weather explanation for query: %s, session_id: %s", query, session_id)
+    llm_input_messages = await build_explanation_messages(db, llm_prompts, query, query_details, weather_data, session_id, history, logger, history_summary)
+    response = await llm_invoker.call(lambda: llm.ainvoke(llm_input_messages), deadline=settings.LLM_EXPLANATION_DEADLINE, operation="explanation")
+    record_llm_usage("explanation", getattr(response, "usage_metadata", None))
+    explanation = response.content.strip()
+    logger.debug("Generated explanation: %s", explanation)
+    return explanation
+
+async def stream_weather_explanation(llm, db, llm_prompts, query, query_details, weather_data, session_id, logger, history=None, history_summary="") -> AsyncIterator[str]:
+    """Same as generate_weather_explanation, but yields the explanation text chunk by chunk as the LLM produces it"""
+    logger.debug("Streaming weather explanation for query: %s, session_id: %s", query, session_id)
+    llm_input_messages = await build_explanation_messages(db, llm_prompts, query, query_details, weather_data, session_id, history, logger, history_summary)
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    try:
+        async for chunk in llm_invoker.stream(lambda: llm.astream(llm_input_messages), deadline=settings.LLM_EXPLANATION_DEADLINE, operation="explanation_stream"):
+            # Chunks carry usage deltas, like AIMessageChunk addition assumes
+            for key, count in (getattr(chunk, "usage_metadata", None) or {}).items():
+                if key in usage:
+                    usage[key] += count or 0
+            if chunk.content:
+                yield chunk.content
+    finally:
+        record_llm_usage("explanation", usage)
 
 def manage_city_context(query_details, last_known_cities, logger):
     """
@@ -174,10 +358,10 @@ def manage_city_context(query_details, last_known_cities, logger):
     """
     if query_details.get("cities"):
         last_known_cities = query_details["cities"]
-        logger.debug(f"Updated last_known_cities: {last_known_cities}")
+        logger.debug("Updated last_known_cities: %s", last_known_cities)
         return True, last_known_cities
     elif last_known_cities:
         query_details["cities"] = last_known_cities
-        logger.info(f"Used city from instance memory (last_known_cities): {last_known_cities}")
+        logger.info("Used city from instance memory (last_known_cities): %s", last_known_cities)
         return True, last_known_cities
     return False, last_known_cities
\ No newline at end of file
@@ -1,5 +1,7 @@
 from typing import Dict, Any, Optional
 import logging
+from app.services.forecast_columns import ColumnarForecast, as_columnar
+from app.services.weather_summary import summarize_current, summarize_weather_data
 
 def handle_empty_query(query: str, logger: logging.Logger) -> Optional[Dict[str, Any]]:
     """Checks for an empty query and returns a standard response if it is."""
@@ -23,22 +25,79 @@ def build_no_city_response(query: str, logger: logging.Logger) -> Dict[str, Any]
         "ai_explanation": "I couldn't determine which city you're asking about. Please specify a city name in your query."
     }
 
+def describe_query_details(query_details: Dict[str, Any]) -> str:
+    """Human-readable summary of the analysed query, used as processed_query."""
+    cities_str = ', '.join(query_details.get('cities', []))
+    query_types_str = ', '.join(query_details.get('query_types', []))
+    time_context_str = query_details.get('time_context', 'N/A')
+    return (f"Analyzed query for cities: {cities_str}; "
+            f"Types: {query_types_str}; "
+            f"Time: {time_context_str}")
+
+def build_degraded_explanation(query_details: Dict[str, Any], weather_data: Dict[str, Any]) -> str:
+    """Plain template explanation used when the explanation LLM is unavailable."""
+    lines = []
+    for city, city_data in weather_data.items():
+        current = city_data.get("current")
+        forecast = as_columnar(city_data["forecast"]) if city_data.get("forecast") else None
+        if current:
+            summary = summarize_current(current, query_details.get("specific_conditions") or [])
+        elif forecast:
+            summary = summarize_current(forecast.entry(0), query_details.get("specific_conditions") or [])
+        else:
+            lines.append(f"- {city}: weather data is currently unavailable.")
+            continue
+        parts = [str(summary.get("description") or "conditions unknown")]
+        if summary.get("temp") is not None:
+            parts.append(f"{summary['temp']}°C")
+        if summary.get("feels_like") is not None:
+            parts.append(f"feels like {summary['feels_like']}°C")
+        if summary.get("humidity") is not None:
+            parts.append(f"humidity {summary['humidity']}%")
+        if summary.get("wind_speed") is not None:
+            parts.append(f"wind {summary['wind_speed']} m/s")
+        label = "now" if current else "next forecast"
+        lines.append(f"- {city} ({label}): " + ", ".join(parts))
+    return ("Detailed explanations are temporarily unavailable, but here is the latest weather data:\n"
+            + "\n".join(lines))
+
+def weather_data_payload(weather_data: Dict[str, Any]) -> Dict[str, Any]:
+    """weather_data with cached ColumnarForecasts turned back into /forecast-shaped dicts, for responses and raw prompts"""
+    return {
+        city: {
+            key: value.to_payload() if isinstance(value, ColumnarForecast) else value
+            for key, value in city_data.items()
+        }
+        for city, city_data in weather_data.items()
+    }
+
+def weather_fields(query_details: Dict[str, Any], weather_data: Dict[str, Any], weather_detail: str = "full") -> Dict[str, Any]:
+    """
+    The weather part of a response: raw payloads ("full"), the per-city summary
+    the explanation prompt uses plus any location comparison ("summary"), or nothing ("none").
+    """
+    if weather_detail == "none":
+        return {}
+    if weather_detail == "summary":
+        summary = summarize_weather_data(weather_data, query_details)
+        comparison = summary.pop("comparison", None)
+        fields = {"weather_summary": summary}
+        if comparison:
+            fields["comparison"] = comparison
+        return fields
+    return {"weather_data": weather_data_payload(weather_data)}
+
 def build_final_response(
     query: str,
     query_details: Dict[str, Any],
     weather_data: Dict[str, Any],
-    explanation: str
+    explanation: str,
+    weather_detail: str = "full"
 ) -> Dict[str, Any]:
     """Constructs the final successful response dictionary."""
-    cities_str = ', '.join(query_details.get('cities', []))
-    query_types_str = ', '.join(query_details.get('query_types', []))
-    time_context_str = query_details.get('time_context', 'N/A')
-
     return {
         "query": query,
-        "processed_query": f"Analyzed query for cities: {cities_str}; "
-                           f"Types: {query_types_str}; "
-                           f"Time: {time_context_str}",
-        "weather_data": weather_data,
+        "processed_query": describe_query_details(query_details),
+        **weather_fields(query_details, weather_data, weather_detail),
         "ai_explanation": explanation
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,224 @@
+import logging
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+import orjson
+from app.core.config import settings
+from app.db.supabase_client import SupabaseDB
+from app.services.cache_backend import CacheBackend
+from app.services.context_builder import fold_into_summary
+
+logger = logging.getLogger(__name__)
+
+class SessionState:
+    """Recent turns, a rolling summary of older ones and last-resolved cities of one conversation"""
+    __slots__ = ("turns", "summary", "last_cities", "last_access")
+
+    def __init__(self, turns: List[Dict[str, Any]], max_turns: int):
+        self.turns: Deque[Dict[str, Any]] = deque(turns, maxlen=max_turns)
+        self.summary = ""
+        self.last_cities: List[str] = []
+        self.last_access = time.monotonic()
+
+class SessionStateStore:
+    """
+    Bounded per-session conversation state keyed by X-Session-ID.
+
+    Sessions are evicted least-recently-used beyond `max_sessions` and after
+    `idle_ttl` seconds without access. New turns are kept in memory immediately
+    and handed to the database's batched chat writer, so responses never wait on
+    the INSERT; a crash loses at most one writer flush interval of turns. A turn
+    pushed out of the last `max_turns` is folded into the session's rolling
+    summary once, instead of being re-read and re-summarised on every request.
+
+    With a shared `backend`, every change to a session is written through for
+    the other workers and invalidates their resident copy, so a follow-up
+    landing on another worker sees the same turns and last cities without
+    waiting for the chat writer's flush.
+    """
+
+    def __init__(
+        self,
+        db: SupabaseDB,
+        max_sessions: int = settings.SESSION_STORE_MAX_SESSIONS,
+        idle_ttl: float = settings.SESSION_STORE_IDLE_TTL,
+        max_turns: int = settings.SESSION_STORE_MAX_TURNS,
+        backend: Optional[CacheBackend] = None
+    ):
+        self.db = db
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.write_errors = 0
+        self.backend = backend
+        self.shared_hits = 0
+        self.shared_errors = 0
+        self.invalidated = 0
+        if backend is not None:
+            backend.subscribe("sessions", self._invalidate)
+            backend.on_reset(self._sessions.clear)
+
+    def _invalidate(self, session_id: str) -> None:
+        """Another worker changed the session: drop the resident copy so the next access reloads it"""
+        if self._sessions.pop(session_id, None) is not None:
+            self.invalidated += 1
+
+    async def _load_shared(self, session_id: str) -> Optional[SessionState]:
+        if self.backend is None:
+            return None
+        try:
+            found = await self.backend.get("sessions", session_id)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning("Reading shared session %s failed: %s", session_id, e)
+            return None
+        if found is None:
+            return None
+        data = orjson.loads(found[0])
+        turns = [
+            {**turn, "created_at": datetime.fromisoformat(turn["created_at"])} if isinstance(turn.get("created_at"), str) else turn
+            for turn in data["turns"]
+        ]
+        state = SessionState(turns, self.max_turns)
+        state.summary = data.get("summary", "")
+        state.last_cities = data["last_cities"]
+        return state
+
+    async def _save_shared(self, session_id: str, state: Optional[SessionState]) -> None:
+        """Writes the session for the other workers, or removes it everywhere when `state` is None (clear() only)"""
+        if self.backend is None:
+            return
+        try:
+            if state is None:
+                await self.backend.delete("sessions", session_id)
+            else:
+                data = orjson.dumps({"turns": list(state.turns), "summary": state.summary, "last_cities": state.last_cities})
+                await self.backend.set("sessions", session_id, data, self.idle_ttl)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning("Writing shared session %s failed: %s", session_id, e)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - state.last_access < self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def _touch(self, session_id: str) -> Optional[SessionState]:
+        state = self._sessions.get(session_id)
+        if state is not None:
+            if time.monotonic() - state.last_access >= self.idle_ttl:
+                del self._sessions[session_id]
+                self.evictions += 1
+                return None
+            state.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return state
+
+    async def get_history(self, session_id: Optional[str], limit: int = 5) -> List[Dict[str, Any]]:
+        """Most recent `limit` turns, oldest first, from memory when the session is resident"""
+        if not session_id:
+            return await self.db.get_chat_history(session_id=session_id, limit=limit)
+        state = self._touch(session_id)
+        if state is not None:
+            self.hits += 1
+            return list(state.turns)[-limit:]
+        self.misses += 1
+        loaded = await self._load_shared(session_id)
+        if loaded is not None:
+            self.shared_hits += 1
+        else:
+            # Turns recorded while the session was evicted may still be queued for writing; while
+            # the database is failing they wait out retry backoffs, so do not hold the query for them
+            if self.db.has_pending_chat_messages(session_id):
+                if not await self.db.flush_chat_messages(timeout=settings.CHAT_HISTORY_FLUSH_TIMEOUT):
+                    # Answer from what the table has, but do not keep that incomplete copy as the session
+                    logger.warning("Chat history of %s read before its queued turns were written", session_id)
+                    history = await self.db.get_chat_history(session_id=session_id, limit=self.max_turns)
+                    return history[-limit:]
+            history = await self.db.get_chat_history(session_id=session_id, limit=self.max_turns)
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = loaded or SessionState(history, self.max_turns)
+            self._evict()
+            if loaded is None:
+                await self._save_shared(session_id, state)
+        return list(state.turns)[-limit:]
+
+    async def record_turn(self, session_id: Optional[str], user_message: str, ai_response: str) -> None:
+        """Adds a turn to the session and queues it for the batched chat writer"""
+        created_at = datetime.now(timezone.utc)
+        if session_id:
+            state = self._touch(session_id)
+            if state is None:
+                # Not resident here: extend another worker's copy rather than replace it.
+                # Without one there is nothing to update; the chat writer has the turn.
+                loaded = await self._load_shared(session_id)
+                if loaded is not None:
+                    state = self._sessions.setdefault(session_id, loaded)
+                    self._evict()
+            if state is not None:
+                if len(state.turns) == state.turns.maxlen:
+                    state.summary = fold_into_summary(state.summary, state.turns[0])
+                state.turns.append({"user_message": user_message, "ai_response": ai_response, "created_at": created_at})
+                await self._save_shared(session_id, state)
+        try:
+            await self.db.enqueue_chat_message(session_id, user_message, ai_response, created_at)
+        except Exception as e:
+            self.write_errors += 1
+            logger.error("Failed to queue chat turn for saving: %s", e)
+
+    def get_summary(self, session_id: Optional[str]) -> str:
+        """Rolling summary of the turns get_history() no longer returns"""
+        state = self._touch(session_id) if session_id else None
+        return state.summary if state else ""
+
+    def get_last_cities(self, session_id: Optional[str]) -> List[str]:
+        state = self._touch(session_id) if session_id else None
+        return list(state.last_cities) if state else []
+
+    async def set_last_cities(self, session_id: Optional[str], cities: List[str]) -> None:
+        state = self._touch(session_id) if session_id else None
+        if state is not None and state.last_cities != list(cities):
+            state.last_cities = list(cities)
+            await self._save_shared(session_id, state)
+
+    async def clear(self, session_id: str) -> None:
+        """
+        Forgets a session, e.g. when its history is cleared. Its queued turns are
+        written first so a following DELETE cannot be overtaken by them.
+        """
+        self._sessions.pop(session_id, None)
+        await self._save_shared(session_id, None)
+        if self.db.has_pending_chat_messages(session_id):
+            await self.db.flush_chat_messages()
+
+    def write_mark(self) -> int:
+        """Position of the last turn queued for writing, for flush(upto=...)"""
+        return self.db.chat_messages_enqueued()
+
+    async def flush(self, upto: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until every turn recorded so far, or up to the `upto` write mark, has been
+        written, for at most `timeout` seconds. Returns False when it gave up waiting.
+        """
+        return await self.db.flush_chat_messages(timeout=timeout, upto=upto)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "write_errors": self.write_errors,
+            **({"shared_hits": self.shared_hits, "shared_errors": self.shared_errors, "invalidated": self.invalidated} if self.backend is not None else {})
+        }
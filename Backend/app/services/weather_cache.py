@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import orjson
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+from app.core.config import settings
+from app.core.governor import is_dependency_failure
+from app.services.cache import DecayingCounter, SingleFlight, TTLCache
+from app.services.cache_backend import CacheBackend, TieredCache
+from app.services.forecast_columns import ColumnarForecast
+from app.services.geocoding import Place, get_geocoding_index
+from app.services.weather_service import GROUP_MAX_IDS, Location, WeatherService, counting_requests, gather_bounded
+
+logger = logging.getLogger(__name__)
+
+def normalize_city(city: str) -> str:
+    """Case-fold and collapse whitespace so spelling-equivalent city names share a cache key"""
+    return " ".join(city.split()).casefold()
+
+@lru_cache(maxsize=4096)
+def _resolve(city: str, approximate: bool) -> Optional[Place]:
+    return get_geocoding_index().lookup(city, approximate=approximate)
+
+def resolve_city(city: str) -> Optional[Place]:
+    """Gazetteer place for a city name (memoised; names that do not resolve are fetched by name)"""
+    if not settings.GEOCODING_ENABLED:
+        return None
+    return _resolve(city, settings.GEOCODING_APPROXIMATE)
+
+@lru_cache(maxsize=4096)
+def _canonical_key(city: str, geocoding: bool, approximate: bool) -> Hashable:
+    place = _resolve(city, approximate) if geocoding else None
+    return ("place", place.id) if place else ("q", normalize_city(city))
+
+def canonical_city_key(city: str) -> Hashable:
+    """
+    Location part of a cache key: the gazetteer place id when the name resolves
+    ("NYC", "new york city" -> same place), else the normalised name.
+    Memoised, as every request computes it several times per city.
+    """
+    return _canonical_key(city, settings.GEOCODING_ENABLED, settings.GEOCODING_APPROXIMATE)
+
+def encode_entry(value: Any) -> bytes:
+    if isinstance(value, ColumnarForecast):
+        return orjson.dumps({"forecast": value.to_payload()})
+    return orjson.dumps({"weather": value})
+
+def decode_entry(data: bytes) -> Any:
+    entry = orjson.loads(data)
+    return ColumnarForecast.from_payload(entry["forecast"]) if "forecast" in entry else entry["weather"]
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    """Done-callback for tasks nobody may await, so a failure is not logged as never retrieved"""
+    if not task.cancelled():
+        task.exception()
+
+class CachedWeatherService:
+    """
+    Caching front for WeatherService.
+
+    Responses are cached per (endpoint, location, units) with separate TTLs for
+    current conditions and forecasts, and concurrent misses for the same key
+    share a single upstream request. Cached payloads are shared between callers
+    and must be treated as read-only. Forecasts are parsed into a
+    ColumnarForecast once per fetch and cached in that compact form.
+
+    Lookups are counted per key with a decaying counter, so hot_keys() and
+    refresh() let a pre-warmer re-fetch popular entries before they expire.
+
+    OpenWeatherMap's city id is remembered from each response, so current
+    weather for several such cities can later be fetched in one /group request
+    (get_weather_many(), refresh_many()).
+
+    With a shared `backend`, a miss checks the other workers' fetches before
+    going upstream, and every fetch is written through for them.
+    """
+
+    def __init__(
+        self,
+        weather_service: WeatherService,
+        max_size: int = settings.WEATHER_CACHE_MAX_SIZE,
+        current_ttl: float = settings.WEATHER_CACHE_CURRENT_TTL,
+        forecast_ttl: float = settings.WEATHER_CACHE_FORECAST_TTL,
+        stale_ttl: float = settings.WEATHER_CACHE_STALE_TTL,
+        popularity_half_life: float = settings.PREWARM_HALF_LIFE,
+        max_tracked_keys: int = settings.PREWARM_MAX_TRACKED,
+        fetch_concurrency: int = settings.WEATHER_FETCH_CONCURRENCY,
+        backend: Optional[CacheBackend] = None
+    ):
+        self.weather_service = weather_service
+        self.current_ttl = current_ttl
+        self.forecast_ttl = forecast_ttl
+        self.cache = TTLCache(max_size=max_size, ttl=current_ttl, stale_ttl=stale_ttl)
+        # Entries fetched from the backend keep their remaining TTL in the near tier
+        self.shared = TieredCache("weather", self.cache, backend, encode=encode_entry, decode=decode_entry, near_ttl=None)
+        self.single_flight = SingleFlight()
+        self.popularity = DecayingCounter(popularity_half_life, max_tracked_keys)
+        self.fetch_concurrency = fetch_concurrency
+        # Location part of a cache key -> Location carrying its OpenWeatherMap city id
+        self._owm_locations = TTLCache(max_size=max_size, ttl=float("inf"))
+        # How to re-fetch each tracked key: (ttl, fetch)
+        self._refreshers: Dict[Hashable, Tuple[float, Callable[[], Awaitable[Dict[str, Any]]]]] = {}
+        self.upstream_calls = 0
+        self.stale_served = 0
+        self.refreshes = 0
+        self.group_fetches = 0
+        self.group_keys = 0
+
+    async def aclose(self) -> None:
+        await self.weather_service.aclose()
+
+    def _track(self, key: Hashable, ttl: float, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        self.popularity.record(key)
+        self._refreshers[key] = (ttl, fetch)
+        if len(self._refreshers) > len(self.popularity):
+            # The counter dropped its least popular keys; forget how to refresh them too
+            self._refreshers = {k: v for k, v in self._refreshers.items() if k in self.popularity}
+
+    def _fetch_and_store(
+        self,
+        key: Hashable,
+        ttl: float,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+        min_shared_ttl: float = 0.0
+    ) -> Awaitable[Dict[str, Any]]:
+        """Fetches key once however many callers ask; a shared entry with more than `min_shared_ttl` seconds left is used instead"""
+        async def fetch_and_store() -> Dict[str, Any]:
+            shared = await self.shared.get_far(key)
+            if shared is not None and shared[1] > min_shared_ttl:
+                result, remaining = shared
+                self.cache.set(key, result, ttl=remaining)
+                return result
+            self.upstream_calls += 1
+            result = await fetch()
+            await self.shared.set(key, result, ttl)
+            return result
+
+        return self.single_flight.do(key, fetch_and_store)
+
+    async def _cached(self, key: Hashable, ttl: float, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        self._track(key, ttl, fetch)
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+
+        try:
+            return await self._fetch_and_store(key, ttl, fetch)
+        except Exception as e:
+            stale = self.cache.get_stale(key) if is_dependency_failure(e) else None
+            if stale is None:
+                raise
+            self.stale_served += 1
+            logger.warning("Serving stale weather for %s: %s", key, e)
+            return stale
+
+    async def get_weather_by_city(self, city: str, units: str = "metric") -> Dict[str, Any]:
+        """
+        Get (possibly cached) weather data for a specific city.
+        Cities found in the gazetteer are fetched by their canonical coordinates.
+        """
+        loc_key, location = self._locate(city)
+        return await self._cached(("weather", loc_key, units), self.current_ttl, lambda: self._fetch_weather(loc_key, location, units))
+
+    async def get_weather_by_coordinates(self, lat: float, lon: float, units: str = "metric") -> Dict[str, Any]:
+        """Get (possibly cached) weather data for specific coordinates"""
+        key = ("weather", ("coord", round(lat, 2), round(lon, 2)), units)
+        return await self._cached(key, self.current_ttl, lambda: self.weather_service.get_weather_by_coordinates(lat, lon, units))
+
+    async def get_forecast(self, city: str, units: str = "metric") -> ColumnarForecast:
+        """
+        Get (possibly cached) 5-day forecast for a specific city.
+        Cities found in the gazetteer are fetched by their canonical coordinates.
+        """
+        loc_key, location = self._locate(city)
+        return await self._cached(("forecast", loc_key, units), self.forecast_ttl, lambda: self._fetch_forecast(loc_key, location, units))
+
+    def _locate(self, city: str) -> Tuple[Hashable, Location]:
+        """Location part of the cache key and where to fetch it (gazetteer coordinates when the name resolves)"""
+        place = resolve_city(city)
+        loc_key = ("place", place.id) if place else ("q", normalize_city(city))
+        known = self._owm_locations.get(loc_key)
+        if known is not None:
+            return loc_key, known
+        return loc_key, Location(lat=place.lat, lon=place.lon) if place else Location(name=city)
+
+    def _learn_owm_id(self, loc_key: Hashable, location: Location, owm_id: Any) -> None:
+        if owm_id and owm_id != location.owm_id:
+            self._owm_locations.set(loc_key, location._replace(owm_id=owm_id))
+
+    async def _fetch_weather(self, loc_key: Hashable, location: Location, units: str) -> Dict[str, Any]:
+        weather = await self.weather_service.get_weather(location, units)
+        self._learn_owm_id(loc_key, location, weather.get("id"))
+        return weather
+
+    async def _fetch_forecast(self, loc_key: Hashable, location: Location, units: str) -> ColumnarForecast:
+        forecast = ColumnarForecast.from_payload(await self.weather_service.get_forecast_for(location, units))
+        self._learn_owm_id(loc_key, location, forecast.city.get("id"))
+        return forecast
+
+    def _start_group_fetch(self, targets: Dict[Hashable, Location], units: str) -> List[asyncio.Task]:
+        """
+        Starts one bulk upstream fetch of current weather for `targets` (cache key ->
+        location) and registers each key as in flight on it, so lookups of those
+        keys made meanwhile wait for the shared fetch instead of starting their own.
+        """
+        self.group_fetches += 1
+        self.group_keys += len(targets)
+
+        async def fetch_bulk() -> List[Union[Dict[str, Any], Exception]]:
+            # /group requests plus any per-city fallbacks for ids they failed or left out
+            with counting_requests() as counter:
+                try:
+                    return await self.weather_service.get_weather_many(list(targets.values()), units, self.fetch_concurrency)
+                finally:
+                    self.upstream_calls += counter.requests
+
+        bulk = asyncio.ensure_future(fetch_bulk())
+
+        async def store(i: int, key: Hashable) -> Dict[str, Any]:
+            result = (await bulk)[i]
+            if isinstance(result, Exception):
+                raise result
+            await self.shared.set(key, result, self.current_ttl)
+            return result
+
+        return [self.single_flight.start(key, lambda i=i, key=key: store(i, key)) for i, key in enumerate(targets)]
+
+    async def _take_from_shared(self, keys: Sequence[Hashable], min_shared_ttl: Callable[[Hashable], float]) -> List[Hashable]:
+        """
+        Copies keys whose shared entry has more than min_shared_ttl(key) seconds left
+        into the near tier, as _fetch_and_store would; returns the keys still to fetch.
+        """
+        found = await asyncio.gather(*(self.shared.get_far(key) for key in keys))
+        missing = []
+        for key, shared in zip(keys, found):
+            if shared is not None and shared[1] > min_shared_ttl(key):
+                self.cache.set(key, shared[0], ttl=shared[1])
+            else:
+                missing.append(key)
+        return missing
+
+    async def get_weather_many(self, cities: Sequence[str], units: str = "metric") -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Get (possibly cached) weather data for many cities, in order; a city that
+        fails gets its exception in place. Misses for cities whose OpenWeatherMap
+        id is known are fetched together through /group, the rest one by one.
+        """
+        targets: Dict[Hashable, Location] = {}
+        for city in cities:
+            loc_key, location = self._locate(city)
+            key = ("weather", loc_key, units)
+            if location.owm_id and key not in self.cache and key not in self.single_flight:
+                targets[key] = location
+        if len(targets) > 1 and settings.OWM_GROUP_ENABLED:
+            missing = await self._take_from_shared(list(targets), lambda key: 0.0)
+            # Lookups started while the shared tier was read fetch on their own
+            targets = {key: targets[key] for key in missing if key not in self.single_flight}
+        if len(targets) > 1 and settings.OWM_GROUP_ENABLED:
+            # The per-city lookups below join these tasks; a task none of them joins still has its error retrieved
+            for task in self._start_group_fetch(targets, units):
+                task.add_done_callback(_retrieve_exception)
+        return await gather_bounded([lambda city=city: self.get_weather_by_city(city, units) for city in cities], self.fetch_concurrency)
+
+    async def get_forecast_many(self, cities: Sequence[str], units: str = "metric") -> List[Union[ColumnarForecast, Exception]]:
+        """
+        Get (possibly cached) 5-day forecasts for many cities, in order; a city
+        that fails gets its exception in place. /forecast has no bulk form, so
+        misses are fetched one by one, at most fetch_concurrency at a time.
+        """
+        return await gather_bounded([lambda city=city: self.get_forecast(city, units) for city in cities], self.fetch_concurrency)
+
+    def hot_keys(self, k: int) -> List[Tuple[Hashable, float]]:
+        """The `k` most requested cache keys lately, with their decayed request counts"""
+        return self.popularity.top(k)
+
+    def ttl_remaining(self, key: Hashable) -> float:
+        return self.cache.ttl_remaining(key)
+
+    async def refresh(self, key: Hashable) -> None:
+        """Re-fetches a tracked key and replaces its entry, e.g. shortly before it expires"""
+        refresher = self._refreshers.get(key)
+        if refresher is None:
+            return
+        self.refreshes += 1
+        # Another worker may have refreshed the entry already
+        await self._fetch_and_store(key, *refresher, min_shared_ttl=self.cache.ttl_remaining(key))
+
+    def refresh_batches(self, keys: Sequence[Hashable]) -> List[List[Hashable]]:
+        """
+        Splits keys, in order, into one list per upstream request: current weather
+        of cities with a known OpenWeatherMap id is grouped GROUP_MAX_IDS to a
+        /group request, anything else is a request of its own.
+        """
+        batches: List[List[Hashable]] = []
+        open_groups: Dict[str, List[Hashable]] = {}
+        for key in keys:
+            endpoint, loc_key, units = key
+            if endpoint != "weather" or not settings.OWM_GROUP_ENABLED or loc_key not in self._owm_locations:
+                batches.append([key])
+                continue
+            batch = open_groups.get(units)
+            if batch is None or len(batch) == GROUP_MAX_IDS:
+                batch = open_groups[units] = []
+                batches.append(batch)
+            batch.append(key)
+        return batches
+
+    async def refresh_many(self, keys: List[Hashable]) -> List[Optional[Exception]]:
+        """Refreshes one batch from refresh_batches(); returns each key's exception, or None when it was refreshed"""
+        if len(keys) == 1:
+            try:
+                await self.refresh(keys[0])
+            except Exception as e:
+                return [e]
+            return [None]
+        # Another worker may have refreshed some of the entries already
+        missing = await self._take_from_shared(keys, self.cache.ttl_remaining)
+        # Keys a lookup started fetching meanwhile are refreshed by that fetch
+        missing = [key for key in missing if key not in self.single_flight]
+        # The bounded id LRU may have dropped a location while the shared tier was read; those are refreshed on their own
+        targets: Dict[Hashable, Location] = {}
+        alone: List[Hashable] = []
+        for key in missing:
+            location = self._owm_locations.get_stale(key[1])
+            if location is None:
+                alone.append(key)
+            else:
+                targets[key] = location
+        self.refreshes += len(keys) - len(alone)
+        if not missing:
+            return [None] * len(keys)
+        group = self._start_group_fetch(targets, keys[0][2]) if targets else []
+        outcomes = await asyncio.gather(*group, *(self.refresh(key) for key in alone), return_exceptions=True)
+        errors = {key: outcome for key, outcome in zip([*targets, *alone], outcomes) if isinstance(outcome, Exception)}
+        return [errors.get(key) for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "coalesced": self.single_flight.coalesced,
+            "in_flight": len(self.single_flight),
+            "upstream_calls": self.upstream_calls,
+            "stale_served": self.stale_served,
+            "refreshes": self.refreshes,
+            "group_fetches": self.group_fetches,
+            "group_keys": self.group_keys,
+            "tracked_keys": len(self.popularity),
+            **self.shared.stats()
+        }
@@ -1,53 +1,223 @@
+import asyncio
+import logging
 import httpx
-from typing import Dict, Any
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Awaitable, Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
 from app.core.config import settings
+from app.core.governor import owm_governor
+
+logger = logging.getLogger(__name__)
+
+# Most city ids OpenWeatherMap accepts in one /group request
+GROUP_MAX_IDS = 20
+
+_retries_enabled: ContextVar[bool] = ContextVar("owm_retries_enabled", default=True)
+
+@contextmanager
+def without_retries() -> Iterator[None]:
+    """Makes OpenWeatherMap requests started in this context (and tasks it spawns) single attempts"""
+    token = _retries_enabled.set(False)
+    try:
+        yield
+    finally:
+        _retries_enabled.reset(token)
+
+class RequestCounter:
+    """OpenWeatherMap requests started within a counting_requests() context; retries of one request count once"""
+    __slots__ = ("requests",)
+
+    def __init__(self):
+        self.requests = 0
+
+_request_counters: ContextVar[Tuple[RequestCounter, ...]] = ContextVar("owm_request_counters", default=())
+
+@contextmanager
+def counting_requests() -> Iterator[RequestCounter]:
+    """Counts the OpenWeatherMap requests started in this context (and tasks it spawns); contexts may nest"""
+    counter = RequestCounter()
+    token = _request_counters.set(_request_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _request_counters.reset(token)
+
+class Location(NamedTuple):
+    """
+    Where to fetch weather for: coordinates when known, else a city name.
+    `owm_id` is OpenWeatherMap's own city id, as reported in an earlier response;
+    locations that have one can be fetched together through /group.
+    """
+    name: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    owm_id: Optional[int] = None
+
+async def gather_bounded(calls: Sequence[Callable[[], Awaitable[Any]]], limit: int) -> List[Any]:
+    """Runs the calls at most `limit` at a time; results (or exceptions) come back in order"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(call: Callable[[], Awaitable[Any]]) -> Any:
+        async with semaphore:
+            return await call()
+
+    return await asyncio.gather(*(run(call) for call in calls), return_exceptions=True)
 
 class WeatherService:
     """Service for interacting with OpenWeatherMap API"""
-    
-    def __init__(self):
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.api_key = settings.OPENWEATHERMAP_API_KEY
         self.base_url = settings.OPENWEATHERMAP_BASE_URL
-    
+        # One pooled client per process: connections (and their TLS sessions)
+        # are kept alive and reused across requests instead of re-handshaking.
+        self.client = client or httpx.AsyncClient(
+            http2=settings.HTTP2_ENABLED,
+            timeout=httpx.Timeout(settings.OWM_REQUEST_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client and its open connections"""
+        await self.client.aclose()
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        async def request() -> Dict[str, Any]:
+            response = await self.client.get(f"{self.base_url}/{path}", params=params)
+            response.raise_for_status()
+            return response.json()
+
+        for counter in _request_counters.get():
+            counter.requests += 1
+        # GETs are idempotent, so transient failures are retried within the fetch deadline (unless the caller opted out)
+        return await owm_governor.call(request, deadline=settings.WEATHER_FETCH_DEADLINE, retry=_retries_enabled.get(), operation=path)
+
     async def get_weather_by_city(self, city: str, units: str = "metric") -> Dict[str, Any]:
         """Get weather data for a specific city"""
-        url = f"{self.base_url}/weather"
         params = {
             "q": city,
             "appid": self.api_key,
             "units": units
         }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-    
+        return await self._get("weather", params)
+
     async def get_weather_by_coordinates(self, lat: float, lon: float, units: str = "metric") -> Dict[str, Any]:
         """Get weather data for specific coordinates"""
-        url = f"{self.base_url}/weather"
         params = {
             "lat": lat,
             "lon": lon,
             "appid": self.api_key,
             "units": units
         }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-    
+        return await self._get("weather", params)
+
     async def get_forecast(self, city: str, units: str = "metric") -> Dict[str, Any]:
         """Get 5-day forecast for a specific city"""
-        url = f"{self.base_url}/forecast"
         params = {
             "q": city,
             "appid": self.api_key,
             "units": units
         }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
\ No newline at end of file
+        return await self._get("forecast", params)
+
+    async def get_forecast_by_coordinates(self, lat: float, lon: float, units: str = "metric") -> Dict[str, Any]:
+        """Get 5-day forecast for specific coordinates"""
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": self.api_key,
+            "units": units
+        }
+        return await self._get("forecast", params)
+
+    async def get_weather(self, location: Location, units: str = "metric") -> Dict[str, Any]:
+        """Get weather data for a location, by coordinates when it has them"""
+        if location.lat is not None and location.lon is not None:
+            return await self.get_weather_by_coordinates(location.lat, location.lon, units)
+        return await self.get_weather_by_city(location.name, units)
+
+    async def get_forecast_for(self, location: Location, units: str = "metric") -> Dict[str, Any]:
+        """Get 5-day forecast for a location, by coordinates when it has them"""
+        if location.lat is not None and location.lon is not None:
+            return await self.get_forecast_by_coordinates(location.lat, location.lon, units)
+        return await self.get_forecast(location.name, units)
+
+    async def get_weather_group(self, owm_ids: Sequence[int], units: str = "metric") -> Dict[int, Dict[str, Any]]:
+        """
+        Current weather for up to GROUP_MAX_IDS cities in one request, by
+        OpenWeatherMap city id. Ids the response leaves out are missing from the result.
+        """
+        params = {
+            "id": ",".join(str(owm_id) for owm_id in owm_ids),
+            "appid": self.api_key,
+            "units": units
+        }
+        payload = await self._get("group", params)
+        weather = {}
+        for entry in payload.get("list", []):
+            # /group entries carry the UTC offset under "sys"; /weather has it at the top level
+            entry.setdefault("timezone", entry.get("sys", {}).get("timezone", 0))
+            weather[entry.get("id")] = entry
+        return weather
+
+    async def get_weather_many(
+        self,
+        locations: Sequence[Location],
+        units: str = "metric",
+        max_concurrency: int = settings.WEATHER_FETCH_CONCURRENCY
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Current weather for many locations, in order; a failed location gets its
+        exception in place. Locations with an OpenWeatherMap id share /group
+        requests; the rest, and any a /group request fails for (unless retries
+        are off, see without_retries()), are fetched one by one, at most
+        `max_concurrency` at a time.
+        """
+        results: List[Any] = [None] * len(locations)
+        by_id: Dict[int, List[int]] = {}
+        if settings.OWM_GROUP_ENABLED:
+            for i, location in enumerate(locations):
+                if location.owm_id:
+                    by_id.setdefault(location.owm_id, []).append(i)
+
+        async def fetch_group(owm_ids: List[int]) -> None:
+            try:
+                weather = await self.get_weather_group(owm_ids, units)
+            except Exception as e:
+                if not _retries_enabled.get():
+                    # Fetching them one by one would be a retry, and N calls instead of one
+                    for owm_id in owm_ids:
+                        for i in by_id[owm_id]:
+                            results[i] = e
+                    return
+                logger.warning("Group weather request for %s cities failed, fetching them one by one: %s", len(owm_ids), e)
+                return
+            for owm_id, entry in weather.items():
+                for i in by_id.get(owm_id, []):
+                    results[i] = entry
+
+        owm_ids = list(by_id)
+        await asyncio.gather(*(fetch_group(owm_ids[i:i + GROUP_MAX_IDS]) for i in range(0, len(owm_ids), GROUP_MAX_IDS)))
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        singles = await gather_bounded([lambda i=i: self.get_weather(locations[i], units) for i in pending], max_concurrency)
+        for i, result in zip(pending, singles):
+            results[i] = result
+        return results
+
+    async def get_forecast_many(
+        self,
+        locations: Sequence[Location],
+        units: str = "metric",
+        max_concurrency: int = settings.WEATHER_FETCH_CONCURRENCY
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        5-day forecasts for many locations, in order; a failed location gets its
+        exception in place. /forecast has no bulk form, so these are single
+        requests, at most `max_concurrency` at a time.
+        """
+        return await gather_bounded([lambda location=location: self.get_forecast_for(location, units) for location in locations], max_concurrency)
@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Union
+from app.services.forecast_columns import ColumnarForecast, as_columnar, compare_forecasts
+
+# Rough characters-per-token ratio for English/JSON text; good enough for budgeting and reporting
+CHARS_PER_TOKEN = 4
+
+# specific_conditions keyword -> extra current-weather fields worth keeping
+CONDITION_FIELDS = {
+    "temperature": ("feels_like", "temp_min", "temp_max"),
+    "humidity": ("humidity", "dew_point"),
+    "wind": ("wind_speed", "wind_gust", "wind_deg"),
+    "rain": ("rain_1h", "clouds"),
+    "snow": ("snow_1h", "clouds"),
+    "clouds": ("clouds", "visibility"),
+    "sunny": ("clouds", "uv"),
+    "pressure": ("pressure",),
+    "visibility": ("visibility",),
+}
+DEFAULT_CURRENT_FIELDS = ("description", "temp", "feels_like", "humidity", "wind_speed", "clouds", "rain_1h", "snow_1h")
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _local_datetime(timestamp: int, offset_seconds: int) -> datetime:
+    return datetime.fromtimestamp(timestamp + offset_seconds, tz=timezone.utc)
+
+def _wanted_current_fields(specific_conditions: Iterable[str]) -> List[str]:
+    fields = list(DEFAULT_CURRENT_FIELDS)
+    for condition in specific_conditions:
+        for keyword, extra in CONDITION_FIELDS.items():
+            if keyword in str(condition).lower():
+                fields.extend(field for field in extra if field not in fields)
+    return fields
+
+def summarize_current(current: Dict[str, Any], specific_conditions: Iterable[str]) -> Dict[str, Any]:
+    """Flattens an OpenWeatherMap /weather payload down to the fields the question needs"""
+    main = current.get("main", {})
+    wind = current.get("wind", {})
+    flat = {
+        "description": (current.get("weather") or [{}])[0].get("description"),
+        "temp": main.get("temp"),
+        "feels_like": main.get("feels_like"),
+        "temp_min": main.get("temp_min"),
+        "temp_max": main.get("temp_max"),
+        "humidity": main.get("humidity"),
+        "pressure": main.get("pressure"),
+        "wind_speed": wind.get("speed"),
+        "wind_gust": wind.get("gust"),
+        "wind_deg": wind.get("deg"),
+        "clouds": current.get("clouds", {}).get("all"),
+        "visibility": current.get("visibility"),
+        "rain_1h": current.get("rain", {}).get("1h"),
+        "snow_1h": current.get("snow", {}).get("1h"),
+    }
+    summary = {field: flat[field] for field in _wanted_current_fields(specific_conditions) if flat.get(field) is not None}
+    if "dt" in current:
+        summary["local_time"] = _local_datetime(current["dt"], current.get("timezone", 0)).strftime("%Y-%m-%d %H:%M")
+    return summary
+
+def summarize_forecast(forecast: Union[ColumnarForecast, Dict[str, Any]], specific_time: Optional[str], now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Rolls the 3-hourly forecast up into per-day aggregates for the requested
+    window. Single-day windows (today, tonight, tomorrow) also keep the 3-hourly slots.
+    """
+    return as_columnar(forecast).summarize(specific_time, now)
+
+def summarize_weather_data(weather_data: Dict[str, Any], query_details: Dict[str, Any], now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Reduces raw OpenWeatherMap payloads to what the explanation prompt needs,
+    driven by specific_conditions, specific_time and comparison_type.
+    """
+    specific_conditions = query_details.get("specific_conditions") or []
+    specific_time = query_details.get("specific_time")
+    summary: Dict[str, Any] = {}
+    for city, city_data in weather_data.items():
+        city_summary: Dict[str, Any] = {}
+        if "current" in city_data:
+            city_summary["current"] = summarize_current(city_data["current"], specific_conditions)
+        if "forecast" in city_data:
+            # A time comparison needs the whole horizon, not just the asked-about window
+            window = None if query_details.get("comparison_type") == "time" else city_data.get("specific_time_request", specific_time)
+            city_summary["forecast"] = summarize_forecast(city_data["forecast"], window, now=now)
+        if "errors" in city_data:
+            city_summary["errors"] = city_data["errors"]
+        summary[city] = city_summary
+    if query_details.get("comparison_type") == "location":
+        forecasts = {city: as_columnar(city_data["forecast"]) for city, city_data in weather_data.items() if "forecast" in city_data}
+        comparison = compare_forecasts(forecasts, specific_time, now)
+        if comparison:
+            summary["comparison"] = comparison
+    return summary
@@ -0,0 +1,163 @@
+"""
+One chatty client against a handful of ordinary users, with admission control
+off and on.
+
+Starts a disposable Postgres (benchmarks.postgres), the OpenWeatherMap stub and
+the API with the fake LLM (benchmarks.serve) once per --modes value:
+
+- off: ADMISSION_ENABLED=False, every query runs as soon as it arrives
+- on: at most --max-in-flight pipelines, a fair queue across sessions and the
+  default per-session and per-client token buckets
+
+For --duration seconds the noisy client sends --noisy-concurrency queries at
+a time in one session from 127.0.0.2, resending as soon as an answer (or a
+rejection, whose Retry-After it ignores) comes back. Each of --quiet-users
+users has its own session and loopback address and sends a query every
+--think-ms. Reports the quiet users' latency and errors and the noisy
+client's answers by status code, plus the admission queue figures from /stats.
+
+    python -m benchmarks.admission --duration 20 --noisy-concurrency 48
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks import load
+from benchmarks.postgres import disposable_postgres, free_port
+
+def loopback_client(base_url: str, address: str, timeout: float) -> httpx.AsyncClient:
+    """A client whose connections come from `address`, so the server sees it as a client of its own"""
+    transport = httpx.AsyncHTTPTransport(local_address=address, limits=httpx.Limits(max_connections=200))
+    return httpx.AsyncClient(base_url=base_url, transport=transport, timeout=timeout)
+
+async def noisy_client(client: httpx.AsyncClient, queries: List[str], concurrency: int, stop_at: float, run_id: str) -> Counter:
+    statuses: Counter = Counter()
+    cycle = itertools.cycle(queries)
+    headers = {"X-Session-ID": f"noisy_{run_id}"}
+
+    async def loop() -> None:
+        while time.monotonic() < stop_at:
+            try:
+                response = await client.post("/api/weather/query", json={"query": next(cycle)}, headers=headers)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError:
+                statuses["transport_error"] += 1
+
+    await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return statuses
+
+async def quiet_user(client: httpx.AsyncClient, queries: List[str], user: int, think: float, stop_at: float, run_id: str, latencies: List[float], statuses: Counter) -> None:
+    headers = {"X-Session-ID": f"quiet_{run_id}_{user}"}
+    for query in itertools.cycle(queries[user:] + queries[:user]):
+        if time.monotonic() >= stop_at:
+            return
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/weather/query", json={"query": query}, headers=headers)
+            statuses[response.status_code] += 1
+        except httpx.HTTPError:
+            statuses["transport_error"] += 1
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(think)
+
+async def run_mode(mode: str, args: argparse.Namespace, base_url: str, queries: List[str], run_id: str) -> Dict[str, Any]:
+    stop_at = time.monotonic() + args.duration
+    quiet_latencies: List[float] = []
+    quiet_statuses: Counter = Counter()
+    clients = [loopback_client(base_url, "127.0.0.2", args.timeout)] + [
+        loopback_client(base_url, f"127.0.1.{user + 1}", args.timeout) for user in range(args.quiet_users)
+    ]
+    try:
+        noisy_statuses, *_ = await asyncio.gather(
+            noisy_client(clients[0], queries, args.noisy_concurrency, stop_at, f"{run_id}_{mode}"),
+            *(
+                quiet_user(clients[user + 1], queries, user, args.think_ms / 1000, stop_at, f"{run_id}_{mode}", quiet_latencies, quiet_statuses)
+                for user in range(args.quiet_users)
+            )
+        )
+        stats = (await clients[0].get("/api/weather/stats")).json()
+    finally:
+        for client in clients:
+            await client.aclose()
+    return {
+        "mode": mode,
+        "quiet_requests": len(quiet_latencies),
+        "quiet_errors": sum(count for status, count in quiet_statuses.items() if status != 200),
+        "quiet_latency_ms": load.percentiles(quiet_latencies),
+        "noisy_statuses": {str(status): count for status, count in sorted(noisy_statuses.items(), key=str)},
+        "admission": stats.get("admission")
+    }
+
+def print_summary(results: List[Dict[str, Any]]) -> None:
+    print(f"{'mode':<5} {'quiet req':>9} {'quiet err':>9} {'p50':>8} {'p95':>8} {'p99':>8}  noisy statuses")
+    for result in results:
+        latency = result["quiet_latency_ms"]
+        print(
+            f"{result['mode']:<5} {result['quiet_requests']:>9} {result['quiet_errors']:>9} "
+            f"{latency['p50']!s:>8} {latency['p95']!s:>8} {latency['p99']!s:>8}  {result['noisy_statuses']}"
+        )
+
+async def main(args: argparse.Namespace) -> None:
+    with open(load.QUERIES_PATH, encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)["queries"]]
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    stub_port = free_port()
+    stub_cmd = [sys.executable, "-m", "uvicorn", "benchmarks.stub_owm:app", "--port", str(stub_port), "--log-level", "warning"]
+    results = []
+    async with disposable_postgres(args.database_url) as dsn:
+        async with load.running(stub_cmd, {"STUB_OWM_LATENCY_MS": str(args.owm_latency_ms)}, f"http://127.0.0.1:{stub_port}/_stats"):
+            for mode in args.modes.split(","):
+                api_port = free_port()
+                env = {
+                    "DATABASE_URL": dsn,
+                    "OPENWEATHERMAP_BASE_URL": f"http://127.0.0.1:{stub_port}",
+                    "LOG_LEVEL": "WARNING",
+                    "ADMISSION_ENABLED": str(mode == "on"),
+                    "ADMISSION_MAX_IN_FLIGHT": str(args.max_in_flight)
+                }
+                serve_cmd = [
+                    sys.executable, "-m", "benchmarks.serve", "--port", str(api_port),
+                    "--llm-latency-ms", args.llm_latency_ms, "--seed", str(args.seed)
+                ]
+                async with load.running(serve_cmd, env, f"http://127.0.0.1:{api_port}/"):
+                    result = await run_mode(mode, args, f"http://127.0.0.1:{api_port}", queries, run_id)
+                print(f"{mode}: quiet p95 {result['quiet_latency_ms']['p95']} ms, noisy {result['noisy_statuses']}", file=sys.stderr)
+                results.append(result)
+
+    report = {
+        "run_id": run_id,
+        "commit": load.git_commit(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("output", "database_url")},
+        "results": results
+    }
+    output = Path(args.output) if args.output else load.RESULTS_DIR / f"admission_{run_id}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print_summary(results)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="off,on", help="comma-separated: off,on")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per mode")
+    parser.add_argument("--noisy-concurrency", type=int, default=48)
+    parser.add_argument("--quiet-users", type=int, default=8)
+    parser.add_argument("--think-ms", type=float, default=500, help="pause between a quiet user's queries")
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--llm-latency-ms", default="safeguard=150,extraction=150,fused_analysis=250,history_inference=100,explanation=600")
+    parser.add_argument("--owm-latency-ms", type=float, default=80)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), help="existing database to use a throwaway schema in")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/admission_<timestamp>.json)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,109 @@
+"""
+Offline check that the fused analysis call and the multi-call pipeline
+(safeguard + extraction + history inference) agree on the query_details shape.
+
+Replays fixtures/queries.json in order, as one conversation, through both
+paths of WeatherAIService with the replaying fake LLM (benchmarks.fake_llm) at
+zero latency. For every query it compares the on-topic verdict, the keys of
+query_details and the type of each value; differing values (cities,
+time_context, ...) are listed too but only shape differences fail the run.
+
+    python -m benchmarks.analysis_parity
+
+Exits with status 1 when a verdict or shape differs.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+# Settings are read at import time; the key only has to be non-empty for the client to build
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("OPENWEATHERMAP_API_KEY", "offline-benchmark")
+
+from app.core.timing import StageTimings
+from app.services import query_helper
+from app.services.ai_service import WeatherAIService
+from benchmarks import load
+from benchmarks.fake_llm import DEFAULT_LATENCY_MS, FakeLLM
+
+logger = logging.getLogger("analysis_parity")
+
+# Every query_details key downstream code relies on, and the types its value may have
+REQUIRED_FIELDS = {
+    "cities": (list,),
+    "query_types": (list,),
+    "time_context": (str,),
+    "specific_conditions": (list,),
+    "comparison_type": (str, type(None)),
+    "is_follow_up": (bool,)
+}
+# Present only when the query names a timeframe
+OPTIONAL_FIELDS = {"specific_time": (str,)}
+COMPARED_VALUES = ("cities", "time_context", "specific_time", "comparison_type", "is_follow_up")
+
+def shape_problems(query_details: Optional[Dict[str, Any]]) -> List[str]:
+    if query_details is None:
+        return ["no query_details"]
+    problems = [f"missing {key}" for key in REQUIRED_FIELDS if key not in query_details]
+    for key, value in query_details.items():
+        allowed = REQUIRED_FIELDS.get(key) or OPTIONAL_FIELDS.get(key)
+        if allowed is None:
+            problems.append(f"unexpected key {key}")
+        elif not isinstance(value, allowed):
+            problems.append(f"{key} is {type(value).__name__}")
+        elif isinstance(value, list) and not all(isinstance(item, str) for item in value):
+            problems.append(f"{key} holds non-strings")
+    return problems
+
+async def multi_call(service: WeatherAIService, query: str, history: List[Dict[str, Any]]) -> tuple:
+    is_weather_related, query_details = await service._analyze_multi_call(query, StageTimings())
+    if is_weather_related:
+        await service._infer_city_from_history_if_needed(query_details, query, None, history)
+    return is_weather_related, query_details
+
+async def fused(service: WeatherAIService, query: str, history: List[Dict[str, Any]]) -> tuple:
+    analysis = await query_helper.analyze_query_fused(service.llm, query, list(service.QUERY_TYPES), history, logger)
+    if analysis is None:
+        raise RuntimeError(f"Fused analysis failed for {query!r}")
+    is_weather_related, query_details = analysis
+    return is_weather_related, query_details if is_weather_related else None
+
+async def main(args: argparse.Namespace) -> int:
+    with open(load.QUERIES_PATH, encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)["queries"]]
+    service = WeatherAIService()
+    service.llm = FakeLLM(latency_ms={prompt_type: 0 for prompt_type in DEFAULT_LATENCY_MS}, jitter=0)
+
+    history: List[Dict[str, Any]] = []
+    failures = 0
+    for query in queries:
+        multi_verdict, multi_details = await multi_call(service, query, history)
+        fused_verdict, fused_details = await fused(service, query, history)
+        problems = []
+        if multi_verdict != fused_verdict:
+            problems.append(f"verdict: multi-call {multi_verdict}, fused {fused_verdict}")
+        elif multi_verdict:
+            problems += [f"multi-call {problem}" for problem in shape_problems(multi_details)]
+            problems += [f"fused {problem}" for problem in shape_problems(fused_details)]
+        failures += bool(problems)
+        print(f"{'FAIL' if problems else 'ok':<4} {query!r}")
+        for problem in problems:
+            print(f"     {problem}")
+        if multi_verdict and fused_verdict and args.values:
+            for key in COMPARED_VALUES:
+                if multi_details.get(key) != fused_details.get(key):
+                    print(f"     {key} differs: multi-call {multi_details.get(key)!r}, fused {fused_details.get(key)!r}")
+        history.append({"user_message": query, "ai_response": "(answer)"})
+
+    print(f"\n{len(queries) - failures}/{len(queries)} queries with the same verdict and query_details shape")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--no-values", dest="values", action="store_false", help="do not list differing values")
+    logging.basicConfig(level=logging.ERROR)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,141 @@
+"""
+Cross-worker invalidation of the two-tier cache, including a lost LISTEN
+connection.
+
+Runs two "workers" in one process, each a TieredCache over its own backend:
+
+- memory: MemoryCacheBackend peers sharing one store, no database needed
+- postgres: two PostgresCacheBackend instances on a disposable Postgres
+  (benchmarks.postgres)
+
+For each backend, worker B reads a key (copying it into its near tier) and
+worker A updates it; B must then read the new value. On postgres, B's LISTEN
+connection is also terminated server-side (pg_terminate_backend) and A
+updates the key while B cannot hear it; once B's listener is back, B must
+still read the new value, because the reconnect resets its near tier.
+
+    python -m benchmarks.cache_invalidation --backends memory,postgres
+
+Exits with status 1 when a worker reads a value that is out of date.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.cache import TTLCache
+from app.services.cache_backend import CacheBackend, PostgresCacheBackend, TieredCache
+from benchmarks.postgres import disposable_postgres
+
+KEY = ("weather", ("place", 1), "metric")
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process backend. A backend created with `peer` shares the peer's entries
+    and notifies it, which stands in for several workers in one process.
+    """
+
+    def __init__(self, max_size: int = settings.WEATHER_CACHE_MAX_SIZE, peer: Optional["MemoryCacheBackend"] = None):
+        super().__init__()
+        self.entries = peer.entries if peer is not None else TTLCache(max_size=max_size, ttl=0)
+        self._bus: List[MemoryCacheBackend] = peer._bus if peer is not None else []
+        self._bus.append(self)
+
+    async def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        value = self.entries.get((namespace, key))
+        return (value, self.entries.ttl_remaining((namespace, key))) if value is not None else None
+
+    async def set(self, namespace: str, key: str, value: bytes, ttl: float) -> None:
+        self.entries.set((namespace, key), value, ttl=ttl)
+        self._publish(namespace, key)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        self.entries.delete((namespace, key))
+        self._publish(namespace, key)
+
+    def _publish(self, namespace: str, key: str) -> None:
+        for backend in self._bus:
+            backend._dispatch(self.origin, namespace, key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", **super().stats(), "size": len(self.entries)}
+
+def tiered(backend: CacheBackend) -> TieredCache:
+    return TieredCache("weather", TTLCache(max_size=16, ttl=60), backend, near_ttl=60)
+
+async def wait_for(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+class Checks:
+    def __init__(self):
+        self.failures: List[str] = []
+
+    def __call__(self, backend: str, what: str, ok: bool, detail: Any) -> None:
+        print(f"{'ok' if ok else 'FAIL':<4} {backend:<9} {what} ({detail})")
+        if not ok:
+            self.failures.append(f"{backend}: {what}")
+
+async def check_update(check: Checks, name: str, a: TieredCache, b: TieredCache, value: int, settle: float) -> None:
+    await a.set(KEY, {"temp": value}, ttl=60)
+    await asyncio.sleep(settle)
+    seen = await b.get(KEY)
+    check(name, f"B sees A's update to {value}", seen == {"temp": value}, seen)
+
+async def run_memory(check: Checks) -> None:
+    backend_a = MemoryCacheBackend()
+    a, b = tiered(backend_a), tiered(MemoryCacheBackend(peer=backend_a))
+    await a.set(KEY, {"temp": 1}, ttl=60)
+    check("memory", "B reads through the shared store", await b.get(KEY) == {"temp": 1}, KEY)
+    await check_update(check, "memory", a, b, 2, 0)
+
+async def run_postgres(check: Checks, args: argparse.Namespace) -> None:
+    async with disposable_postgres(args.database_url) as dsn:
+        backend_a, backend_b = PostgresCacheBackend(dsn), PostgresCacheBackend(dsn)
+        await backend_a.start()
+        await backend_b.start()
+        try:
+            a, b = tiered(backend_a), tiered(backend_b)
+            await a.set(KEY, {"temp": 1}, ttl=60)
+            check("postgres", "B reads through the shared table", await b.get(KEY) == {"temp": 1}, KEY)
+            await check_update(check, "postgres", a, b, 2, args.settle)
+
+            listener_pid = backend_b._listener.get_server_pid()
+            await backend_a._pool.fetchval("SELECT pg_terminate_backend($1)", listener_pid)
+            # Updated while B's listener is down: B never gets this notification
+            await a.set(KEY, {"temp": 3}, ttl=60)
+            reconnected = await wait_for(lambda: backend_b.listener_reconnects == 1, args.reconnect_timeout)
+            check("postgres", "B's listener reconnected", reconnected and backend_b.stats()["listening"], backend_b.stats())
+            seen = await b.get(KEY)
+            check("postgres", "B does not serve the copy from before the outage", seen == {"temp": 3}, seen)
+            await check_update(check, "postgres", a, b, 4, args.settle)
+        finally:
+            await backend_a.close()
+            await backend_b.close()
+
+async def main(args: argparse.Namespace) -> int:
+    check = Checks()
+    for backend in args.backends.split(","):
+        if backend == "memory":
+            await run_memory(check)
+        elif backend == "postgres":
+            await run_postgres(check, args)
+        else:
+            raise SystemExit(f"Unknown backend {backend!r}; choose from memory, postgres")
+    print(f"\n{len(check.failures)} failed check(s)")
+    return 1 if check.failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="memory,postgres", help="comma-separated: memory,postgres")
+    parser.add_argument("--settle", type=float, default=0.2, help="seconds for a NOTIFY to arrive")
+    parser.add_argument("--reconnect-timeout", type=float, default=10)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), help="existing database to use a throwaway schema in")
+    sys.exit(asyncio.run(main(parser.parse_args())))
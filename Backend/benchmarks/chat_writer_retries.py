@@ -0,0 +1,82 @@
+"""
+Offline check that ChatHistoryWriter.flush(upto) waits for the rows it marks
+while an older batch is retrying and newer batches keep writing.
+
+Drives a writer (batch size 1) whose write function fails the first
+--failures attempts of a row of session s1. It queues that row, then one of
+s2, and asserts that:
+
+1. flush(upto) for the s1 row does not return while s1 is waiting for a retry,
+   although the newer s2 row was written meanwhile
+2. it returns once s1 has been written, and s1 is no longer pending
+3. a plain flush() then finds every row written, in retry order
+
+    python -m benchmarks.chat_writer_retries
+
+Exits with status 1 when any check fails.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Any, Dict, List
+
+from app.db.supabase_client import ChatHistoryWriter, ChatRow
+
+class FailingWrite:
+    """Write function failing the first `failures` attempts of every row of `session_id`"""
+
+    def __init__(self, session_id: str, failures: int):
+        self.session_id = session_id
+        self.failures = failures
+        self.written: List[str] = []
+
+    async def __call__(self, rows: List[ChatRow]) -> None:
+        if self.failures and any(row[0] == self.session_id for row in rows):
+            self.failures -= 1
+            raise ConnectionError("injected write failure")
+        self.written += [row[0] for row in rows]
+
+def row(session_id: str) -> ChatRow:
+    return (session_id, "What's the weather in London?", "Mild with light rain.", None)
+
+async def main(args: argparse.Namespace) -> int:
+    write = FailingWrite("s1", args.failures)
+    writer = ChatHistoryWriter(write, batch_size=1, flush_interval=0.01, max_queue=10, max_attempts=args.failures + 1)
+    writer.start()
+    failures: List[str] = []
+
+    def check(what: str, ok: bool, detail: Any) -> None:
+        print(f"{'ok' if ok else 'FAIL':<4} {what} ({detail})")
+        if not ok:
+            failures.append(what)
+
+    await writer.put(row("s1"))
+    mark = writer.enqueued
+    await writer.put(row("s2"))
+    try:
+        await asyncio.wait_for(writer.flush(upto=mark), args.early_window)
+        returned_early = True
+    except asyncio.TimeoutError:
+        returned_early = False
+    stats: Dict[str, Any] = writer.stats()
+    check("flush(upto) waits while the marked row retries", not returned_early and stats["retrying_rows"] == 1, f"written {write.written}, retrying {stats['retrying_rows']}")
+    check("newer batch written meanwhile", write.written == ["s2"], write.written)
+
+    await asyncio.wait_for(writer.flush(upto=mark), args.timeout)
+    check("flush(upto) returns once the marked row is written", "s1" in write.written and not writer.has_pending("s1"), write.written)
+
+    await asyncio.wait_for(writer.flush(), args.timeout)
+    check("every row written", write.written == ["s2", "s1"] and writer.settled_below() == writer.enqueued, write.written)
+    await writer.close()
+
+    print(f"\n{len(failures)} failed check(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--failures", type=int, default=1, help="failed write attempts of the s1 row")
+    parser.add_argument("--early-window", type=float, default=0.3, help="seconds flush(upto) must keep waiting (under the first retry backoff)")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for the retries to finish")
+    logging.basicConfig(level=logging.CRITICAL)
+    sys.exit(asyncio.run(main(parser.parse_args())))
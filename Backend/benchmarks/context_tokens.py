@@ -0,0 +1,93 @@
+"""
+Explanation prompt size per turn of a long conversation: the previous layout
+(last 5 turns in the prompt text and again as chat messages) against the
+token-budgeted context builder (conversation once, older turns in the
+session's rolling summary).
+
+Replays --turns queries from fixtures/queries.json against the captured
+weather in fixtures/owm/, answering each with the canned explanation from
+fixtures/llm_responses.json, and prints the estimated prompt tokens per turn
+and in total.
+
+    python -m benchmarks.context_tokens --turns 30
+"""
+import argparse
+import itertools
+import json
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List
+
+from app.core.config import settings
+from app.services import llm_prompts
+from app.services.context_builder import build_explanation_prompt, fold_into_summary
+from app.services.query_helper import format_weather_for_prompt
+from app.services.weather_summary import estimate_tokens
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+PREVIOUS_HISTORY_ROWS = 5
+
+def previous_layout_tokens(prompt_fixed: Dict[str, str], history: List[Dict[str, Any]]) -> int:
+    """Tokens the explanation call used to send: history inside the prompt and as separate messages"""
+    recent = history[-PREVIOUS_HISTORY_ROWS:]
+    chat_context = ""
+    if recent:
+        chat_context = "Previous conversation:\n" + "".join(
+            f"User: {turn['user_message']}\nAI: {turn['ai_response']}\n" for turn in recent
+        )
+    prompt = llm_prompts.GENERATE_WEATHER_EXPLANATION_PROMPT_TEMPLATE.format(chat_context=chat_context, **prompt_fixed)
+    return estimate_tokens(prompt) + sum(estimate_tokens(turn["user_message"]) + estimate_tokens(turn["ai_response"]) for turn in recent)
+
+def main(args: argparse.Namespace) -> None:
+    queries = json.loads((FIXTURES_DIR / "queries.json").read_text(encoding="utf-8"))["queries"]
+    answers = [item["response"] for item in json.loads((FIXTURES_DIR / "llm_responses.json").read_text(encoding="utf-8"))["explanation"]]
+    city_path = sorted((FIXTURES_DIR / "owm").glob("*.json"))[0]
+    captured = json.loads(city_path.read_text(encoding="utf-8"))
+    city = captured["forecast"]["city"]["name"]
+    weather_data = {city: {"current": captured["weather"], "forecast": captured["forecast"]}}
+
+    turns: Deque[Dict[str, Any]] = deque(maxlen=settings.SESSION_STORE_MAX_TURNS)
+    summary = ""
+    rows = []
+    for turn_no, item, answer in zip(range(1, args.turns + 1), itertools.cycle(queries), itertools.cycle(answers)):
+        query_details = {
+            "cities": [city],
+            "query_types": ["current"],
+            "time_context": "current",
+            "specific_conditions": [],
+            "is_follow_up": bool(item.get("follow_up"))
+        }
+        prompt_fixed = {
+            "query": item["query"],
+            "query_details_json": json.dumps(query_details, indent=2),
+            "weather_data_json": format_weather_for_prompt(weather_data, query_details),
+            "follow_up_context": ""
+        }
+        history = list(turns)
+        budgeted = build_explanation_prompt(
+            llm_prompts.GENERATE_WEATHER_EXPLANATION_PROMPT_TEMPLATE,
+            query=prompt_fixed["query"],
+            query_details_json=prompt_fixed["query_details_json"],
+            weather_json=prompt_fixed["weather_data_json"],
+            follow_up_context="",
+            history=history,
+            history_summary=summary
+        )
+        rows.append({"turn": turn_no, "previous": previous_layout_tokens(prompt_fixed, history), **budgeted.tokens})
+        # What SessionStateStore.record_turn does
+        if len(turns) == turns.maxlen:
+            summary = fold_into_summary(summary, turns[0])
+        turns.append({"user_message": item["query"], "ai_response": answer})
+
+    print(f"{'turn':>4} {'previous':>9} {'budgeted':>9} {'history':>8}")
+    for row in rows:
+        print(f"{row['turn']:>4} {row['previous']:>9} {row['total']:>9} {row['history']:>8}")
+    previous_total = sum(row["previous"] for row in rows)
+    budgeted_total = sum(row["total"] for row in rows)
+    print(f"\nTotal: ~{previous_total} tokens before, ~{budgeted_total} with the context builder "
+          f"({1 - budgeted_total / previous_total:.0%} fewer)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    main(parser.parse_args())
@@ -0,0 +1,174 @@
+"""
+Offline stand-in for ChatGoogleGenerativeAI that replays recorded responses.
+
+Prompts are classified by the distinctive wording of the templates in
+app/services/llm_prompts.py and answered from fixtures/llm_responses.json after
+a per-prompt-type latency, so load tests exercise the real pipeline (governors,
+caches, streaming) without network access or API spend. Latencies are uniform
+within +/-jitter of the base, plus an optional heavy tail: a share of calls
+that take a multiple of it, as real model latencies occasionally do.
+"""
+import asyncio
+import json
+import random
+import re
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+FIXTURES_PATH = Path(__file__).resolve().parent / "fixtures" / "llm_responses.json"
+
+# Checked in order: the fused prompt also contains the safeguard's "weather-focused AI assistant"
+PROMPT_MARKERS = (
+    ("fused_analysis", "query analyser of a weather-focused"),
+    ("safeguard", "weather-focused AI assistant"),
+    ("extraction", "extract key information"),
+    ("history_inference", "primary city being discussed"),
+    ("explanation", "Generate a helpful explanation")
+)
+
+# Rough Gemini Flash latencies (ms); streaming spreads the explanation latency over its chunks
+DEFAULT_LATENCY_MS = {
+    "safeguard": 450,
+    "extraction": 650,
+    "history_inference": 400,
+    "fused_analysis": 800,
+    "explanation": 1800
+}
+
+QUERY_PATTERN = re.compile(r'^(?:Current user query|Analyze the following user query|Query): "?(.*?)"?$', re.MULTILINE)
+
+def parse_latencies(spec: str) -> Dict[str, float]:
+    """Parses "safeguard=300,explanation=1200" (or a single number for every prompt type)"""
+    if not spec:
+        return dict(DEFAULT_LATENCY_MS)
+    if "=" not in spec:
+        return {prompt_type: float(spec) for prompt_type in DEFAULT_LATENCY_MS}
+    latencies = dict(DEFAULT_LATENCY_MS)
+    for item in spec.split(","):
+        prompt_type, _, value = item.partition("=")
+        if prompt_type.strip() not in latencies:
+            raise ValueError(f"Unknown prompt type: {prompt_type}")
+        latencies[prompt_type.strip()] = float(value)
+    return latencies
+
+def parse_tails(spec: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Parses "explanation=0.05x6,safeguard=0.02x10" (share of calls x latency multiplier
+    per prompt type), or a single "0.05x6" for every prompt type
+    """
+    if not spec:
+        return {}
+    items = spec.split(",") if "=" in spec else [f"{prompt_type}={spec}" for prompt_type in DEFAULT_LATENCY_MS]
+    tails = {}
+    for item in items:
+        prompt_type, _, value = item.partition("=")
+        if prompt_type.strip() not in DEFAULT_LATENCY_MS:
+            raise ValueError(f"Unknown prompt type: {prompt_type}")
+        share, _, multiplier = value.partition("x")
+        tails[prompt_type.strip()] = (float(share), float(multiplier))
+    return tails
+
+def prompt_text(prompt: Union[str, List[BaseMessage]]) -> str:
+    if isinstance(prompt, str):
+        return prompt
+    return "\n".join(str(message.content) for message in prompt)
+
+def classify_prompt(text: str) -> str:
+    for prompt_type, marker in PROMPT_MARKERS:
+        if marker in text:
+            return prompt_type
+    raise ValueError(f"Unrecognised prompt: {text[:80]!r}")
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class FakeLLM:
+    """
+    Implements the subset of the chat model interface the service uses:
+    ainvoke, astream and with_structured_output. Responses carry
+    usage_metadata so token metrics are populated as in production.
+    """
+
+    def __init__(
+        self,
+        fixtures_path: Path = FIXTURES_PATH,
+        latency_ms: Optional[Dict[str, float]] = None,
+        jitter: float = 0.2,
+        tail: Optional[Dict[str, Tuple[float, float]]] = None,
+        stream_chunk_words: int = 4,
+        seed: Optional[int] = None
+    ):
+        with open(fixtures_path, encoding="utf-8") as f:
+            self.fixtures: Dict[str, List[Dict[str, Any]]] = {
+                prompt_type: entries for prompt_type, entries in json.load(f).items() if not prompt_type.startswith("_")
+            }
+        self.latency_ms = latency_ms or dict(DEFAULT_LATENCY_MS)
+        self.jitter = jitter
+        self.tail = tail or {}
+        self.stream_chunk_words = stream_chunk_words
+        self._random = random.Random(seed)
+        self.calls: Dict[str, int] = {prompt_type: 0 for prompt_type in DEFAULT_LATENCY_MS}
+
+    def _latency(self, prompt_type: str) -> float:
+        base = self.latency_ms.get(prompt_type, 0) / 1000
+        share, multiplier = self.tail.get(prompt_type, (0.0, 1.0))
+        if share and self._random.random() < share:
+            base *= multiplier
+        return max(0.0, base * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _respond(self, prompt: Union[str, List[BaseMessage]]) -> tuple:
+        text = prompt_text(prompt)
+        prompt_type = classify_prompt(text)
+        self.calls[prompt_type] += 1
+        # Match against the user query only; the templates themselves mention "tomorrow", "week", ...
+        queries = QUERY_PATTERN.findall(text)
+        query = queries[-1].lower() if queries else text.lower()
+        for entry in self.fixtures.get(prompt_type, []):
+            if "match" not in entry or entry["match"].lower() in query:
+                return prompt_type, text, entry["response"]
+        raise LookupError(f"No recorded {prompt_type} response for {query!r}")
+
+    @staticmethod
+    def _usage(prompt: str, response: str) -> Dict[str, int]:
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(response)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    async def ainvoke(self, prompt: Union[str, List[BaseMessage]], **kwargs: Any) -> AIMessage:
+        prompt_type, text, response = self._respond(prompt)
+        await asyncio.sleep(self._latency(prompt_type))
+        content = response if isinstance(response, str) else json.dumps(response)
+        return AIMessage(content=content, usage_metadata=self._usage(text, content))
+
+    async def astream(self, prompt: Union[str, List[BaseMessage]], **kwargs: Any) -> AsyncIterator[AIMessageChunk]:
+        prompt_type, text, response = self._respond(prompt)
+        content = response if isinstance(response, str) else json.dumps(response)
+        words = content.split(" ")
+        chunks = [" ".join(words[i:i + self.stream_chunk_words]) for i in range(0, len(words), self.stream_chunk_words)]
+        total = self._latency(prompt_type)
+        # Time to first token is roughly a quarter of the full generation time
+        await asyncio.sleep(total / 4)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(total * 3 / 4 / max(len(chunks) - 1, 1))
+            last = i == len(chunks) - 1
+            yield AIMessageChunk(
+                content=chunk + ("" if last else " "),
+                usage_metadata=self._usage(text, content) if last else None
+            )
+
+    def with_structured_output(self, schema: Any) -> "_StructuredFakeLLM":
+        return _StructuredFakeLLM(self, schema)
+
+class _StructuredFakeLLM:
+    def __init__(self, llm: FakeLLM, schema: Any):
+        self.llm = llm
+        self.schema = schema
+
+    async def ainvoke(self, prompt: Union[str, List[BaseMessage]], **kwargs: Any) -> Any:
+        prompt_type, _, response = self.llm._respond(prompt)
+        await asyncio.sleep(self.llm._latency(prompt_type))
+        if isinstance(response, str):
+            return self.schema.model_validate_json(response)
+        return self.schema.model_validate(response)
@@ -0,0 +1,104 @@
+"""
+Regression check of the local fast path against the LLM path.
+
+Runs every query of fixtures/fast_path_corpus.json through
+app.services.fast_path.FastPathClassifier and compares each answer it gives
+with the LLM path's analysis of the same query: the on-topic verdict, the
+cities (as gazetteer places) and time_context, plus specific_time where the
+LLM names one. Deferring to the LLM is never wrong, except for queries marked
+`must_defer` (e.g. "Paris, Texas", where the gazetteer's Paris is not the one
+meant). Reports fast-path coverage and every disagreement.
+
+The LLM path's answers are stored in the corpus; with --live they are taken
+from the real model instead (fused structured call; needs GOOGLE_API_KEY),
+which is how new corpus entries should be checked.
+
+    python -m benchmarks.fast_path_corpus
+    python -m benchmarks.fast_path_corpus --live
+
+Exits with status 1 on any disagreement.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.services.fast_path import FastPathClassifier
+from app.services.geocoding import fold_name, get_geocoding_index
+
+CORPUS_PATH = Path(__file__).resolve().parent / "fixtures" / "fast_path_corpus.json"
+
+logger = logging.getLogger("fast_path_corpus")
+
+def place_key(city: str) -> Any:
+    place = get_geocoding_index().exact(city)
+    return place.id if place else fold_name(city)
+
+def disagreements(fast: Dict[str, Any], llm: Dict[str, Any]) -> List[str]:
+    """How a fast-path answer {is_weather_related, query_details} differs from the LLM path's analysis"""
+    if fast["is_weather_related"] != llm["is_weather_related"]:
+        return [f"verdict: fast path {fast['is_weather_related']}, LLM {llm['is_weather_related']}"]
+    if not llm["is_weather_related"]:
+        return []
+    details = fast["query_details"]
+    problems = []
+    if sorted(map(place_key, details["cities"]), key=str) != sorted(map(place_key, llm["cities"]), key=str):
+        problems.append(f"cities: fast path {details['cities']}, LLM {llm['cities']}")
+    if details["time_context"] != llm["time_context"]:
+        problems.append(f"time_context: fast path {details['time_context']}, LLM {llm['time_context']}")
+    if llm.get("specific_time") and details.get("specific_time") != llm["specific_time"]:
+        problems.append(f"specific_time: fast path {details.get('specific_time')}, LLM {llm['specific_time']}")
+    return problems
+
+async def live_analysis(queries: List[str]) -> List[Dict[str, Any]]:
+    """The real model's analysis of each query, through the fused call"""
+    from app.services import query_helper
+    from app.services.ai_service import WeatherAIService
+
+    service = WeatherAIService()
+    analyses = []
+    for query in queries:
+        analysis = await query_helper.analyze_query_fused(service.llm, query, list(service.QUERY_TYPES), [], logger)
+        if analysis is None:
+            raise RuntimeError(f"LLM analysis failed for {query!r}")
+        is_weather_related, details = analysis
+        analyses.append({"is_weather_related": is_weather_related, **{key: details.get(key) for key in ("cities", "time_context", "specific_time")}})
+    return analyses
+
+def main(args: argparse.Namespace) -> int:
+    corpus = json.loads(CORPUS_PATH.read_text(encoding="utf-8"))["queries"]
+    references: List[Dict[str, Any]] = [entry["llm"] for entry in corpus]
+    if args.live:
+        references = asyncio.run(live_analysis([entry["query"] for entry in corpus]))
+
+    classifier = FastPathClassifier()
+    failures = 0
+    for entry, llm in zip(corpus, references):
+        result: Optional[tuple] = classifier.classify(entry["query"])
+        if result is None:
+            problems = []
+            outcome = "llm"
+        elif entry.get("must_defer"):
+            problems = [f"must defer to the LLM, fast path answered {result[1] or result[0]}"]
+            outcome = "fast"
+        else:
+            problems = disagreements({"is_weather_related": result[0], "query_details": result[1]}, llm)
+            outcome = "fast"
+        failures += bool(problems)
+        print(f"{'FAIL' if problems else 'ok':<4} {outcome:<4} {entry['query']!r}")
+        for problem in problems:
+            print(f"          {problem}")
+
+    stats = classifier.stats()
+    print(f"\nFast path answered {stats['weather_hits'] + stats['greeting_hits']}/{stats['attempts']} queries "
+          f"(coverage {stats['coverage']:.0%}); {failures} disagreement(s) with the LLM path")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="compare with the real model instead of the stored analyses")
+    logging.basicConfig(level=logging.ERROR)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,176 @@
+"""
+Fault-injection scenario for the OpenWeatherMap governor and the weather cache.
+
+Starts a disposable Postgres, the OpenWeatherMap stub (benchmarks.stub_owm)
+and the API (benchmarks.serve) with a small breaker (threshold
+--failure-threshold, reset --reset-timeout s) and a 1 s current-weather TTL.
+It then turns failures on and off through the stub's POST /_faults, and after
+each step asserts on the API's GET /api/weather/stats and the stub's
+GET /_stats:
+
+1. healthy: London is fetched and cached
+2. stale: London expires and the stub fails every call; the answer is served
+   from the stale entry, after the GET was retried (every attempt reached the stub)
+3. open: an uncached city exhausts the breaker, which opens; while it is open,
+   no request reaches the stub and London is still served stale
+4. half-open: after the reset timeout exactly one probe reaches the failing
+   stub and re-opens the circuit
+5. closed: failures stop; after the reset timeout the probe succeeds and the
+   circuit closes
+
+Throughout, the LLM governor must not retry: its calls are not idempotent.
+
+    python -m benchmarks.faults
+
+Exits with status 1 when any check fails.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import uuid
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks import load
+from benchmarks.postgres import disposable_postgres, free_port
+
+OWM = "openweathermap"
+LLM = "gemini"
+STALE_CITY_QUERY = "What's the weather in London?"
+UNCACHED_CITY_QUERY = "weather paris"
+
+class Scenario:
+    def __init__(self, api: httpx.AsyncClient, stub: httpx.AsyncClient):
+        self.api = api
+        self.stub = stub
+        self.failures: List[str] = []
+        self._api_before: Dict[str, Any] = {}
+        self._stub_before = 0
+
+    async def query(self, text: str) -> int:
+        response = await self.api.post("/api/weather/query", json={"query": text}, headers={"X-Session-ID": f"faults_{uuid.uuid4().hex[:12]}"})
+        return response.status_code
+
+    async def faults(self, **faults: float) -> None:
+        (await self.stub.post("/_faults", params=faults)).raise_for_status()
+
+    async def api_stats(self) -> Dict[str, Any]:
+        return (await self.api.get("/api/weather/stats")).json()
+
+    async def stub_requests(self) -> int:
+        """Requests that reached the stub (failed ones are also counted under <endpoint>_errors)"""
+        requests = (await self.stub.get("/_stats")).json()["requests"]
+        return sum(count for kind, count in requests.items() if not kind.endswith("_errors"))
+
+    async def mark(self) -> None:
+        """Remembers the counters, so the next step's checks see only its own deltas"""
+        self._api_before = await self.api_stats()
+        self._stub_before = await self.stub_requests()
+
+    async def deltas(self) -> Dict[str, Any]:
+        now = await self.api_stats()
+        before = self._api_before
+        return {
+            "stats": now,
+            "owm": {key: now["dependencies"][OWM][key] - before["dependencies"][OWM][key] for key in ("calls", "failures", "rejected", "retries", "breaker_opens")},
+            "stale_served": now["weather_cache"]["stale_served"] - before["weather_cache"]["stale_served"],
+            "stub_requests": await self.stub_requests() - self._stub_before
+        }
+
+    def check(self, step: str, what: str, ok: bool, detail: Any) -> None:
+        print(f"{'ok' if ok else 'FAIL':<4} {step:<10} {what} ({detail})")
+        if not ok:
+            self.failures.append(f"{step}: {what}")
+
+async def run(scenario: Scenario, args: argparse.Namespace) -> None:
+    check = scenario.check
+
+    await scenario.mark()
+    status = await scenario.query(STALE_CITY_QUERY)
+    d = await scenario.deltas()
+    check("healthy", "answered", status == 200, status)
+    check("healthy", "fetched upstream", d["stub_requests"] >= 1 and d["owm"]["failures"] == 0, d["owm"])
+    check("healthy", "breaker closed", d["stats"]["dependencies"][OWM]["breaker_state"] == "closed", d["stats"]["dependencies"][OWM]["breaker_state"])
+
+    await asyncio.sleep(args.current_ttl + 0.5)
+    await scenario.faults(error_rate=1)
+    await scenario.mark()
+    status = await scenario.query(STALE_CITY_QUERY)
+    d = await scenario.deltas()
+    check("stale", "answered from the stale entry", status == 200 and d["stale_served"] >= 1, f"status {status}, stale_served +{d['stale_served']}")
+    check("stale", "GET retried", d["owm"]["retries"] >= 1, f"retries +{d['owm']['retries']}")
+    check("stale", "every attempt reached the stub", d["stub_requests"] == d["owm"]["calls"], f"stub +{d['stub_requests']}, calls +{d['owm']['calls']}")
+
+    await scenario.mark()
+    statuses = []
+    while (await scenario.api_stats())["dependencies"][OWM]["breaker_state"] != "open" and len(statuses) < args.failure_threshold:
+        statuses.append(await scenario.query(UNCACHED_CITY_QUERY))
+    d = await scenario.deltas()
+    check("open", "uncached city fails with 503", statuses and all(status == 503 for status in statuses), statuses)
+    check("open", "breaker opened", d["stats"]["dependencies"][OWM]["breaker_state"] == "open" and d["owm"]["breaker_opens"] == 1, f"opens +{d['owm']['breaker_opens']}")
+
+    await scenario.mark()
+    uncached_status = await scenario.query(UNCACHED_CITY_QUERY)
+    stale_status = await scenario.query(STALE_CITY_QUERY)
+    d = await scenario.deltas()
+    check("open", "calls rejected without reaching the stub", uncached_status == 503 and d["owm"]["rejected"] >= 2 and d["stub_requests"] == 0, f"rejected +{d['owm']['rejected']}, stub +{d['stub_requests']}")
+    check("open", "London still served stale", stale_status == 200 and d["stale_served"] >= 1, f"status {stale_status}, stale_served +{d['stale_served']}")
+
+    await asyncio.sleep(args.reset_timeout + 0.5)
+    await scenario.mark()
+    status = await scenario.query(UNCACHED_CITY_QUERY)
+    d = await scenario.deltas()
+    check("half-open", "single probe reached the stub", d["stub_requests"] == 1, f"stub +{d['stub_requests']}")
+    check("half-open", "failed probe re-opened the circuit", status == 503 and d["stats"]["dependencies"][OWM]["breaker_state"] == "open" and d["owm"]["breaker_opens"] == 1, f"status {status}, opens +{d['owm']['breaker_opens']}")
+
+    await scenario.faults(error_rate=0)
+    await asyncio.sleep(args.reset_timeout + 0.5)
+    await scenario.mark()
+    status = await scenario.query(UNCACHED_CITY_QUERY)
+    d = await scenario.deltas()
+    owm = d["stats"]["dependencies"][OWM]
+    check("closed", "probe succeeded", status == 200 and d["owm"]["failures"] == 0, f"status {status}")
+    check("closed", "breaker closed", owm["breaker_state"] == "closed" and owm["consecutive_failures"] == 0, owm["breaker_state"])
+
+    llm = d["stats"]["dependencies"][LLM]
+    check("overall", "LLM calls never retried", llm["calls"] > 0 and llm["retries"] == 0, f"calls {llm['calls']}, retries {llm['retries']}")
+
+async def main(args: argparse.Namespace) -> int:
+    stub_port, api_port = free_port(), free_port()
+    stub_url, api_url = f"http://127.0.0.1:{stub_port}", f"http://127.0.0.1:{api_port}"
+    async with disposable_postgres(args.database_url) as dsn:
+        api_env = {
+            "DATABASE_URL": dsn,
+            "OPENWEATHERMAP_BASE_URL": stub_url,
+            "LOG_LEVEL": "ERROR",
+            "ADMISSION_SESSION_RATE": "0",
+            "ADMISSION_CLIENT_RATE": "0",
+            "BREAKER_FAILURE_THRESHOLD": str(args.failure_threshold),
+            "BREAKER_RESET_TIMEOUT": str(args.reset_timeout),
+            "OWM_MAX_RETRIES": str(args.owm_retries),
+            "WEATHER_CACHE_CURRENT_TTL": str(args.current_ttl),
+            "WEATHER_CACHE_FORECAST_TTL": str(args.current_ttl),
+            # Only the scenario's own requests may reach the stub
+            "PREWARM_ENABLED": "False"
+        }
+        serve_cmd = [sys.executable, "-m", "benchmarks.serve", "--port", str(api_port), "--llm-latency-ms", "0", "--llm-jitter", "0"]
+        stub_cmd = [sys.executable, "-m", "uvicorn", "benchmarks.stub_owm:app", "--port", str(stub_port), "--log-level", "warning"]
+        async with load.running(stub_cmd, {"STUB_OWM_LATENCY_MS": "0"}, f"{stub_url}/_stats"), \
+                load.running(serve_cmd, api_env, f"{api_url}/"):
+            async with httpx.AsyncClient(base_url=api_url, timeout=30) as api, httpx.AsyncClient(base_url=stub_url) as stub:
+                scenario = Scenario(api, stub)
+                await run(scenario, args)
+
+    print(f"\n{len(scenario.failures)} failed check(s)")
+    return 1 if scenario.failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--failure-threshold", type=int, default=5, help="BREAKER_FAILURE_THRESHOLD for the API")
+    parser.add_argument("--reset-timeout", type=float, default=2, help="BREAKER_RESET_TIMEOUT for the API (s)")
+    parser.add_argument("--owm-retries", type=int, default=2, help="OWM_MAX_RETRIES for the API")
+    parser.add_argument("--current-ttl", type=float, default=1, help="weather cache TTL for the API (s)")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), help="existing database to use a throwaway schema in")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,64 @@
+"""
+Memory per cached city: raw /forecast dicts vs ColumnarForecast.
+
+Builds --copies independent copies of each captured forecast in fixtures/owm/
+in both forms and measures the memory they keep alive with tracemalloc, plus
+the time to parse a payload and to summarise it for a prompt.
+
+    python -m benchmarks.forecast_memory --copies 200
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from statistics import median
+
+from app.services.forecast_columns import ColumnarForecast
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "owm"
+
+def retained_bytes(build, copies: int) -> float:
+    """Average bytes kept alive per object built by build()"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build() for _ in range(copies)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / copies
+
+def timed_us(fn, repeat: int = 200) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(median(samples) * 1e6, 1)
+
+def main(args: argparse.Namespace) -> None:
+    results = []
+    for path in sorted(FIXTURES_DIR.glob("*.json")):
+        raw = path.read_text(encoding="utf-8")
+        payload = json.loads(raw)["forecast"]
+        payload_json = json.dumps(payload)
+        columnar = ColumnarForecast.from_payload(payload)
+        dict_bytes = retained_bytes(lambda: json.loads(payload_json), args.copies)
+        columnar_bytes = retained_bytes(lambda: ColumnarForecast.from_payload(json.loads(payload_json)), args.copies)
+        results.append({
+            "city": payload["city"]["name"],
+            "slots": len(columnar),
+            "dict_bytes": round(dict_bytes),
+            "columnar_bytes": round(columnar_bytes),
+            "column_buffer_bytes": columnar.nbytes(),
+            "reduction": round(dict_bytes / columnar_bytes, 1),
+            "parse_us": timed_us(lambda: ColumnarForecast.from_payload(payload)),
+            "summarize_week_us": timed_us(lambda: ColumnarForecast.from_payload(payload).summarize(None)),
+            "summarize_cached_us": timed_us(lambda: columnar.summarize(None))
+        })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=200)
+    main(parser.parse_args())
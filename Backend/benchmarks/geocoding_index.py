@@ -0,0 +1,110 @@
+"""
+Memory and lookup latency of GeocodingIndex on a synthetic gazetteer.
+
+Generates --places pronounceable place names (with one alias each, as the
+bundled gazetteer has), builds the index and, for comparison, the obvious
+dict of folded name -> (name, country, lat, lon) tuples, and measures the
+memory each keeps alive with tracemalloc. Then times exact lookups of known
+names, approximate lookups (unique prefix, one-letter misspelling, and
+misses that are compared against a whole fuzzy bucket) and the memoised
+canonical_city_key used by the caches.
+
+    python -m benchmarks.geocoding_index --places 200000
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from statistics import median
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from app.services.geocoding import GeocodingIndex, fold_name
+from app.services.weather_cache import _canonical_key
+
+SYLLABLES = ("ba", "ber", "ca", "dor", "el", "fen", "gra", "han", "is", "ka", "lin", "mar", "no", "os", "pol", "qua", "ros", "sa", "tan", "ur", "vil", "wes", "yor", "zen")
+COUNTRIES = ("GB", "US", "FR", "DE", "IN", "BR", "JP", "ZA", "AU", "CA")
+
+def synthetic_rows(places: int, seed: int) -> List[Tuple[str, str, float, float, Sequence[str]]]:
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < places:
+        names.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize())
+    return [
+        (name, rng.choice(COUNTRIES), rng.uniform(-90, 90), rng.uniform(-180, 180), [f"{name} city"])
+        for name in sorted(names)
+    ]
+
+def retained_mb(build: Callable[[], object]) -> Tuple[object, float]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, round((after - before) / 1e6, 1)
+
+def timed_us(fn: Callable[[str], object], names: List[str]) -> Dict[str, float]:
+    samples = []
+    for name in names:
+        started = time.perf_counter()
+        fn(name)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {"p50": round(median(samples) * 1e6, 1), "max": round(samples[-1] * 1e6, 1)}
+
+def misspell(name: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(name))
+    return name[:i] + rng.choice("aeiou") + name[i + 1:]
+
+def main(args: argparse.Namespace) -> None:
+    rows = synthetic_rows(args.places, args.seed)
+    rng = random.Random(args.seed)
+    index, index_mb = retained_mb(lambda: GeocodingIndex(rows))
+    _, dict_mb = retained_mb(lambda: {
+        fold_name(key): (name, country, lat, lon)
+        for name, country, lat, lon, aliases in rows for key in (name, *aliases)
+    })
+
+    known = [name for name, *_ in rng.sample(rows, args.lookups)]
+    prefixes = [name[:-1] for name in known]
+    misspelled = [misspell(name, rng) for name in known]
+    # Misses that share a known name's leading letters, so its fuzzy bucket is searched and nothing matches
+    misses = [rng.choice(known)[:2] + "".join(rng.choice("xq") for _ in range(6)) for _ in range(args.lookups)]
+
+    results = {
+        "places": len(index),
+        "index_mb": index_mb,
+        "dict_mb": dict_mb,
+        "lookup_us": {
+            "exact": timed_us(index.lookup, known),
+            "exact miss (default, no guessing)": timed_us(index.lookup, misspelled),
+            "approximate prefix": timed_us(lambda name: index.lookup(name, approximate=True), prefixes),
+            "approximate misspelling": timed_us(lambda name: index.lookup(name, approximate=True), misspelled),
+            "approximate miss": timed_us(lambda name: index.lookup(name, approximate=True), misses)
+        }
+    }
+    # canonical_city_key on the process-wide (bundled) index: first call per name, then memoised
+    sample = ["London", "new york city", "NYC", "Paris", "Bengaluru", "Atlantis"] * (args.lookups // 6)
+    _canonical_key.cache_clear()
+    results["canonical_city_key_us"] = {
+        "first": timed_us(lambda name: _canonical_key(name, True, False), sample[:6]),
+        "memoised": timed_us(lambda name: _canonical_key(name, True, False), sample)
+    }
+
+    print(f"{results['places']} places: index {index_mb} MB, dict of tuples {dict_mb} MB")
+    for kind, latency in {**results["lookup_us"], **{f"canonical_city_key {k}": v for k, v in results["canonical_city_key_us"].items()}}.items():
+        print(f"  {kind:<42} p50 {latency['p50']:>9} us   max {latency['max']:>9} us")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=200_000)
+    parser.add_argument("--lookups", type=int, default=600, help="names timed per lookup kind")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="optional JSON result file")
+    main(parser.parse_args())
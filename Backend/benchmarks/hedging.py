@@ -0,0 +1,91 @@
+"""
+Tail latency of LLM calls with and without hedging, against the fake LLM with
+an injected heavy tail.
+
+Sends --calls safeguard and explanation prompts, --concurrency at a time,
+through app.core.llm_invoker.HedgedInvoker on a fresh governor, once with
+hedging off and once on (after --warmup calls to fill the latency window).
+Every --tail share of calls takes a multiple of the base latency. Reports
+p50/p95/p99/max per prompt type, hedges sent and won, and the extra LLM calls
+hedging cost.
+
+    python -m benchmarks.hedging --calls 1000 --tail 0.05x8
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from app.core.governor import DependencyGovernor
+from app.core.llm_invoker import HedgedInvoker
+from app.services import llm_prompts
+from benchmarks import load
+from benchmarks.fake_llm import FakeLLM, parse_latencies, parse_tails
+
+PROMPTS = {
+    "safeguard": llm_prompts.WEATHER_QUERY_SAFEGUARD_PROMPT_TEMPLATE.format(query="What's the weather in London?"),
+    "explanation": llm_prompts.GENERATE_WEATHER_EXPLANATION_PROMPT_TEMPLATE.format(
+        query="What's the weather in London?", chat_context="", query_details_json="{}", weather_data_json="{}", follow_up_context=""
+    )
+}
+
+async def run(hedging: bool, args: argparse.Namespace) -> Dict[str, Any]:
+    llm = FakeLLM(latency_ms=parse_latencies(args.llm_latency_ms), jitter=args.jitter, tail=parse_tails(args.tail), seed=args.seed)
+    governor = DependencyGovernor(f"bench_{'hedged' if hedging else 'plain'}", max_concurrency=args.max_concurrency)
+    invoker = HedgedInvoker(governor, hedging=hedging, max_hedge_ratio=args.max_hedge_ratio)
+    latencies: Dict[str, List[float]] = {prompt_type: [] for prompt_type in PROMPTS}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int, record: bool) -> None:
+        prompt_type = "safeguard" if i % 2 else "explanation"
+        prompt = PROMPTS[prompt_type]
+        async with semaphore:
+            started = time.perf_counter()
+            await invoker.call(lambda: llm.ainvoke(prompt), deadline=60, operation=prompt_type)
+            if record:
+                latencies[prompt_type].append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i, False) for i in range(args.warmup)))
+    calls_before = sum(llm.calls.values())
+    await asyncio.gather(*(one(i, True) for i in range(args.calls)))
+    llm_calls = sum(llm.calls.values()) - calls_before
+    stats = invoker.stats()
+    return {
+        "hedging": hedging,
+        "latency_ms": {prompt_type: load.percentiles(samples) for prompt_type, samples in latencies.items()},
+        "hedges": {prompt_type: {"sent": stats[prompt_type].get("hedges", 0), "won": stats[prompt_type].get("hedge_wins", 0)} for prompt_type in PROMPTS},
+        "extra_llm_calls": round(llm_calls / args.calls - 1, 3)
+    }
+
+def print_summary(results: List[Dict[str, Any]]) -> None:
+    print(f"{'hedging':<8} {'prompt':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'hedges':>7} {'won':>5}")
+    for result in results:
+        for prompt_type, latency in result["latency_ms"].items():
+            hedges = result["hedges"][prompt_type]
+            print(
+                f"{'on' if result['hedging'] else 'off':<8} {prompt_type:<12} {latency['p50']!s:>8} {latency['p95']!s:>8} "
+                f"{latency['p99']!s:>8} {latency['max']!s:>8} {hedges['sent']:>7} {hedges['won']:>5}"
+            )
+        print(f"{'':<8} extra LLM calls: {result['extra_llm_calls']:.1%}")
+
+async def main(args: argparse.Namespace) -> None:
+    results = [await run(False, args), await run(True, args)]
+    print_summary(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=200, help="calls before measuring, to fill the latency window")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-concurrency", type=int, default=16, help="governor slots")
+    parser.add_argument("--max-hedge-ratio", type=float, default=0.1)
+    parser.add_argument("--llm-latency-ms", default="safeguard=150,explanation=600")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--tail", default="0.05x8", help="share of slow calls and their latency multiplier")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="optional JSON result file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,144 @@
+"""
+Chat history reads on a Postgres seeded with long sessions: the previous
+query (SELECT *, oldest first, twice per request) against the current
+SupabaseDB.get_chat_history (needed columns, newest N, once per request),
+each with and without the (session_id, created_at) index of
+migrations/001.
+
+Starts a disposable Postgres (benchmarks.postgres), seeds --sessions sessions
+of --turns turns each with interleaved timestamps, and per variant issues
+--requests history loads for random sessions, --concurrency at a time.
+Reports latency per request (both reads for the previous path), throughput,
+and the shared buffers one read of a long session touches (EXPLAIN ANALYZE).
+
+    python -m benchmarks.history_reads --sessions 200 --turns 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+import asyncpg
+
+from app.db.supabase_client import SupabaseDB
+from benchmarks import load
+from benchmarks.postgres import disposable_postgres
+
+INDEX_NAME = "idx_chat_history_session_created_at"
+MIGRATION_PATH = Path(__file__).resolve().parent.parent / "migrations" / "001_chat_history_session_created_at_idx.sql"
+
+# How the history was read before: every column, oldest turns first, once for history inference and again for the explanation
+PREVIOUS_QUERY = "SELECT * FROM chat_history WHERE session_id = $1 ORDER BY created_at ASC LIMIT $2"
+PREVIOUS_READS_PER_REQUEST = 2
+CURRENT_QUERY = "SELECT user_message, ai_response, created_at FROM chat_history WHERE session_id = $1 ORDER BY created_at DESC LIMIT $2"
+
+async def seed(pool: asyncpg.Pool, sessions: int, turns: int, answer_chars: int) -> None:
+    started_at = datetime.now(timezone.utc) - timedelta(days=30)
+    answer = ("Expect light rain in the afternoon with temperatures around 14C. " * (answer_chars // 64 + 1))[:answer_chars]
+    async with pool.acquire() as conn:
+        for turn in range(turns):
+            # One turn of every session per round, so sessions are interleaved on disk as in production
+            created_at = started_at + timedelta(seconds=turn * 60)
+            await conn.copy_records_to_table(
+                "chat_history",
+                records=[(f"session_{s}", f"What's the weather like, question {turn}?", answer, created_at + timedelta(milliseconds=s)) for s in range(sessions)],
+                columns=("session_id", "user_message", "ai_response", "created_at")
+            )
+        await conn.execute("VACUUM ANALYZE chat_history")
+
+async def set_index(pool: asyncpg.Pool, present: bool) -> None:
+    async with pool.acquire() as conn:
+        if present:
+            await conn.execute(MIGRATION_PATH.read_text(encoding="utf-8"))
+        else:
+            await conn.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+        await conn.execute("ANALYZE chat_history")
+
+async def shared_buffers_touched(pool: asyncpg.Pool, query: str, session_id: str, limit: int) -> int:
+    async with pool.acquire() as conn:
+        plan = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", session_id, limit)
+    node = json.loads(plan)[0]["Plan"]
+    return node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0)
+
+async def run_variant(read, sessions: int, requests: int, concurrency: int, seed_value: int) -> Dict[str, Any]:
+    rng = random.Random(seed_value)
+    session_ids = [f"session_{rng.randrange(sessions)}" for _ in range(requests)]
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(session_id: str) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await read(session_id)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(session_id) for session_id in session_ids))
+    elapsed = time.perf_counter() - started
+    return {"throughput_rps": round(requests / elapsed, 1), "latency_ms": load.percentiles(latencies)}
+
+async def main(args: argparse.Namespace) -> None:
+    results = []
+    async with disposable_postgres(args.database_url) as dsn:
+        pool = await asyncpg.create_pool(dsn, min_size=args.concurrency, max_size=args.concurrency)
+        SupabaseDB._pool = pool
+        db = SupabaseDB()
+        try:
+            started = time.perf_counter()
+            await seed(pool, args.sessions, args.turns, args.answer_chars)
+            print(f"Seeded {args.sessions * args.turns} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+            async def previous_read(session_id: str) -> None:
+                async with pool.acquire() as conn:
+                    for _ in range(PREVIOUS_READS_PER_REQUEST):
+                        await conn.fetch(PREVIOUS_QUERY, session_id, args.limit)
+
+            async def current_read(session_id: str) -> None:
+                await db.get_chat_history(session_id, args.limit)
+
+            for indexed in (False, True):
+                await set_index(pool, indexed)
+                for name, query, read in (("previous", PREVIOUS_QUERY, previous_read), ("current", CURRENT_QUERY, current_read)):
+                    await run_variant(read, args.sessions, args.warmup, args.concurrency, args.seed)
+                    result = {
+                        "query": name,
+                        "index": indexed,
+                        **await run_variant(read, args.sessions, args.requests, args.concurrency, args.seed),
+                        "buffers_per_read": await shared_buffers_touched(pool, query, "session_0", args.limit)
+                    }
+                    print(f"{name} index={indexed}: p95 {result['latency_ms']['p95']} ms", file=sys.stderr)
+                    results.append(result)
+        finally:
+            SupabaseDB._pool = None
+            await pool.close()
+
+    print(f"\n{args.sessions} sessions x {args.turns} turns, last {args.limit} turns per load")
+    print(f"{'query':<9} {'index':<6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'buffers/read':>13}")
+    for result in results:
+        latency = result["latency_ms"]
+        print(
+            f"{result['query']:<9} {'yes' if result['index'] else 'no':<6} {result['throughput_rps']:>8} "
+            f"{latency['p50']!s:>8} {latency['p95']!s:>8} {latency['p99']!s:>8} {result['buffers_per_read']:>13}"
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps({"options": {k: v for k, v in vars(args).items() if k != "database_url"}, "results": results}, indent=2), encoding="utf-8")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=1000, help="turns per session")
+    parser.add_argument("--answer-chars", type=int, default=400, help="length of each stored AI response")
+    parser.add_argument("--limit", type=int, default=10, help="turns per history load")
+    parser.add_argument("--requests", type=int, default=500, help="history loads per variant")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), help="existing database to use a throwaway schema in")
+    parser.add_argument("--output", help="optional JSON result file")
+    asyncio.run(main(parser.parse_args()))
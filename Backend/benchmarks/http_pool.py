@@ -0,0 +1,136 @@
+"""
+Upstream latency with the shared, pooled HTTP client against a fresh client per
+request (how WeatherService fetched before it kept one client per process).
+
+Starts the OpenWeatherMap stub (benchmarks.stub_owm), over TLS with a
+throwaway self-signed certificate unless --no-tls, and sends --requests
+/weather lookups through WeatherService, --concurrency at a time, once per
+mode:
+
+- per_request: a new httpx.AsyncClient, so a new TCP (and TLS) connection, per call
+- pooled: the service's own keep-alive client, as the app runs it
+
+Both go through the same governor, so the client is the only difference.
+Reports p50/p95/p99 latency and throughput per mode and concurrency level.
+
+    python -m benchmarks.http_pool --requests 500 --concurrency 1,16
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Settings are read at import time
+os.environ.setdefault("OPENWEATHERMAP_API_KEY", "offline-benchmark")
+
+import httpx
+
+from app.core.config import settings
+from app.core.governor import owm_governor
+from app.services.weather_service import WeatherService
+from benchmarks import load
+from benchmarks.postgres import free_port
+
+CITIES = ("London", "Paris", "New York", "Tokyo")
+
+class PerRequestClientWeatherService(WeatherService):
+    """WeatherService as it was before pooling: a client, and so a connection, per upstream call"""
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        async def request() -> Dict[str, Any]:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(settings.OWM_REQUEST_TIMEOUT)) as client:
+                response = await client.get(f"{self.base_url}/{path}", params=params)
+                response.raise_for_status()
+                return response.json()
+
+        return await owm_governor.call(request, deadline=settings.WEATHER_FETCH_DEADLINE, retry=True, operation=path)
+
+def self_signed_certificate(directory: str) -> tuple:
+    """A certificate for 127.0.0.1 and its key, made with the openssl CLI"""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert, "-days", "1",
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"
+        ],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return cert, key
+
+async def run_mode(service: WeatherService, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await service.get_weather_by_city(CITIES[i % len(CITIES)])
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": load.percentiles(latencies)
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    levels = [int(level) for level in args.concurrency.split(",")]
+    stub_port = free_port()
+    scheme = "http" if args.no_tls else "https"
+    stub_cmd = [sys.executable, "-m", "uvicorn", "benchmarks.stub_owm:app", "--port", str(stub_port), "--log-level", "warning"]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_tls_") as tls_dir:
+        if not args.no_tls:
+            cert, key = self_signed_certificate(tls_dir)
+            stub_cmd += ["--ssl-certfile", cert, "--ssl-keyfile", key]
+            # httpx clients trust SSL_CERT_FILE, so both modes (and the readiness check) verify the stub
+            os.environ["SSL_CERT_FILE"] = cert
+        base_url = f"{scheme}://127.0.0.1:{stub_port}"
+        async with load.running(stub_cmd, {"STUB_OWM_LATENCY_MS": str(args.owm_latency_ms)}, f"{base_url}/_stats"):
+            for mode, service_class in (("per_request", PerRequestClientWeatherService), ("pooled", WeatherService)):
+                service = service_class()
+                service.base_url = base_url
+                try:
+                    await run_mode(service, args.warmup, max(levels))
+                    for concurrency in levels:
+                        result = {"mode": mode, **await run_mode(service, args.requests, concurrency)}
+                        print(f"{mode} x{concurrency}: p95 {result['latency_ms']['p95']} ms", file=sys.stderr)
+                        results.append(result)
+                finally:
+                    await service.aclose()
+
+    print(f"{'mode':<12} {'conc':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for result in results:
+        latency = result["latency_ms"]
+        print(
+            f"{result['mode']:<12} {result['concurrency']:>5} {result['throughput_rps']:>8} "
+            f"{latency['p50']!s:>8} {latency['p95']!s:>8} {latency['p99']!s:>8} {result['errors']:>7}"
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps({"options": vars(args), "results": results}, indent=2), encoding="utf-8")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="lookups per mode and concurrency level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", default="1,16", help="comma-separated concurrency levels")
+    parser.add_argument("--owm-latency-ms", type=float, default=20)
+    parser.add_argument("--no-tls", action="store_true", help="plain HTTP (connection setup is then only the TCP handshake)")
+    parser.add_argument("--output", help="optional JSON result file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,298 @@
+"""
+Offline load test for the query endpoints.
+
+Starts a disposable Postgres (benchmarks.postgres), the OpenWeatherMap stub
+(benchmarks.stub_owm) and the API with the replaying fake LLM (benchmarks.serve),
+then drives /query, /query/batch and /query/stream at each concurrency level
+with the query mix in fixtures/queries.json. Every virtual user keeps its own
+session, so follow-up queries see real history.
+
+    python -m benchmarks.load --concurrency 1,8,32 --requests 200
+    python -m benchmarks.load --endpoints single,stream --baseline benchmarks/results/baseline.json
+
+Reports throughput and p50/p95/p99 latency (plus time to first token for
+streams) and upstream calls per query, and writes everything as JSON to
+benchmarks/results/ (or --output). With --baseline, scenarios whose p95 grew or
+throughput fell by more than --tolerance exit with status 1.
+
+Scenarios run in order against one server, so caches are warm after the first;
+compare runs made with the same options.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.postgres import disposable_postgres, free_port
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARKS_DIR.parent
+RESULTS_DIR = BENCHMARKS_DIR / "results"
+QUERIES_PATH = BENCHMARKS_DIR / "fixtures" / "queries.json"
+ENDPOINTS = ("single", "batch", "stream")
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank percentiles of latencies in seconds, reported in milliseconds"""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return round(ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)] * 1000, 1)
+
+    return {
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": round(ordered[-1] * 1000, 1),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 1)
+    }
+
+@asynccontextmanager
+async def running(cmd: List[str], env: Dict[str, str], health_url: str, timeout: float = 60) -> AsyncIterator[None]:
+    process = subprocess.Popen(cmd, cwd=BACKEND_DIR, env={**os.environ, **env})
+    try:
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"{' '.join(cmd)} exited with status {process.returncode}")
+                try:
+                    if (await client.get(health_url)).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{health_url} not ready after {timeout}s")
+                await asyncio.sleep(0.2)
+        yield
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+async def send_single(client: httpx.AsyncClient, session_id: str, queries: List[str]) -> Tuple[int, int, Optional[float]]:
+    response = await client.post("/api/weather/query", json={"query": queries[0]}, headers={"X-Session-ID": session_id})
+    return (1, 0, None) if response.status_code == 200 else (0, 1, None)
+
+async def send_batch(client: httpx.AsyncClient, session_id: str, queries: List[str]) -> Tuple[int, int, Optional[float]]:
+    # One session per slot, so a follow-up lands in the same session as its predecessor on the next request
+    items = [{"query": query, "session_id": f"{session_id}_{i}"} for i, query in enumerate(queries)]
+    response = await client.post("/api/weather/query/batch", json={"queries": items})
+    if response.status_code != 200:
+        return 0, len(items), None
+    failed = sum(1 for result in response.json()["results"] if result["error"])
+    return len(items) - failed, failed, None
+
+async def send_stream(client: httpx.AsyncClient, session_id: str, queries: List[str]) -> Tuple[int, int, Optional[float]]:
+    started = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", "/api/weather/query/stream", json={"query": queries[0]}, headers={"X-Session-ID": session_id}) as response:
+        if response.status_code != 200:
+            return 0, 1, None
+        async for line in response.aiter_lines():
+            if line == "event: error":
+                return 0, 1, first_token
+            if first_token is None and line in ("event: token", "event: response"):
+                first_token = time.perf_counter() - started
+    return 1, 0, first_token
+
+SENDERS = {"single": send_single, "batch": send_batch, "stream": send_stream}
+
+def upstream_calls(service_stats: Dict[str, Any]) -> Dict[str, int]:
+    return {name: governor["calls"] for name, governor in service_stats.get("dependencies", {}).items()}
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    concurrency: int,
+    total_requests: int,
+    queries: List[str],
+    batch_size: int,
+    run_id: str,
+    service_stats: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None
+) -> Dict[str, Any]:
+    """`service_stats` returns the /stats the upstream call counts come from (default: the client's server)"""
+    if service_stats is None:
+        async def service_stats() -> Dict[str, Any]:
+            return (await client.get("/api/weather/stats")).json()
+
+    per_request = batch_size if endpoint == "batch" else 1
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    completed = failed = 0
+    issued = itertools.count()
+
+    async def virtual_user(user: int) -> None:
+        nonlocal completed, failed
+        session_id = f"load_{run_id}_{endpoint}_{concurrency}_{user}"
+        position = user * per_request
+        while next(issued) < total_requests:
+            batch = [queries[(position + i) % len(queries)] for i in range(per_request)]
+            position += per_request
+            started = time.perf_counter()
+            try:
+                ok, errors, first_token = await SENDERS[endpoint](client, session_id, batch)
+            except httpx.HTTPError:
+                ok, errors, first_token = 0, per_request, None
+            latencies.append(time.perf_counter() - started)
+            completed += ok
+            failed += errors
+            if first_token is not None:
+                first_tokens.append(first_token)
+
+    before = upstream_calls(await service_stats())
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(user) for user in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = upstream_calls(await service_stats())
+
+    queries_sent = completed + failed
+    result = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "queries": queries_sent,
+        "errors": failed,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "queries_per_s": round(queries_sent / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+        "upstream_calls_per_query": {
+            name: round((calls - before.get(name, 0)) / max(queries_sent, 1), 3) for name, calls in after.items()
+        }
+    }
+    if endpoint == "stream":
+        result["first_token_ms"] = percentiles(first_tokens)
+    return result
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describes every scenario that regressed against the baseline run"""
+    previous = {(result["endpoint"], result["concurrency"]): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["endpoint"], result["concurrency"]))
+        if before is None:
+            continue
+        name = f"{result['endpoint']} x{result['concurrency']}"
+        p95, old_p95 = result["latency_ms"]["p95"], before["latency_ms"]["p95"]
+        if p95 is not None and old_p95 and p95 > old_p95 * (1 + tolerance):
+            regressions.append(f"{name}: p95 {old_p95} -> {p95} ms")
+        rps, old_rps = result["throughput_rps"], before["throughput_rps"]
+        if old_rps and rps < old_rps * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old_rps} -> {rps} req/s")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {result['errors']}")
+    return regressions
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    print(f"{'endpoint':<8} {'conc':>5} {'req/s':>8} {'q/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'ttft p95':>9} {'errors':>7}")
+    for result in results:
+        latency = result["latency_ms"]
+        ttft = result.get("first_token_ms", {}).get("p95")
+        print(
+            f"{result['endpoint']:<8} {result['concurrency']:>5} {result['throughput_rps']:>8} {result['queries_per_s']:>8} "
+            f"{latency['p50']!s:>8} {latency['p95']!s:>8} {latency['p99']!s:>8} {ttft if ttft is not None else '-':>9} {result['errors']:>7}"
+        )
+
+async def main(args: argparse.Namespace) -> int:
+    with open(QUERIES_PATH, encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)["queries"]]
+    endpoints = args.endpoints.split(",")
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {endpoint!r}; choose from {', '.join(ENDPOINTS)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+
+    stub_port, api_port = free_port(), free_port()
+    stub_env = {"STUB_OWM_LATENCY_MS": str(args.owm_latency_ms), "STUB_OWM_ERROR_RATE": str(args.owm_error_rate)}
+    results = []
+    async with disposable_postgres(args.database_url) as dsn:
+        api_env = {
+            "DATABASE_URL": dsn,
+            "OPENWEATHERMAP_BASE_URL": f"http://127.0.0.1:{stub_port}",
+            "LOG_LEVEL": "WARNING",
+            # Virtual users query back to back from one address; measure capacity, not rate limits
+            "ADMISSION_SESSION_RATE": "0",
+            "ADMISSION_CLIENT_RATE": "0"
+        }
+        serve_cmd = [
+            sys.executable, "-m", "benchmarks.serve", "--port", str(api_port),
+            "--llm-latency-ms", args.llm_latency_ms, "--llm-jitter", str(args.llm_jitter), "--llm-tail", args.llm_tail,
+            "--seed", str(args.seed)
+        ]
+        stub_cmd = [sys.executable, "-m", "uvicorn", "benchmarks.stub_owm:app", "--port", str(stub_port), "--log-level", "warning"]
+        async with running(stub_cmd, stub_env, f"http://127.0.0.1:{stub_port}/_stats"), \
+                running(serve_cmd, api_env, f"http://127.0.0.1:{api_port}/"):
+            limits = httpx.Limits(max_connections=max(levels) + 10, max_keepalive_connections=max(levels) + 10)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", timeout=args.timeout, limits=limits) as client:
+                for endpoint in endpoints:
+                    for concurrency in levels:
+                        result = await run_scenario(client, endpoint, concurrency, args.requests, queries, args.batch_size, run_id)
+                        print(f"{endpoint} x{concurrency}: {result['throughput_rps']} req/s, p95 {result['latency_ms']['p95']} ms", file=sys.stderr)
+                        results.append(result)
+
+    report = {
+        "run_id": run_id,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("baseline", "output", "database_url")},
+        "results": results
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"load_{run_id}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print_table(results)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated: single,batch,stream")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--batch-size", type=int, default=10, help="queries per /query/batch request")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--llm-latency-ms", default="", help='per prompt type ("safeguard=300,explanation=1200") or one value for all')
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--llm-tail", default="", help='share of slow LLM calls and their latency multiplier, e.g. "explanation=0.05x6" or "0.05x6"')
+    parser.add_argument("--owm-latency-ms", type=float, default=80)
+    parser.add_argument("--owm-error-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), help="existing database to use a throwaway schema in")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load_<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative p95/throughput change")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,181 @@
+"""
+Several API workers behind one load driver, with caches and session state kept
+per process or shared through the cache backend.
+
+Starts a disposable Postgres (benchmarks.postgres), the OpenWeatherMap stub and
+--workers copies of benchmarks.serve per --backends value, and sends each
+request to the next worker in turn: no session affinity, the worst case for
+per-process state.
+
+- memory: every worker keeps its own caches and sessions (CACHE_BACKEND=memory)
+- postgres: workers share them through the UNLOGGED table (CACHE_BACKEND=postgres)
+
+Reports per backend and scenario throughput and latency, upstream calls per
+query and cache hit ratios summed over all workers, and how many cross-worker
+follow-ups ("And tomorrow?" sent to the next worker right after a first turn)
+still knew which city the conversation was about.
+
+    python -m benchmarks.multiworker --workers 4 --requests 200
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks import load
+from benchmarks.postgres import disposable_postgres, free_port
+
+class RoundRobinTransport(httpx.AsyncBaseTransport):
+    """Sends each request to the next worker port, like a load balancer without affinity"""
+
+    def __init__(self, ports: List[int], limits: httpx.Limits):
+        self._ports = itertools.cycle(ports)
+        self._transport = httpx.AsyncHTTPTransport(limits=limits)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(port=next(self._ports))
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+def add_up(total: Dict[str, Any], stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Sums the numeric leaves of stats into total"""
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            add_up(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + value
+    return total
+
+async def all_workers_stats(client: httpx.AsyncClient, ports: List[int]) -> Dict[str, Any]:
+    responses = await asyncio.gather(*(client.get(f"http://127.0.0.1:{port}/api/weather/stats") for port in ports))
+    total: Dict[str, Any] = {}
+    for response in responses:
+        add_up(total, response.json())
+    return total
+
+def cache_ratios(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, float]:
+    """Share of lookups answered without upstream work, per cache, over the scenario"""
+    def delta(section: str, key: str) -> float:
+        return after.get(section, {}).get(key, 0) - before.get(section, {}).get(key, 0)
+
+    ratios = {}
+    for section in ("weather_cache", "explanation_cache", "sessions"):
+        hits = delta(section, "hits") + delta(section, "far_hits") + delta(section, "shared_hits")
+        lookups = delta(section, "hits") + delta(section, "misses")
+        ratios[section] = round(hits / lookups, 3) if lookups else None
+    return ratios
+
+async def follow_up_probe(client: httpx.AsyncClient, probes: int, run_id: str) -> float:
+    """Share of follow-ups that resolved a city when the first turn went to a different worker"""
+    resolved = 0
+    for i in range(probes):
+        headers = {"X-Session-ID": f"probe_{run_id}_{i}"}
+        # Consecutive requests go to consecutive workers
+        await client.post("/api/weather/query", json={"query": "How humid is Tokyo today?"}, headers=headers)
+        response = await client.post("/api/weather/query", json={"query": "And tomorrow?"}, headers=headers)
+        if response.status_code == 200 and response.json().get("weather_data"):
+            resolved += 1
+    return round(resolved / probes, 3) if probes else 0.0
+
+async def run_backend(backend: str, args: argparse.Namespace, dsn: str, stub_port: int, queries: List[str], run_id: str) -> List[Dict[str, Any]]:
+    ports = [free_port() for _ in range(args.workers)]
+    env = {
+        "DATABASE_URL": dsn,
+        "CACHE_BACKEND": backend,
+        "OPENWEATHERMAP_BASE_URL": f"http://127.0.0.1:{stub_port}",
+        "LOG_LEVEL": "WARNING",
+        "ADMISSION_SESSION_RATE": "0",
+        "ADMISSION_CLIENT_RATE": "0"
+    }
+    async with contextlib.AsyncExitStack() as stack:
+        for port in ports:
+            serve_cmd = [
+                sys.executable, "-m", "benchmarks.serve", "--port", str(port),
+                "--llm-latency-ms", args.llm_latency_ms, "--seed", str(args.seed)
+            ]
+            await stack.enter_async_context(load.running(serve_cmd, env, f"http://127.0.0.1:{port}/"))
+        levels = [int(level) for level in args.concurrency.split(",")]
+        limits = httpx.Limits(max_connections=max(levels) * 2 + 10, max_keepalive_connections=max(levels) * 2 + 10)
+        transport = RoundRobinTransport(ports, limits)
+        async with httpx.AsyncClient(transport=transport, base_url="http://127.0.0.1", timeout=args.timeout) as client, \
+                httpx.AsyncClient(timeout=args.timeout) as stats_client:
+            async def service_stats() -> Dict[str, Any]:
+                return await all_workers_stats(stats_client, ports)
+
+            results = []
+            for endpoint in args.endpoints.split(","):
+                for concurrency in levels:
+                    before = await service_stats()
+                    result = await load.run_scenario(
+                        client, endpoint, concurrency, args.requests, queries, args.batch_size, f"{run_id}_{backend}", service_stats
+                    )
+                    result["backend"] = backend
+                    result["cache_hit_ratio"] = cache_ratios(before, await service_stats())
+                    print(f"{backend} {endpoint} x{concurrency}: {result['throughput_rps']} req/s, p95 {result['latency_ms']['p95']} ms", file=sys.stderr)
+                    results.append(result)
+            follow_ups = await follow_up_probe(client, args.probes, f"{run_id}_{backend}")
+            for result in results:
+                result["cross_worker_follow_ups_resolved"] = follow_ups
+    return results
+
+def print_summary(results: List[Dict[str, Any]]) -> None:
+    print(f"{'backend':<9} {'endpoint':<8} {'conc':>5} {'req/s':>8} {'p95':>8} {'owm/q':>7} {'llm/q':>7} {'wx hit':>7} {'expl hit':>8} {'sess hit':>8} {'follow-ups':>10}")
+    for result in results:
+        upstream = result["upstream_calls_per_query"]
+        ratios = result["cache_hit_ratio"]
+        print(
+            f"{result['backend']:<9} {result['endpoint']:<8} {result['concurrency']:>5} {result['throughput_rps']:>8} "
+            f"{result['latency_ms']['p95']!s:>8} {upstream.get('openweathermap', 0):>7} {upstream.get('gemini', 0):>7} "
+            f"{ratios['weather_cache']!s:>7} {ratios['explanation_cache']!s:>8} {ratios['sessions']!s:>8} {result['cross_worker_follow_ups_resolved']:>10}"
+        )
+
+async def main(args: argparse.Namespace) -> None:
+    with open(load.QUERIES_PATH, encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)["queries"]]
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    stub_port = free_port()
+    stub_cmd = [sys.executable, "-m", "uvicorn", "benchmarks.stub_owm:app", "--port", str(stub_port), "--log-level", "warning"]
+    results = []
+    async with disposable_postgres(args.database_url) as dsn:
+        async with load.running(stub_cmd, {"STUB_OWM_LATENCY_MS": str(args.owm_latency_ms)}, f"http://127.0.0.1:{stub_port}/_stats"):
+            for backend in args.backends.split(","):
+                results.extend(await run_backend(backend, args, dsn, stub_port, queries, run_id))
+
+    report = {
+        "run_id": run_id,
+        "commit": load.git_commit(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("output", "database_url")},
+        "results": results
+    }
+    output = Path(args.output) if args.output else load.RESULTS_DIR / f"multiworker_{run_id}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print_summary(results)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backends", default="memory,postgres", help="comma-separated: memory,postgres")
+    parser.add_argument("--endpoints", default="single,stream", help="comma-separated: single,batch,stream")
+    parser.add_argument("--concurrency", default="8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--batch-size", type=int, default=10, help="queries per /query/batch request")
+    parser.add_argument("--probes", type=int, default=20, help="cross-worker follow-up conversations per backend")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--llm-latency-ms", default="", help='per prompt type ("safeguard=300,explanation=1200") or one value for all')
+    parser.add_argument("--owm-latency-ms", type=float, default=80)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), help="existing database to use a throwaway schema in")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/multiworker_<timestamp>.json)")
+    asyncio.run(main(parser.parse_args()))
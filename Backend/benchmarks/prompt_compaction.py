@@ -0,0 +1,108 @@
+"""
+Explanation prompt size with raw OpenWeatherMap JSON against the query-driven
+weather summary (PROMPT_COMPACTION_ENABLED), on recorded multi-city payloads.
+
+Builds the weather data of each scenario from the captures in fixtures/owm/
+(shifted to now, as the stub serves them, so "tomorrow" or "weekend" select
+real forecast days) and renders the weather part of the explanation prompt
+both ways, plus the whole prompt. Reports estimated tokens before and after
+and the time to render.
+
+    python -m benchmarks.prompt_compaction
+"""
+import argparse
+import json
+import time
+from statistics import median
+from typing import Any, Dict, List
+
+import orjson
+
+from app.services import llm_prompts
+from app.services.context_builder import build_explanation_prompt
+from app.services.forecast_columns import ColumnarForecast
+from app.services.response_helper import weather_data_payload
+from app.services.weather_summary import estimate_tokens, summarize_weather_data
+from benchmarks.stub_owm import _shift_to_now, load_captures
+
+# name -> (cities, query_details beyond the cities); current and/or forecast as get_weather_data would fetch them
+SCENARIOS = {
+    "1 city, now": (1, {"query_types": ["current"], "time_context": "current", "specific_conditions": []}),
+    "1 city, rain tomorrow": (1, {"query_types": ["forecast"], "time_context": "future", "specific_time": "tomorrow", "specific_conditions": ["rain"]}),
+    "2 cities, compare now": (2, {"query_types": ["current", "comparison"], "time_context": "current", "specific_conditions": ["temperature"], "comparison_type": "location"}),
+    "2 cities, weekend": (2, {"query_types": ["forecast"], "time_context": "future", "specific_time": "weekend", "specific_conditions": []}),
+    "4 cities, week": (4, {"query_types": ["forecast"], "time_context": "future", "specific_time": "week", "specific_conditions": []}),
+    "4 cities, compare week": (4, {"query_types": ["forecast", "comparison"], "time_context": "future", "specific_time": "week", "specific_conditions": ["temperature", "wind"], "comparison_type": "location"}),
+}
+
+def weather_data_for(captures: List[Dict[str, Any]], query_details: Dict[str, Any]) -> Dict[str, Any]:
+    wants_current = query_details["time_context"] == "current" or bool(query_details.get("comparison_type"))
+    wants_forecast = query_details["time_context"] == "future" or bool(query_details.get("comparison_type"))
+    weather_data = {}
+    for capture in captures:
+        city_data: Dict[str, Any] = {}
+        if wants_current:
+            city_data["current"] = _shift_to_now(capture["weather"], "weather")
+        if wants_forecast:
+            city_data["forecast"] = ColumnarForecast.from_payload(_shift_to_now(capture["forecast"], "forecast"))
+            if query_details.get("specific_time"):
+                city_data["specific_time_request"] = query_details["specific_time"]
+        weather_data[capture["weather"]["name"]] = city_data
+    return weather_data
+
+def timed_us(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(median(samples) * 1e6, 1)
+
+def prompt_tokens(query_details: Dict[str, Any], weather_json: str) -> int:
+    prompt = build_explanation_prompt(
+        llm_prompts.GENERATE_WEATHER_EXPLANATION_PROMPT_TEMPLATE,
+        query="(query)",
+        query_details_json=json.dumps(query_details, indent=2),
+        weather_json=weather_json,
+        follow_up_context="",
+        history=[],
+        history_summary=""
+    )
+    return prompt.tokens["total"]
+
+def main(args: argparse.Namespace) -> None:
+    captures = load_captures()
+    rows = []
+    for name, (city_count, details) in SCENARIOS.items():
+        query_details = {"cities": [capture["weather"]["name"] for capture in captures[:city_count]], **details}
+        weather_data = weather_data_for(captures[:city_count], query_details)
+        raw = lambda: orjson.dumps(weather_data_payload(weather_data), option=orjson.OPT_INDENT_2).decode()
+        compact = lambda: orjson.dumps(summarize_weather_data(weather_data, query_details)).decode()
+        raw_json, compact_json = raw(), compact()
+        rows.append({
+            "scenario": name,
+            "weather_tokens_raw": estimate_tokens(raw_json),
+            "weather_tokens_compact": estimate_tokens(compact_json),
+            "prompt_tokens_raw": prompt_tokens(query_details, raw_json),
+            "prompt_tokens_compact": prompt_tokens(query_details, compact_json),
+            "render_us_raw": timed_us(raw, args.repeat),
+            "render_us_compact": timed_us(compact, args.repeat)
+        })
+
+    print(f"{'scenario':<24} {'weather raw':>12} {'compact':>8} {'prompt raw':>11} {'compact':>8} {'saved':>6} {'render us':>16}")
+    for row in rows:
+        saved = 1 - row["prompt_tokens_compact"] / row["prompt_tokens_raw"]
+        print(
+            f"{row['scenario']:<24} {row['weather_tokens_raw']:>12} {row['weather_tokens_compact']:>8} "
+            f"{row['prompt_tokens_raw']:>11} {row['prompt_tokens_compact']:>8} {saved:>6.0%} "
+            f"{row['render_us_raw']:>7} -> {row['render_us_compact']:<7}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="renders per scenario for the timing")
+    parser.add_argument("--output", help="optional JSON result file")
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+"""
+Serialization cost of /query responses: FastAPI's default path vs WeatherJSONResponse.
+
+Builds a multi-city response (current conditions + forecast for every captured
+city in fixtures/owm/) and times:
+
+- default: response_model validation of the dict, jsonable_encoder and
+  json.dumps, as FastAPI does for a returned dict
+- orjson: WeatherJSONResponse.render for weather_detail full, summary and none
+
+    python -m benchmarks.response_serialization --repeat 300
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from statistics import median
+
+from fastapi.encoders import jsonable_encoder
+
+from app.api.responses import WeatherJSONResponse
+from app.models.weather import WeatherResponse
+from app.services import response_helper
+from app.services.forecast_columns import ColumnarForecast
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "owm"
+
+def timed_us(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(median(samples) * 1e6, 1)
+
+def default_render(response: dict) -> bytes:
+    model = WeatherResponse.model_validate(response)
+    content = jsonable_encoder(model)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def main(args: argparse.Namespace) -> None:
+    weather_data = {}
+    for path in sorted(FIXTURES_DIR.glob("*.json")):
+        capture = json.loads(path.read_text(encoding="utf-8"))
+        weather_data[capture["weather"]["name"]] = {
+            "current": capture["weather"],
+            "forecast": ColumnarForecast.from_payload(capture["forecast"])
+        }
+    query_details = {
+        "cities": list(weather_data), "query_types": ["forecast", "comparison"], "time_context": "future",
+        "specific_time": "week", "specific_conditions": ["temperature", "rain"], "comparison_type": "location"
+    }
+    explanation = "Across the four cities the week looks mild, with the most rain in London. " * 4
+
+    results = []
+    full = response_helper.build_final_response("Compare the week in all cities", query_details, weather_data, explanation)
+    full["session_id"] = "bench"
+    results.append({
+        "path": "default (validate + jsonable_encoder + json)",
+        "weather_detail": "full",
+        "render_us": timed_us(lambda: default_render(full), args.repeat),
+        "bytes": len(default_render(full))
+    })
+    for detail in ("full", "summary", "none"):
+        # Building the response is part of the cost that differs between details
+        def build_and_render(detail=detail):
+            response = response_helper.build_final_response("Compare the week in all cities", query_details, weather_data, explanation, detail)
+            return WeatherJSONResponse(response).body
+
+        results.append({
+            "path": "orjson (WeatherJSONResponse)",
+            "weather_detail": detail,
+            "render_us": timed_us(build_and_render, args.repeat),
+            "bytes": len(build_and_render())
+        })
+    print(json.dumps({"cities": len(weather_data), "results": results}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=300)
+    main(parser.parse_args())
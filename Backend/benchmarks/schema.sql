@@ -0,0 +1,12 @@
+-- chat_history as the app expects it, for disposable benchmark databases.
+-- Mirrors the production table plus migrations/001 (created inline here, since
+-- a fresh table needs no CONCURRENTLY).
+CREATE TABLE IF NOT EXISTS chat_history (
+    id bigserial PRIMARY KEY,
+    session_id text,
+    user_message text NOT NULL,
+    ai_response text NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_chat_history_session_created_at
+    ON chat_history (session_id, created_at DESC);
@@ -0,0 +1,45 @@
+"""
+Runs the API for offline load tests: the real app, with the Gemini model swapped
+for benchmarks.fake_llm.FakeLLM. Point OPENWEATHERMAP_BASE_URL at
+benchmarks.stub_owm and DATABASE_URL at a disposable Postgres (benchmarks.load
+does all of this itself).
+
+    OPENWEATHERMAP_BASE_URL=http://127.0.0.1:8765 DATABASE_URL=postgresql://... \
+        python -m benchmarks.serve --port 8000 --llm-latency-ms explanation=1200
+"""
+import argparse
+import os
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--llm-latency-ms", default="", help='per prompt type ("safeguard=300,explanation=1200") or one value for all')
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="relative latency jitter, e.g. 0.2 for +/-20%%")
+    parser.add_argument("--llm-tail", default="", help='slow-call share and latency multiplier per prompt type ("explanation=0.05x6") or one for all')
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    # Settings are read at import time; the key only has to be non-empty for the client to build
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    os.environ.setdefault("OPENWEATHERMAP_API_KEY", "offline-benchmark")
+
+    import uvicorn
+
+    from app.main import app
+    from app.services.ai_service import WeatherAIService
+    from benchmarks.fake_llm import FakeLLM, parse_latencies, parse_tails
+
+    @app.on_event("startup")
+    async def use_fake_llm():
+        WeatherAIService.get_instance().llm = FakeLLM(
+            latency_ms=parse_latencies(args.llm_latency_ms),
+            jitter=args.llm_jitter,
+            tail=parse_tails(args.llm_tail),
+            seed=args.seed
+        )
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Local stand-in for the OpenWeatherMap 2.5 API (/weather, /forecast and /group).
+
+Serves the captured payloads in fixtures/owm/, looked up by city name (`q`) or
+nearest coordinates (`lat`/`lon`); unknown cities get the nearest capture
+renamed (with a city id of its own, so /group can look it up again), so
+any query resolves. Timestamps are shifted forward in whole
+3-hour steps, so observations are at most 3 hours old and the forecast starts
+now, and windows such as "tomorrow" or "weekend" behave as they would live.
+
+    uvicorn benchmarks.stub_owm:app --port 8765
+
+Latency and failure injection come from STUB_OWM_LATENCY_MS, STUB_OWM_ERROR_RATE,
+STUB_OWM_SLOW_RATE and STUB_OWM_SLOW_MS, and can be changed at runtime with
+POST /_faults. GET /_stats reports request counts per endpoint, plus how many
+city ids /group requests asked for ("group_ids").
+"""
+import asyncio
+import copy
+import json
+import math
+import os
+import random
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "owm"
+
+def load_captures(fixtures_dir: Path = FIXTURES_DIR) -> List[Dict[str, Any]]:
+    """Each capture holds the /weather and /forecast responses for one city"""
+    return [json.loads(path.read_text(encoding="utf-8")) for path in sorted(fixtures_dir.glob("*.json"))]
+
+class FaultConfig:
+    def __init__(self):
+        self.latency_ms = float(os.getenv("STUB_OWM_LATENCY_MS", "80"))
+        self.error_rate = float(os.getenv("STUB_OWM_ERROR_RATE", "0"))
+        self.slow_rate = float(os.getenv("STUB_OWM_SLOW_RATE", "0"))
+        self.slow_ms = float(os.getenv("STUB_OWM_SLOW_MS", "3000"))
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(vars(self))
+
+captures = load_captures()
+faults = FaultConfig()
+requests_served: Counter = Counter()
+# City ids handed out for renamed captures -> the lookup that produced them
+issued_ids: Dict[int, Tuple[Optional[str], Optional[float], Optional[float]]] = {}
+
+app = FastAPI(title="OpenWeatherMap stub")
+
+def _distance(capture: Dict[str, Any], lat: float, lon: float) -> float:
+    coord = capture["weather"]["coord"]
+    return math.hypot(coord["lat"] - lat, (coord["lon"] - lon) * math.cos(math.radians(lat)))
+
+def _issue_id(renamed: Dict[str, Any], q: Optional[str], lat: Optional[float], lon: Optional[float]) -> Dict[str, Any]:
+    """Gives a renamed capture a stable city id outside the range of real ones"""
+    city_id = 90_000_000 + zlib.crc32(repr((q and q.casefold(), lat, lon)).encode()) % 10_000_000
+    issued_ids[city_id] = (q, lat, lon)
+    renamed["weather"]["id"] = renamed["forecast"]["city"]["id"] = city_id
+    return renamed
+
+def _find_capture(q: Optional[str], lat: Optional[float], lon: Optional[float]) -> Dict[str, Any]:
+    if q:
+        name = q.split(",")[0].strip().casefold()
+        for capture in captures:
+            if capture["weather"]["name"].casefold() == name:
+                return capture
+        renamed = copy.deepcopy(captures[sum(map(ord, name)) % len(captures)])
+        renamed["weather"]["name"] = renamed["forecast"]["city"]["name"] = q.split(",")[0].strip().title()
+        return _issue_id(renamed, q, None, None)
+    nearest = min(captures, key=lambda capture: _distance(capture, lat, lon))
+    if _distance(nearest, lat, lon) < 0.5:
+        return nearest
+    renamed = copy.deepcopy(nearest)
+    renamed["weather"]["coord"] = {"lat": lat, "lon": lon}
+    renamed["forecast"]["city"]["coord"] = {"lat": lat, "lon": lon}
+    return _issue_id(renamed, None, lat, lon)
+
+def _find_by_id(city_id: int) -> Optional[Dict[str, Any]]:
+    for capture in captures:
+        if capture["weather"]["id"] == city_id:
+            return capture
+    return _find_capture(*issued_ids[city_id]) if city_id in issued_ids else None
+
+def _shift_to_now(payload: Dict[str, Any], kind: str) -> Dict[str, Any]:
+    """Moves the capture's timestamps forward in whole forecast steps (3 hours) to just before now"""
+    captured_at = payload["dt"] if kind == "weather" else payload["list"][0]["dt"] - 7200
+    shift = (int(time.time()) - captured_at) // 10800 * 10800
+    shifted = copy.deepcopy(payload)
+    if kind == "weather":
+        shifted["dt"] += shift
+        shifted["sys"]["sunrise"] += shift
+        shifted["sys"]["sunset"] += shift
+    else:
+        for slot in shifted["list"]:
+            slot["dt"] += shift
+            slot["dt_txt"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(slot["dt"]))
+        shifted["city"]["sunrise"] += shift
+        shifted["city"]["sunset"] += shift
+    return shifted
+
+def _group_entry(weather: Dict[str, Any]) -> Dict[str, Any]:
+    """A /weather payload in the shape of a /group list entry (UTC offset under "sys")"""
+    entry = {key: value for key, value in weather.items() if key not in ("base", "cod", "timezone")}
+    entry["sys"] = {**weather["sys"], "timezone": weather.get("timezone", 0)}
+    return entry
+
+async def _inject_faults(kind: str) -> Optional[JSONResponse]:
+    delay = faults.slow_ms if random.random() < faults.slow_rate else faults.latency_ms
+    await asyncio.sleep(delay / 1000)
+    if random.random() < faults.error_rate:
+        requests_served[f"{kind}_errors"] += 1
+        return JSONResponse({"cod": 503, "message": "Service temporarily unavailable"}, status_code=503)
+    return None
+
+async def _serve(kind: str, q: Optional[str], lat: Optional[float], lon: Optional[float]) -> JSONResponse:
+    requests_served[kind] += 1
+    if not q and (lat is None or lon is None):
+        return JSONResponse({"cod": "400", "message": "Nothing to geocode"}, status_code=400)
+    failure = await _inject_faults(kind)
+    if failure is not None:
+        return failure
+    return JSONResponse(_shift_to_now(_find_capture(q, lat, lon)[kind], kind))
+
+@app.get("/weather")
+async def weather(q: Optional[str] = None, lat: Optional[float] = None, lon: Optional[float] = None):
+    return await _serve("weather", q, lat, lon)
+
+@app.get("/forecast")
+async def forecast(q: Optional[str] = None, lat: Optional[float] = None, lon: Optional[float] = None):
+    return await _serve("forecast", q, lat, lon)
+
+@app.get("/group")
+async def group(id: str = ""):
+    requests_served["group"] += 1
+    try:
+        city_ids = [int(city_id) for city_id in id.split(",") if city_id.strip()]
+    except ValueError:
+        return JSONResponse({"cod": "400", "message": f"{id} is not a city ID"}, status_code=400)
+    if not city_ids or len(city_ids) > 20:
+        return JSONResponse({"cod": "400", "message": "Between 1 and 20 city ids are required"}, status_code=400)
+    requests_served["group_ids"] += len(city_ids)
+    failure = await _inject_faults("group")
+    if failure is not None:
+        return failure
+    found = [capture for capture in map(_find_by_id, city_ids) if capture is not None]
+    entries = [_group_entry(_shift_to_now(capture["weather"], "weather")) for capture in found]
+    return JSONResponse({"cnt": len(entries), "list": entries})
+
+@app.get("/_stats")
+async def stats():
+    return {"requests": dict(requests_served), "faults": faults.as_dict()}
+
+@app.post("/_faults")
+async def set_faults(
+    latency_ms: Optional[float] = None,
+    error_rate: Optional[float] = None,
+    slow_rate: Optional[float] = None,
+    slow_ms: Optional[float] = None
+):
+    for name, value in (("latency_ms", latency_ms), ("error_rate", error_rate), ("slow_rate", slow_rate), ("slow_ms", slow_ms)):
+        if value is not None:
+            setattr(faults, name, value)
+    return faults.as_dict()
@@ -0,0 +1,105 @@
+"""
+Bursts of concurrent identical weather lookups, with and without the cache.
+
+Starts the OpenWeatherMap stub (benchmarks.stub_owm) and, for each --bursts
+size, fires that many simultaneous current-weather lookups spread over
+--cities cities:
+
+- direct: straight through WeatherService, every lookup is an upstream call
+- cold: through a fresh CachedWeatherService, so concurrent misses coalesce
+- warm: the same burst again on that cache, served from memory
+
+Upstream calls are counted by the stub (GET /_stats), so they include
+anything the cache failed to coalesce. Reports upstream calls, coalesced
+lookups and latency per burst.
+
+    python -m benchmarks.weather_burst --bursts 1,10,100,500 --cities 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Settings are read at import time
+os.environ.setdefault("OPENWEATHERMAP_API_KEY", "offline-benchmark")
+
+import httpx
+
+from app.services.weather_cache import CachedWeatherService
+from app.services.weather_service import WeatherService
+from benchmarks import load
+from benchmarks.postgres import free_port
+
+CITIES = ("London", "Paris", "New York", "Tokyo")
+
+async def upstream_requests(stub: httpx.AsyncClient) -> int:
+    return (await stub.get("/_stats")).json()["requests"].get("weather", 0)
+
+async def burst(stub: httpx.AsyncClient, lookup, size: int, cities: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            await lookup(CITIES[i % cities])
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+
+    before = await upstream_requests(stub)
+    await asyncio.gather(*(one(i) for i in range(size)))
+    return {
+        "burst": size,
+        "upstream_calls": await upstream_requests(stub) - before,
+        "errors": errors,
+        "latency_ms": load.percentiles(latencies)
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    if not 1 <= args.cities <= len(CITIES):
+        raise SystemExit(f"--cities must be between 1 and {len(CITIES)}")
+    stub_port = free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    stub_cmd = [sys.executable, "-m", "uvicorn", "benchmarks.stub_owm:app", "--port", str(stub_port), "--log-level", "warning"]
+    results = []
+    async with load.running(stub_cmd, {"STUB_OWM_LATENCY_MS": str(args.owm_latency_ms)}, f"{stub_url}/_stats"):
+        async with httpx.AsyncClient(base_url=stub_url) as stub:
+            service = WeatherService()
+            service.base_url = stub_url
+            try:
+                for size in (int(size) for size in args.bursts.split(",")):
+                    results.append({"mode": "direct", **await burst(stub, service.get_weather_by_city, size, args.cities)})
+                    # A fresh cache per burst, so the first burst always misses
+                    cached = CachedWeatherService(service)
+                    for mode in ("cold", "warm"):
+                        coalesced_before = cached.single_flight.coalesced
+                        result = await burst(stub, cached.get_weather_by_city, size, args.cities)
+                        result["coalesced"] = cached.single_flight.coalesced - coalesced_before
+                        results.append({"mode": mode, **result})
+                    print(f"burst {size}: {[result['upstream_calls'] for result in results[-3:]]} upstream calls", file=sys.stderr)
+            finally:
+                await service.aclose()
+
+    print(f"{'mode':<7} {'burst':>6} {'upstream':>9} {'coalesced':>10} {'p50':>8} {'p95':>8} {'max':>8} {'errors':>7}")
+    for result in results:
+        latency = result["latency_ms"]
+        print(
+            f"{result['mode']:<7} {result['burst']:>6} {result['upstream_calls']:>9} {result.get('coalesced', '-')!s:>10} "
+            f"{latency['p50']!s:>8} {latency['p95']!s:>8} {latency['max']!s:>8} {result['errors']:>7}"
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps({"options": vars(args), "results": results}, indent=2), encoding="utf-8")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bursts", default="1,10,100,500", help="comma-separated burst sizes")
+    parser.add_argument("--cities", type=int, default=1, help="distinct cities the burst is spread over (1-4)")
+    parser.add_argument("--owm-latency-ms", type=float, default=80)
+    parser.add_argument("--output", help="optional JSON result file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,8 @@
+-- Recent-window lookups of chat history:
+--   SELECT ... FROM chat_history WHERE session_id = $1 ORDER BY created_at DESC LIMIT $2
+-- become a short backward index scan instead of a scan + sort over the whole session.
+--
+-- CONCURRENTLY avoids blocking writes on a live table; it cannot run inside a
+-- transaction block, so run this file on its own (e.g. psql -f, not a wrapped migration).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_history_session_created_at
+    ON chat_history (session_id, created_at DESC);